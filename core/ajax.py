@@ -1,3 +1,4 @@
+import itertools
 import json
 import logging
 import os
@@ -6,9 +7,9 @@ import time
 import cherrypy
 import datetime
 import core
-from core import config, library, searchresults, searcher, snatcher, notification, plugins, downloaders
+from core import config, library, searcher, snatcher, notification, plugins, downloaders
 from core.library import Metadata, Manage
-from core.movieinfo import TheMovieDatabase, YouTube
+from core.movieinfo import Poster, TheMovieDatabase, YouTube
 from core.providers import torrent, newznab
 from core.helpers import Conversions
 import backup
@@ -48,6 +49,8 @@ class Ajax:
 
         Gets a movies slice, length by limit, from library sorted by sort key
 
+        Adds poster_version for poster thumbnail urls.
+
         Returns list of dicts of movies
         '''
         if status and not isinstance(status, list):
@@ -55,7 +58,10 @@ class Ajax:
         if status and 'Finished' in status:
             status.append('Disabled')
 
-        return core.sql.get_user_movies(sort_key, sort_direction.upper(), limit, offset, status, category)
+        movies = core.sql.get_user_movies(sort_key, sort_direction.upper(), limit, offset, status, category)
+        for movie in movies:
+            movie['poster_version'] = Poster.version(movie['imdbid']) if movie.get('poster') else 0
+        return movies
 
     @cherrypy.expose
     @cherrypy.tools.json_out()
@@ -647,6 +653,8 @@ class Ajax:
 
         Finds all files larger than minsize in directory.
         Removes all movies from gathered list that are already in library.
+        Metadata of files is gathered concurrently, see Metadata.from_files(),
+            so results are yielded in the order files finish.
 
         If error, yields {'error': reason} and stops Iteration
         If movie has all metadata, yields:
@@ -669,8 +677,9 @@ class Ajax:
             yield json.dumps({'error': files['error']})
             raise StopIteration()
         user_movies = core.sql.get_user_movies()
-        library_files = [i['finished_file'] for i in user_movies]
-        library = [i['imdbid'] for i in user_movies]
+        library_files = {i['finished_file'] for i in user_movies}
+        library = {i['imdbid'] for i in user_movies}
+        sizes = files['sizes']
         files = [file for file in files['files'] if file not in library_files]
 
         skipduplicatedirs = json.loads(skipduplicatedirs)
@@ -711,12 +720,13 @@ class Ajax:
             raise StopIteration()
 
         logging.info(f'Parsing {length} directory scan results.')
-        for index, path in enumerate(files):
-            logging.info(f'Gathering metatadata for {path}')
+        for index, (path, result) in enumerate(Metadata.from_files(files)):
             metadata = {}
             response = {'progress': [index + 1, length]}
             try:
-                metadata = Metadata.from_file(path)
+                if isinstance(result, Exception):
+                    raise result
+                metadata = result
 
                 if not metadata.get('imdbid'):
                     metadata['imdbid'] = ''
@@ -743,7 +753,7 @@ class Ajax:
                     metadata['poster_path'] = p
                     metadata['resolution'] = r
 
-                metadata['size'] = os.path.getsize(path)
+                metadata['size'] = sizes[path]
                 metadata['human_size'] = Conversions.human_file_size(metadata['size'])
                 metadata['finished_file'] = path
 
@@ -785,10 +795,6 @@ class Ajax:
         movie_data = json.loads(movies)
         corrected_movies = json.loads(corrected_movies)
 
-        fake_results = []
-
-        success = []
-
         length = len(movie_data) + len(corrected_movies)
         progress = 1
 
@@ -807,6 +813,7 @@ class Ajax:
                     progress += 1
 
         logging.info(f'Adding {len(movie_data)} directory scan movies to library.')
+        ready = []
         for movie in movie_data:
             if movie.get('imdbid'):
                 movie['status'] = 'Disabled'
@@ -814,32 +821,19 @@ class Ajax:
                 movie['origin'] = 'Directory Import'
                 movie['finished_date'] = today
                 movie['id'] = movie['tmdbid']
-                response = Manage.add_movie(movie, full_metadata=True)
-                if response['response'] is True:
-                    fake_results.append(searchresults.generate_simulacrum(movie))
-                    yield json.dumps({'response': True, 'progress': [progress, length], 'movie': movie})
-                    progress += 1
-                    success.append(movie)
-                    continue
-                else:
-                    yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': response['error']})
-                    progress += 1
-                    continue
+                ready.append(movie)
             else:
                 logging.error('Unable to find {} on TMDB.'.format(movie['title']))
                 logging.debug(movie)
-                yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': Errors.tmdb_not_found.format(data['title'])})
+                yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': Errors.tmdb_not_found.format(movie['title'])})
                 progress += 1
 
-        fake_results = searchresults.score(fake_results, imported=True)
-
-        for i in success:
-            for r in fake_results:
-                if r['imdbid'] == i['imdbid']:
-                    core.sql.update('MOVIES', 'finished_score', r['score'], 'imdbid', i['imdbid'])
-                    break
-
-        core.sql.write_search_results(fake_results)
+        for movie, response in Manage.add_movies_bulk(ready, full_metadata=True, imported=True):
+            if response['response'] is True:
+                yield json.dumps({'response': True, 'progress': [progress, length], 'movie': movie})
+            else:
+                yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': response['error']})
+            progress += 1
 
     import_dir._cp_config = {'response.stream': True, 'tools.gzip.on': False}
 
@@ -976,9 +970,7 @@ class Ajax:
 
         movies = json.loads(movies)
 
-        fake_results = []
-
-        success = []
+        ready = []
 
         length = len(movies)
         progress = 1
@@ -1006,28 +998,14 @@ class Ajax:
             movie['predb'] = 'found'
             movie['finished_file'] = (movie.get('finished_file') or '').strip()
             movie['origin'] = 'Kodi Import'
+            ready.append(movie)
 
-            response = Manage.add_movie(movie)
+        for movie, response in Manage.add_movies_bulk(ready, imported=True):
             if response['response'] is True:
-                fake_results.append(searchresults.generate_simulacrum(movie))
                 yield json.dumps({'response': True, 'progress': [progress, length], 'title': movie['title'], 'imdbid': movie['imdbid']})
-                progress += 1
-                success.append(movie)
-                continue
             else:
                 yield json.dumps({'response': False, 'title': movie['title'], 'imdbid': movie['imdbid'], 'progress': [progress, length], 'error': response['error']})
-                progress += 1
-                continue
-
-        fake_results = searchresults.score(fake_results, imported=True)
-
-        for i in success:
-            for r in fake_results:
-                if r['imdbid'] == i['imdbid']:
-                    core.sql.update('MOVIES', 'finished_score', r['score'], 'imdbid', i['imdbid'])
-                    break
-
-        core.sql.write_search_results(fake_results)
+            progress += 1
 
     import_kodi_movies._cp_config = {'response.stream': True, 'tools.gzip.on': False}
 
@@ -1073,9 +1051,9 @@ class Ajax:
         movie_data = json.loads(movies)
         corrected_movies = json.loads(corrected_movies)
 
-        fake_results = []
-
-        success = []
+        # movies with complete metadata, and those that still need it from TMDB
+        full = []
+        partial = []
 
         length = len(movie_data) + len(corrected_movies)
         progress = 1
@@ -1122,34 +1100,21 @@ class Ajax:
                         yield json.dumps({'response': False, 'progress': [progress, length], 'title': movie['title'], 'error': Errors.tmdb_not_found.format(movie['imdbid'])})
                         progress += 1
                         continue
-                response = Manage.add_movie(movie, full_metadata=fm)
-                if response['response'] is True:
-                    fake_results.append(searchresults.generate_simulacrum(movie))
-                    yield json.dumps({'response': True, 'progress': [progress, length], 'title': movie['title'], 'imdbid': movie['imdbid']})
-                    progress += 1
-                    success.append(movie)
-                    continue
-                else:
-                    yield json.dumps({'response': False, 'progress': [progress, length], 'error': response['error'], 'title': movie['title']})
-                    progress += 1
-                    continue
+                (full if fm else partial).append(movie)
             else:
                 logging.error(Errors.tmdb_not_found.format(movie['title']))
                 yield json.dumps({'response': False, 'progress': [progress, length], 'error': _('Unable to find IMDB ID for {} on TheMovieDB.').format(movie['title']), 'title': movie['title']})
                 progress += 1
                 continue
 
-        if fake_results:
-            fake_results = searchresults.score(fake_results, imported=True)
-
-        for i in success:
-            for r in fake_results:
-                if r['imdbid'] == i['imdbid']:
-                    core.sql.update('MOVIES', 'finished_score', r['score'], 'imdbid', i['imdbid'])
-                    break
-
-        if fake_results:
-            core.sql.write_search_results(fake_results)
+        added = itertools.chain(Manage.add_movies_bulk(full, full_metadata=True, imported=True),
+                                Manage.add_movies_bulk(partial, imported=True))
+        for movie, response in added:
+            if response['response'] is True:
+                yield json.dumps({'response': True, 'progress': [progress, length], 'title': movie['title'], 'imdbid': movie['imdbid']})
+            else:
+                yield json.dumps({'response': False, 'progress': [progress, length], 'error': response['error'], 'title': movie['title']})
+            progress += 1
 
     import_plex_csv._cp_config = {'response.stream': True, 'tools.gzip.on': False}
 
@@ -1183,52 +1148,25 @@ class Ajax:
         wanted = json.loads(wanted)
         finished = json.loads(finished)
 
-        fake_results = []
-
-        success = []
-
         length = len(wanted) + len(finished)
         progress = 1
 
         logging.info(f'Adding {len(wanted)} Wanted CouchPotato movies to library.')
-        for movie in wanted:
-            response = Manage.add_movie(movie, full_metadata=True)
-            if response['response'] is True:
-                yield json.dumps({'response': True, 'progress': [progress, length], 'movie': movie})
-                progress += 1
-                continue
-            else:
-                yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': response['error']})
-                progress += 1
-                continue
-
-        logging.info(f'Adding {len(finished)} Wanted CouchPotato movies to library.')
+        logging.info(f'Adding {len(finished)} Finished CouchPotato movies to library.')
         for movie in finished:
             movie['predb'] = 'found'
             movie['status'] = 'Disabled'
             movie['origin'] = 'CouchPotato Import'
 
-            response = Manage.add_movie(movie, full_metadata=True)
+        added = itertools.chain(Manage.add_movies_bulk(wanted, full_metadata=True),
+                                Manage.add_movies_bulk(finished, full_metadata=True, imported=True))
+        for movie, response in added:
             if response['response'] is True:
-                fake_results.append(searchresults.generate_simulacrum(movie))
                 yield json.dumps({'response': True, 'progress': [progress, length], 'movie': movie})
-                progress += 1
-                success.append(movie)
-                continue
             else:
                 yield json.dumps({'response': False, 'movie': movie, 'progress': [progress, length], 'error': response['error']})
-                progress += 1
-                continue
-
-        fake_results = searchresults.score(fake_results, imported=True)
-
-        for i in success:
-            for r in fake_results:
-                if r['imdbid'] == i['imdbid']:
-                    core.sql.update('MOVIES', 'finished_score', r['score'], 'imdbid', i['imdbid'])
-                    break
+            progress += 1
 
-        core.sql.write_search_results(fake_results)
     import_cp_movies._cp_config = {'response.stream': True, 'tools.gzip.on': False}
 
     @cherrypy.expose
@@ -1414,6 +1352,7 @@ class Ajax:
         logging.info('Creating backup of Watcher as {}'.format(os.path.join(core.PROG_PATH, 'watcher.zip')))
 
         try:
+            core.sql.checkpoint()
             backup.backup(require_confirm=False)
         except Exception as e:
             logging.error('Unable to create backup.', exc_info=True)
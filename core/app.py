@@ -1,10 +1,13 @@
 import cherrypy
+from cherrypy.lib import cptools, static
 import core
-from core import ajax, scheduler, plugins, localization, api
+from core import ajax, scheduler, plugins, localization, api, searcher, ptncache, tmdbcache
 from core.auth import AuthController
 from core.postprocessing import Postprocessing
+from core.movieinfo import Poster
 import os
 import json
+import re
 from mako.template import Template
 import logging
 
@@ -121,6 +124,8 @@ class App:
                                               languages = core.CONFIG['Languages'].keys(), **self.defaults())
         elif page == 'manage':
             movies = core.sql.get_user_movies()
+            for movie in movies:
+                movie['poster_version'] = Poster.version(movie['imdbid']) if movie.get('poster') else 0
             return App.manage_template.render(movies=movies, profiles=core.CONFIG['Quality']['Profiles'].keys(),
                                               categories=core.CONFIG['Categories'].keys(), **self.defaults())
         elif page == 'import':
@@ -209,6 +214,10 @@ class App:
                                    'size': os.path.getsize(core.DB_FILE) / 1024
                                    },
                       'config': {'file': core.CONF_FILE},
+                      'search': dict(searcher.progress),
+                      'ptn': ptncache.stats(),
+                      'tmdb': tmdbcache.stats(),
+                      'posters': Poster.stats(),
                       'system': {'path': core.PROG_PATH,
                                  'arguments': sys.argv,
                                  'version': sys.version[:5]}
@@ -235,6 +244,46 @@ class App:
         if page == 'update':
             return App.update_template.render(updating=core.UPDATING, **self.defaults())
 
+    @cherrypy.expose
+    def poster(self, size, filename, v=None):
+        ''' Serves poster thumbnail
+        size (str): key in Poster.sizes, ie 'grid'
+        filename (str): file name of poster, ie 'tt0000001.jpg'
+        v (str): version of poster from Poster.version()        <optional - default None>
+
+        Thumbnails are cached by browsers for a year when requested with a
+            version, which changes when the poster is replaced. Without a
+            version they are revalidated daily.
+
+        Thumbnails that don't exist yet are queued for download and the full
+            size poster, or missing_poster.jpg, is served in their place until
+            they are ready.
+
+        Returns image, or 304 if client's copy is current
+        '''
+        if size not in Poster.sizes or not re.fullmatch(r'\w+\.jpg', filename):
+            raise cherrypy.NotFound()
+
+        imdbid = os.path.splitext(filename)[0]
+        path = Poster.thumbnail(imdbid, size)
+        if path:
+            cache = 'public, max-age=31536000, immutable' if v else 'public, max-age=86400'
+        else:
+            path = Poster.path(imdbid)
+            if not os.path.exists(path):
+                path = os.path.join(core.PROG_PATH, 'static', 'images', 'missing_poster.jpg')
+            cache = 'no-cache'
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise cherrypy.NotFound()
+
+        cherrypy.response.headers['Cache-Control'] = cache
+        cherrypy.response.headers['ETag'] = '"{:x}-{:x}"'.format(int(st.st_mtime), st.st_size)
+        cptools.validate_etags()
+        return static.serve_file(path, content_type='image/jpeg')
+
     @cherrypy.expose
     def error_page_404(self, *args, **kwargs):
         return App.fourohfour_template.render(**self.defaults())
@@ -5,6 +5,7 @@ import core
 import collections.abc
 import re
 from core import localization
+from core import searchresults, sources
 from core.helpers import Comparisons
 
 ''' Config
@@ -217,6 +218,9 @@ def load(config=None):
 
     core.CONFIG = config
 
+    searchresults.clear_scorers()
+    sources.clear()
+
     return
 
 
@@ -0,0 +1,231 @@
+import collections
+import logging
+import os
+import time
+
+import core
+
+logging = logging.getLogger(__name__)
+
+# Directory walker and persistent index of library files
+#
+# walk() lists directories with os.scandir and reuses the stat data of each
+# DirEntry, so every file is looked at once instead of once by os.path.isdir and
+# again by os.path.getsize.
+#
+# scan() also keeps what it finds in FILEINDEX as path -> (size, mtime, inode).
+# Adding, removing or renaming anything in a directory changes the directory's
+# mtime, so a directory whose mtime and inode still match the index is not
+# listed again and its contents are read from the index instead. A re-scan of
+# an unchanged library then needs only one stat per directory.
+#
+# Files written in place, ie while a movie is being copied in, don't change
+# their directory's mtime. Files modified within the last settle_time seconds
+# when their directory is listed are indexed without an mtime, and directories
+# holding such files are listed again by every scan until they settle.
+# Otherwise a partial size would be kept until something else in the directory
+# changes. Files rewritten in place after they settled are not noticed.
+
+# seconds a file must be unmodified before its indexed size is trusted
+settle_time = 60
+
+Entry = collections.namedtuple('Entry', ['path', 'is_dir', 'size', 'mtime', 'inode'])
+
+
+def walk(directory, recursive=True):
+    ''' Lists contents of directory
+    directory (str): absolute path to directory
+    recursive (bool): list subdirectories too      <optional - default True>
+
+    Entries that can't be read, ie broken links, are skipped. Links to a
+        directory containing the link are not followed.
+
+    Raises OSError if directory can't be listed, errors listing subdirectories
+        are logged.
+
+    Yields Entry of every file and directory, directories before their contents
+    '''
+    directory = os.path.normpath(directory)
+
+    entries = collections.deque(_list(directory))
+    while entries:
+        entry = entries.popleft()
+        yield entry
+        if entry.is_dir and recursive:
+            try:
+                entries.extendleft(reversed(_list(entry.path)))
+            except OSError as e:
+                logging.warning(f'Unable to scan {entry.path}: {e}')
+
+
+def scan(directory, recursive=True):
+    ''' Gets all files in directory using the index
+    directory (str): absolute path to directory
+    recursive (bool): scan subdirectories too      <optional - default True>
+
+    Only lists directories that changed since they were last scanned and
+        updates their contents in FILEINDEX.
+
+    Raises OSError if directory can't be read, errors reading subdirectories
+        are logged.
+
+    Returns list of Entry of files in the same order as walk()
+    '''
+    directory = os.path.normpath(directory)
+    st = os.stat(directory)
+
+    indexed = {}
+    children = collections.defaultdict(list)
+    for row in core.sql.get_file_index(directory):
+        indexed[row['path']] = row
+        children[row['parent']].append(row)
+
+    files = []
+    listed = []
+    pending = collections.deque([Entry(directory, True, st.st_size, st.st_mtime, st.st_ino)])
+    while pending:
+        entry = pending.popleft()
+        if not entry.is_dir:
+            files.append(entry)
+            continue
+
+        row = indexed.get(entry.path)
+        try:
+            if row and row['mtime'] == entry.mtime and row['inode'] == entry.inode and _settled(children[entry.path]):
+                contents = [_indexed(i) for i in children[entry.path]]
+                contents = [i for i in contents if i]
+            else:
+                contents = _list(entry.path)
+                listed.append((entry, contents))
+        except OSError as e:
+            if entry.path == directory:
+                raise
+            logging.warning(f'Unable to scan {entry.path}: {e}')
+            continue
+
+        pending.extendleft(reversed([i for i in contents if recursive or not i.is_dir]))
+
+    logging.debug(f'Scanned {directory}, {len(listed)} directories changed since last scan.')
+
+    if listed:
+        unsettled = time.time() - settle_time
+        with core.sql.transaction():
+            for entry, contents in listed:
+                core.sql.update_file_index(_row(entry), [_row(i, entry.path, unsettled) for i in contents])
+
+    return files
+
+
+def existing(paths):
+    ''' Finds files that exist
+    paths (iterable): absolute paths to files
+
+    Directories holding more than one of the files are listed once instead of
+        checking each file. Files not found in a listing are checked on their
+        own, ie for case-insensitive file systems.
+
+    Returns set of paths that exist
+    '''
+    by_dir = collections.defaultdict(set)
+    for path in paths:
+        by_dir[os.path.dirname(path)].add(path)
+
+    found = set()
+    for directory, files in by_dir.items():
+        if len(files) > 1:
+            try:
+                names = set(os.listdir(directory or '.'))
+            except OSError:
+                names = set()
+            listed = {i for i in files if os.path.basename(i) in names}
+            found |= listed
+            files = files - listed
+        found |= {i for i in files if os.path.exists(i)}
+    return found
+
+
+def _list(directory):
+    ''' Lists one directory with os.scandir
+    directory (str): absolute path to directory
+
+    Returns list of Entry
+    '''
+    entries = []
+    with os.scandir(directory) as it:
+        for i in it:
+            try:
+                st = i.stat()
+                is_dir = i.is_dir()
+            except OSError as e:
+                logging.debug(f'Unable to read {i.path}, skipping: {e}')
+                continue
+            if is_dir and i.is_symlink() and _contains(i.path, directory):
+                logging.debug(f'Not following {i.path}, it links to a directory containing it.')
+                continue
+            entries.append(Entry(i.path, is_dir, st.st_size, st.st_mtime, st.st_ino))
+    return entries
+
+
+def _indexed(row):
+    ''' Converts FILEINDEX row to Entry
+    row (dict): FILEINDEX row
+
+    Directories are stat'd to compare their mtime with the index.
+
+    Returns Entry, or None if directory no longer exists
+    '''
+    if not row['is_dir']:
+        return Entry(row['path'], False, row['size'], row['mtime'], row['inode'])
+    try:
+        st = os.stat(row['path'])
+    except OSError:
+        return None
+    return Entry(row['path'], True, st.st_size, st.st_mtime, st.st_ino)
+
+
+def _settled(rows):
+    ''' Checks if indexed sizes of files in a directory can be trusted
+    rows (list): FILEINDEX rows of directory's contents
+
+    Returns bool False if any file was still being written when indexed
+    '''
+    return all(i['is_dir'] or i['mtime'] is not None for i in rows)
+
+
+def _row(entry, parent=None, unsettled=None):
+    ''' Converts Entry to FILEINDEX row
+    entry (Entry): file or directory
+    parent (str): path to directory containing entry      <optional - default parent of entry.path>
+    unsettled (float): timestamp, files modified after it get no mtime     <optional - default None>
+
+    mtime and inode of directories are only stored when they are listed, so
+        directories that are only seen in their parent get neither.
+
+    Returns dict
+    '''
+    row = {'path': entry.path,
+           'parent': parent or os.path.dirname(entry.path),
+           'is_dir': int(entry.is_dir),
+           'size': entry.size,
+           'mtime': entry.mtime,
+           'inode': entry.inode
+           }
+    if entry.is_dir and parent:
+        row['mtime'] = row['inode'] = None
+    elif not entry.is_dir and unsettled is not None and entry.mtime > unsettled:
+        row['mtime'] = None
+    return row
+
+
+def _contains(link, directory):
+    ''' Checks if link points to directory or one of its parents
+    link (str): path to symlinked directory
+    directory (str): directory containing link
+
+    Returns bool
+    '''
+    target = os.path.realpath(link)
+    try:
+        return os.path.commonpath([target, os.path.realpath(directory)]) == target
+    except ValueError:
+        return False
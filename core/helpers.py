@@ -1,7 +1,11 @@
 from base64 import b32decode as bd
 from base64 import b16encode as be
+from concurrent.futures import ThreadPoolExecutor
 from random import choice as rc
+import asyncio
+import email.utils
 import hashlib
+import http.cookiejar
 from lib import requests
 import random
 import unicodedata
@@ -10,9 +14,153 @@ from string import punctuation
 import core
 import logging
 import re
+import threading
+import time
+import urllib.parse
 
 
 logging.getLogger('lib.requests').setLevel(logging.CRITICAL)
+# extra connections beyond Url.pool_size are simply closed, no need to warn
+logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+
+
+class _NoCookies(http.cookiejar.DefaultCookiePolicy):
+    ''' Cookie policy that refuses to store any cookie '''
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class RateLimiter:
+    ''' Token bucket rate limiter
+
+    Tokens refill continuously at rate per second, up to capacity. Each request
+        takes one token. When the bucket is empty callers reserve the next token
+        and sleep until it is due, so waiting callers are served in the order
+        they asked and never poll.
+
+    Limiters are shared by name, usually a host name, see RateLimiter.get().
+    '''
+
+    # {host: (tokens per second, capacity)} for apis with a published limit
+    hosts = {'api.themoviedb.org': (3, 10),         # 40 requests per 10 seconds
+             'api.trakt.tv': (3, 100),              # 1000 requests per 5 minutes
+             'www.googleapis.com': (1, 5),
+             'predb.me': (0.4, 6)                   # 30 requests per minute
+             }
+
+    # seconds to back off after 429 response without usable Retry-After
+    default_retry_after = 10
+    max_retry_after = 120
+
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(self, rate, capacity):
+        ''' Creates full bucket
+        rate (float): tokens added per second
+        capacity (int): max number of tokens, ie burst size
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get(name, rate=None, capacity=1):
+        ''' Gets shared limiter
+        name (str): name of limiter, ie host name
+        rate (float): tokens added per second               <optional - default None>
+        capacity (int): max number of tokens                <optional - default 1>
+
+        If rate is passed, limiter is created if it doesn't exist and its rate
+            and capacity are updated to match. Otherwise only existing limiters
+            and limiters for RateLimiter.hosts are returned.
+
+        Returns object RateLimiter or None
+        '''
+        if rate is None and name in RateLimiter.hosts:
+            rate, capacity = RateLimiter.hosts[name]
+
+        with RateLimiter._limiters_lock:
+            limiter = RateLimiter._limiters.get(name)
+            if rate is None:
+                return limiter
+            if limiter is None:
+                limiter = RateLimiter(rate, capacity)
+                RateLimiter._limiters[name] = limiter
+            elif (limiter.rate, limiter.capacity) != (rate, capacity):
+                with limiter.lock:
+                    limiter._refill()
+                    limiter.rate = rate
+                    limiter.capacity = capacity
+                    limiter.tokens = min(limiter.tokens, capacity)
+            return limiter
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        ''' Takes a token, borrowing against future refills if necessary
+
+        Returns float seconds caller must wait before using the token
+        '''
+        with self.lock:
+            self._refill()
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        ''' Waits for a token
+
+        Does not return
+        '''
+        wait = self.reserve()
+        if wait > 0:
+            logging.debug(f'Rate limited, waiting {wait:.2f} seconds.')
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        ''' Waits for a token without blocking the event loop
+
+        Does not return
+        '''
+        wait = self.reserve()
+        if wait > 0:
+            logging.debug(f'Rate limited, waiting {wait:.2f} seconds.')
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        ''' Stops handing out tokens for a while, ie after a 429 response
+        seconds (float): seconds until next token
+
+        Does not return
+        '''
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    @staticmethod
+    def retry_after(response):
+        ''' Reads Retry-After header of response
+        response (object): requests response
+
+        Header may be seconds or an http date.
+
+        Returns float seconds to wait
+        '''
+        value = response.headers.get('Retry-After', '')
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = RateLimiter.default_retry_after
+        return min(max(seconds, 0), RateLimiter.max_retry_after)
 
 
 class Url:
@@ -31,7 +179,21 @@ class Url:
                    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/55.0.2883.87 Safari/537.36'
                    )
 
-    trans = {i: ' ' for i in map(ord, '+.-_')}
+    # times to retry GET requests answered with 429
+    retries = 2
+
+    # max keep-alive connections kept open per host
+    pool_size = 10
+
+    # max requests Url.open_async has in flight at once, across all hosts
+    async_workers = 64
+
+    _sessions = {}              # dict of (scheme, netloc, proxied): requests.Session
+    _pool = None                # ThreadPoolExecutor for Url.open_async
+    _sessions_lock = threading.Lock()
+
+    # runs of punctuation and spaces, replaced with a single space by normalize()
+    separators = re.compile('[{} ]+'.format(re.escape(punctuation)))
 
     @staticmethod
     def normalize(s, ascii_only=False):
@@ -45,11 +207,7 @@ class Url:
 
         Returns str
         '''
-        s = s.translate(Url.trans)
-        for i in punctuation:
-            s = s.replace(i, ' ')
-        while '  ' in s:
-            s = s.replace('  ', ' ')
+        s = Url.separators.sub(' ', s)
 
         s = unicodedata.normalize('NFKD', s)
 
@@ -59,19 +217,129 @@ class Url:
         return s.lower().strip()
 
     @staticmethod
-    def open(url, post_data=None, timeout=30, headers={}, stream=False, proxy_bypass=False, expose_user_agent=False, allow_redirects=True):
+    def session(url, proxied=False):
+        ''' Gets shared requests Session for url's host
+        url (str): url that will be requested
+        proxied (bool): if request will be sent through proxy   <optional - default False>
+
+        Sessions keep connections to their host alive, so repeat requests skip the
+            TCP and TLS handshakes. Proxied and direct requests use separate
+            sessions so their connections are never mixed.
+
+        Sessions never store cookies, so requests behave as if each was made
+            on its own. Cookies set during redirects are still sent on to the
+            redirect target.
+
+        Returns object requests.Session
+        '''
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc.lower(), proxied)
+
+        session = Url._sessions.get(key)
+        if session is None:
+            with Url._sessions_lock:
+                session = Url._sessions.get(key)
+                if session is None:
+                    logging.debug('Creating {} session for {}://{}'.format('proxied' if proxied else 'direct', parts.scheme, parts.netloc))
+                    session = requests.Session()
+                    session.cookies.set_policy(_NoCookies())
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=Url.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    Url._sessions[key] = session
+        return session
+
+    @staticmethod
+    def open(url, post_data=None, timeout=30, headers=None, stream=False, proxy_bypass=False, expose_user_agent=False, allow_redirects=True):
         ''' Assemles and executes requests call
         url (str): url to request
         post-data (dict): data to send via post                     <optional - default None>
         timeout (int): seconds to wait for timeout                  <optional - default 30>
-        headers (dict): headers to send with request                <optional - default {}>
+        headers (dict): headers to send with request                <optional - default None>
         stream (bool): whether or not to read bytes from response   <optional - default False>
         proxy_bypass (bool): bypass proxy if any are enabled        <optional - default False>
 
-        Adds user-agent to headers.
+        Adds user-agent to headers. Requests are sent on the host's shared session,
+            see Url.session().
+
+        Waits for host's RateLimiter, if it has one. If the host responds with 429
+            it is paused for Retry-After seconds, and GET requests are retried.
+
+        Returns object requests response
+        '''
+        session, kwargs = Url._prepare(url, post_data, timeout, headers, stream, proxy_bypass, expose_user_agent, allow_redirects)
+
+        host = urllib.parse.urlsplit(url).hostname or ''
+        limiter = RateLimiter.get(host)
+        retries = 0 if post_data else Url.retries
+
+        while True:
+            if limiter:
+                limiter.acquire()
+
+            r = Url._send(session, url, post_data, kwargs)
+
+            if r.status_code != 429:
+                break
+            limiter, wait = Url._back_off(host, limiter, r)
+            if not retries:
+                break
+            retries -= 1
+            logging.warning(f'Too many requests to {host}, retrying in {wait:.1f} seconds.')
+            # streamed responses hold their connection until closed
+            r.close()
+
+        if r.status_code != 200:
+            logging.warning('Error code {} in response from {}'.format(r.status_code, r.request.url.split('?')[0]))
+
+        return r
+
+    @staticmethod
+    async def open_async(url, post_data=None, timeout=30, headers=None, stream=False, proxy_bypass=False, expose_user_agent=False, allow_redirects=True):
+        ''' Async version of Url.open
+
+        Takes the same arguments as Url.open. Waiting for the host's RateLimiter
+            and Retry-After happens on the event loop. The request itself is sent
+            on the host's shared session from the Url.async_workers pool, so
+            connections are pooled and reused the same as Url.open.
 
         Returns object requests response
         '''
+        session, kwargs = Url._prepare(url, post_data, timeout, headers, stream, proxy_bypass, expose_user_agent, allow_redirects)
+
+        host = urllib.parse.urlsplit(url).hostname or ''
+        limiter = RateLimiter.get(host)
+        retries = 0 if post_data else Url.retries
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if limiter:
+                await limiter.acquire_async()
+
+            r = await loop.run_in_executor(Url._executor(), Url._send, session, url, post_data, kwargs)
+
+            if r.status_code != 429:
+                break
+            limiter, wait = Url._back_off(host, limiter, r)
+            if not retries:
+                break
+            retries -= 1
+            logging.warning(f'Too many requests to {host}, retrying in {wait:.1f} seconds.')
+            # streamed responses hold their connection until closed
+            r.close()
+
+        if r.status_code != 200:
+            logging.warning('Error code {} in response from {}'.format(r.status_code, r.request.url.split('?')[0]))
+
+        return r
+
+    @staticmethod
+    def _prepare(url, post_data, timeout, headers, stream, proxy_bypass, expose_user_agent, allow_redirects):
+        ''' Builds session and requests arguments for Url.open and Url.open_async
+
+        Returns tuple (object requests.Session, dict kwargs)
+        '''
+        headers = dict(headers) if headers else {}
         if expose_user_agent:
             headers['User-Agent'] = 'Watcher3'
         else:
@@ -81,19 +349,45 @@ class Url:
 
         kwargs = {'timeout': timeout, 'verify': verifySSL, 'stream': stream, 'headers': headers, 'allow_redirects': allow_redirects}
 
+        if post_data:
+            kwargs['data'] = post_data
+
         if not proxy_bypass:
             kwargs['proxies'] = Url.proxies
 
+        return Url.session(url, proxied=bool(kwargs.get('proxies'))), kwargs
+
+    @staticmethod
+    def _send(session, url, post_data, kwargs):
         if post_data:
-            kwargs['data'] = post_data
-            r = requests.post(url, **kwargs)
+            return session.post(url, **kwargs)
         else:
-            r = requests.get(url, **kwargs)
+            return session.get(url, **kwargs)
 
-        if r.status_code != 200:
-            logging.warning('Error code {} in response from {}'.format(r.status_code, r.request.url.split('?')[0]))
+    @staticmethod
+    def _back_off(host, limiter, response):
+        ''' Pauses host for Retry-After seconds of 429 response
 
-        return r
+        Returns tuple (object RateLimiter for host, float seconds paused)
+        '''
+        wait = RateLimiter.retry_after(response)
+        if not limiter:
+            # only enforces the pause, actual rate is unknown
+            limiter = RateLimiter.get(host, rate=10, capacity=10)
+        limiter.pause(wait)
+        return limiter, wait
+
+    @staticmethod
+    def _executor():
+        ''' Gets thread pool used by Url.open_async
+
+        Returns object concurrent.futures.ThreadPoolExecutor
+        '''
+        if Url._pool is None:
+            with Url._sessions_lock:
+                if Url._pool is None:
+                    Url._pool = ThreadPoolExecutor(max_workers=Url.async_workers, thread_name_prefix='http')
+        return Url._pool
 
 
 class Conversions:
@@ -4,14 +4,16 @@ import json
 import datetime
 import logging
 import csv
+import itertools
+import multiprocessing
+import queue
 import threading
-from core import searchresults, plugins
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from core import fileindex, mediaprobe, searchresults, plugins, ptncache, sources, sqlquery
 import core
 from core.movieinfo import TheMovieDatabase, Poster
 from core.helpers import Url
-from hachoir.parser import createParser
-from hachoir.metadata import extractMetadata
-import PTN
 from gettext import gettext as _
 
 
@@ -27,59 +29,33 @@ class ImportDirectory:
         minsize (int): minimum filesize in MB                       <optional - default 500>
         recursive (bool): scan recursively or just root directory   <optional - default True>
 
-        Checks mimetype for video type
+        Files are found with fileindex.scan(), so only directories that changed
+            since the last scan are listed.
 
-        Returns dict ajax-style response
+        Returns dict ajax-style response {'files': [paths], 'sizes': {path: bytes}}
         '''
 
         logging.info(f'Scanning {directory} for movies.')
 
-        files = []
         try:
-            if recursive:
-                files = ImportDirectory._walk(directory)
-            else:
-                files = [os.path.join(directory, i) for i in os.listdir(directory) if os.path.isfile(os.path.join(directory, i))]
+            entries = fileindex.scan(directory, recursive=recursive)
         except Exception as e:
-            logging.debug(f'scan_dir() ImportDirectory._walk exception {str(e)}')
+            logging.debug(f'scan_dir() fileindex.scan exception {str(e)}')
             return {'error': str(e)}
 
-        f = []
         logging.debug(f'Specified minimum file size: {minsize * 1024**2} Bytes.')
         ms = minsize * 1024**2
-        for i in files:
-            # Ignore file not found errors (eg file was deleted between directory walk and size check)
-            try:
-                s = os.path.getsize(i)
-                if not s >= (ms):
-                    logging.debug(f'{i} size is {s} skipping.')
-                    continue
-                f.append(i)
-            except Exception as e:
-                logging.debug(f'scan_dir() os.path.getsize exception {str(e)}')
-                continue
-
-        return {'files': f}
-
-    @staticmethod
-    def _walk(directory):
-        ''' Recursively gets all files in dir
-        directory: directory to scan for files
-
-        Returns list of absolute file paths
-        '''
 
         files = []
-        dir_contents = os.listdir(directory)
-        for i in dir_contents:
-            full_path = os.path.join(directory, i)
-            if os.path.isdir(full_path):
-                logging.debug(f'Scanning {directory}{os.sep}{i}')
-                files = files + ImportDirectory._walk(full_path)
-            else:
-                logging.debug(f'Found file {full_path}')
-                files.append(full_path)
-        return files
+        sizes = {}
+        for i in entries:
+            if not i.size >= (ms):
+                logging.debug(f'{i.path} size is {i.size} skipping.')
+                continue
+            files.append(i.path)
+            sizes[i.path] = i.size
+
+        return {'files': files, 'sizes': sizes}
 
 
 class ImportKodiLibrary:
@@ -324,7 +300,7 @@ class ImportCPLibrary:
                             name = i['identifier'].lower()
                         else:
                             continue
-                        title_data = PTN.parse(name)
+                        title_data = ptncache.parse(name)
 
                         movie['audiocodec'] = title_data.get('audio')
                         movie['videocodec'] = title_data.get('codec')
@@ -389,6 +365,15 @@ class Metadata:
     ''' Methods for gathering/preparing metadata for movies
     '''
 
+    # processes parsing file headers in from_files(), None to use one per cpu
+    media_workers = None
+
+    # fewer files are parsed in the lookup threads, starting processes isn't worth it
+    media_min_files = 50
+
+    # threads looking up files on TheMovieDB in from_files()
+    tmdb_workers = 8
+
     @staticmethod
     def from_file(filepath, imdbid=None):
         ''' Gets video metadata using hachoir.parser
@@ -402,6 +387,105 @@ class Metadata:
 
         logging.info(f'Gathering metadata for {filepath}.')
 
+        return Metadata._resolve(filepath, Metadata.parse_media(filepath), imdbid=imdbid)
+
+    @staticmethod
+    def from_files(filepaths):
+        ''' Gets video metadata of many files concurrently
+        filepaths (list): str absolute paths to movie files
+
+        Files go through two stages. File headers are parsed by hachoir in a
+            pool of Metadata.media_workers processes, since parsing is cpu bound.
+            File names are then parsed and looked up on TheMovieDB by
+            Metadata.tmdb_workers threads, whose requests are rate limited by
+            Url.open. Headers are parsed in the lookup threads instead if there
+            are fewer than Metadata.media_min_files, only one cpu, or processes
+            can't be used.
+
+        Stops all work that hasn't started yet if the generator is closed.
+
+        Yields tuple (str path, dict metadata or Exception) in the order files finish
+        '''
+        if not filepaths:
+            return
+
+        media_pool = Metadata._media_pool(len(filepaths))
+        tmdb_pool = ThreadPoolExecutor(max_workers=Metadata.tmdb_workers, thread_name_prefix='metadata')
+
+        finished = queue.Queue()
+        parsing = {}
+        resolving = {}
+
+        def submit(stage, pool, path, func, *args):
+            future = pool.submit(func, *args)
+            stage[future] = path
+            future.add_done_callback(finished.put)
+
+        try:
+            for path in filepaths:
+                if media_pool:
+                    submit(parsing, media_pool, path, mediaprobe.read_header, path)
+                else:
+                    submit(resolving, tmdb_pool, path, Metadata.from_file, path)
+
+            for i in range(len(filepaths) * 2 if media_pool else len(filepaths)):
+                future = finished.get()
+                if future in parsing:
+                    path = parsing.pop(future)
+                    try:
+                        filedata = Metadata._media_metadata(future.result())
+                    except BrokenProcessPool:
+                        logging.warning(f'Metadata worker process failed, retrying {path}.')
+                        submit(resolving, tmdb_pool, path, Metadata.from_file, path)
+                        continue
+                    except Exception as e:
+                        logging.error(f'Unable to parse metadata from file header of {path}.', exc_info=True)
+                        filedata = {}
+                    submit(resolving, tmdb_pool, path, Metadata._resolve, path, filedata)
+                else:
+                    path = resolving.pop(future)
+                    try:
+                        yield path, future.result()
+                    except Exception as e:
+                        yield path, e
+        finally:
+            # Executor.shutdown(cancel_futures=True) needs python 3.9
+            for future in itertools.chain(parsing, resolving):
+                future.cancel()
+            if media_pool:
+                media_pool.shutdown(wait=False)
+            tmdb_pool.shutdown(wait=False)
+
+    @staticmethod
+    def _media_pool(count):
+        ''' Creates process pool for parsing file headers
+        count (int): number of files to parse
+
+        Workers are spawned rather than forked, forking a process that runs
+            other threads can leave locks held in the child.
+
+        Returns object concurrent.futures.ProcessPoolExecutor or None if processes are not worth using
+        '''
+        workers = min(count, Metadata.media_workers or os.cpu_count() or 1)
+        if workers < 2 or count < Metadata.media_min_files:
+            return None
+        try:
+            return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except Exception as e:
+            logging.warning('Unable to start metadata worker processes.', exc_info=True)
+            return None
+
+    @staticmethod
+    def _resolve(filepath, filedata, imdbid=None):
+        ''' Combines file name, file header and TMDB metadata
+        filepath (str): absolute path to movie file
+        filedata (dict): metadata from parse_media()
+        imdbid (str): imdb id #             <optional - Default None>
+
+        Returns dict
+        '''
         data = {
             'title': None,
             'year': None,
@@ -421,7 +505,6 @@ class Metadata:
         titledata = Metadata.parse_filename(filepath)
         data.update(titledata)
 
-        filedata = Metadata.parse_media(filepath)
         data.update(filedata)
 
         if data.get('resolution'):
@@ -472,16 +555,22 @@ class Metadata:
         '''
 
         logging.info(f'Parsing codec data from file {filepath}.')
-        metadata = {}
         try:
-            with createParser(filepath) as parser:
-                extractor = extractMetadata(parser)
-            filedata = extractor.exportDictionary(human=False)
-            parser.stream._input.close()
-
+            filedata = mediaprobe.read_header(filepath)
         except Exception as e:
             logging.error('Unable to parse metadata from file header.', exc_info=True)
-            return metadata
+            return {}
+
+        return Metadata._media_metadata(filedata)
+
+    @staticmethod
+    def _media_metadata(filedata):
+        ''' Reads resolution and codecs from file header
+        filedata (dict): hachoir metadata from mediaprobe.read_header()
+
+        Returns dict of metadata
+        '''
+        metadata = {}
 
         if filedata:
             # For mp4, mvk, avi in order
@@ -527,7 +616,7 @@ class Metadata:
 
         logging.info(f'Parsing directory name for movie information: {dirname}.')
 
-        meta_data = PTN.parse(dirname)
+        meta_data = ptncache.parse(dirname)
         for i in ('excess', 'episode', 'episodeName', 'season', 'garbage', 'website'):
             meta_data.pop(i, None)
 
@@ -537,7 +626,7 @@ class Metadata:
         else:
             logging.debug('Parsing directory name does not look accurate. Parsing file name.')
             filename = os.path.basename(filepath)
-            meta_data = PTN.parse(filename)
+            meta_data = ptncache.parse(filename)
             logging.info(f'Found {meta_data} in file name.')
             if len(meta_data) < 2:
                 logging.warning('Little information found in file name. Movie may be incomplete.')
@@ -554,12 +643,7 @@ class Metadata:
         meta_data['audiocodec'] = meta_data.pop('audio', None)
         meta_data['category'] = Metadata.get_category_from_path(filepath)
 
-        qual = meta_data.pop('quality', '')
-        for source, aliases in core.CONFIG['Quality']['Aliases'].items():
-            if any(a.lower() == qual.lower() for a in aliases):
-                meta_data['source'] = source
-                break
-        meta_data.setdefault('source', None)
+        meta_data['source'] = sources.get_matcher().exact(meta_data.pop('quality', ''))
 
         meta_data['releasegroup'] = meta_data.pop('group', None)
 
@@ -664,7 +748,8 @@ class Metadata:
             if isinstance(v, str):
                 movie[k] = v.strip()
 
-        movie = {k: v for k, v in movie.items() if k in [i.name for i in core.sql.MOVIES.c]}
+        columns = set(core.sql.MOVIES.c.keys())
+        movie = {k: v for k, v in movie.items() if k in columns}
 
         return movie
 
@@ -711,7 +796,8 @@ class Metadata:
         If force_poster is True, the poster will be re-downloaded.
         If force_poster is False, the poster will only be redownloaded if the local
             database does not have a 'poster' filepath stored. In other words, this
-            will only grab missing posters.
+            will only grab missing posters. Posters are downloaded in the
+            background, see Poster.queue().
 
         Returns dict ajax-style response
         '''
@@ -750,8 +836,6 @@ class Metadata:
 
         new_data.pop('status')
 
-        target_poster = os.path.join(Poster.folder, f'{imdbid}.jpg')
-
         if new_data.get('poster_path'):
             poster_path = 'http://image.tmdb.org/t/p/w300{}'.format(new_data['poster_path'])
             movie['poster'] = '{}.jpg'.format(movie['imdbid'])
@@ -764,16 +848,7 @@ class Metadata:
         core.sql.update_multiple_values('MOVIES', movie, 'imdbid', imdbid)
 
         if poster_path and get_poster:
-            if os.path.isfile(target_poster):
-                try:
-                    os.remove(target_poster)
-                except FileNotFoundError:
-                    pass
-                except Exception as e:
-                    logging.warning('Unable to remove existing poster.', exc_info=True)
-                    return {'response': False, 'error': 'Unable to remove existing poster.'}
-
-            Poster.save(imdbid, poster_path)
+            Poster.queue(imdbid, poster_path, replace=True)
 
         return {'response': True, 'message': 'Metadata updated.'}
 
@@ -782,6 +857,9 @@ class Manage:
     ''' Methods to manipulate status of movies or search results in database
     '''
 
+    # movies written per transaction by add_movies_bulk()
+    bulk_size = 500
+
     @staticmethod
     def scanmissingfiles():
         movies = core.sql.execute(['SELECT * FROM MOVIES WHERE finished_file is not null'])
@@ -794,8 +872,9 @@ class Manage:
 
         action = core.CONFIG['System']['FileManagement']['missingfileaction']
         db_update_values = []
+        found = fileindex.existing(i['finished_file'] for i in movies)
         for i in movies:
-            if not os.path.exists(i['finished_file']):
+            if i['finished_file'] not in found:
                 logging.info('File {} is missing for movie {}'.format(i['finished_file'], i['title']))
 
                 if action == 'remove':
@@ -943,7 +1022,7 @@ class Manage:
         else:
             if poster_path:
                 poster_url = f'http://image.tmdb.org/t/p/w300/{poster_path}'
-                threading.Thread(target=Poster.save, args=(movie['imdbid'], poster_url)).start()
+                Poster.queue(movie['imdbid'], poster_url)
 
             response['response'] = True
             response['message'] = _('{} {} added to library.').format(movie['title'], movie['year'])
@@ -951,6 +1030,107 @@ class Manage:
 
         return response
 
+    @staticmethod
+    def add_movies_bulk(movies, full_metadata=False, imported=False):
+        ''' Adds many movies to library
+        movies (list): dicts of movie info to add to database
+        full_metadata (bool): if data is complete and ready for write     <optional - default False>
+        imported (bool): if movies are finished library imports          <optional - default False>
+
+        Does the same as add_movie() for every movie, Manage.bulk_size movies
+            at a time. Missing metadata is gathered from TMDB concurrently,
+            movies already in the library are found with one query, and all
+            movies are written in one transaction. Posters are downloaded in
+            the background by Poster.queue().
+
+        If imported, a simulacrum search result is scored and written for every
+            movie along with it, and used as the movie's finished_score.
+
+        Yields tuple (dict movie, dict ajax-style response) in the same order as movies
+        '''
+
+        seen = set()
+        for batch in sqlquery.chunks(movies, Manage.bulk_size):
+            logging.info(f'Adding {len(batch)} movies to library.')
+
+            responses = [{} for i in batch]
+
+            if not full_metadata:
+                with ThreadPoolExecutor(max_workers=Metadata.tmdb_workers, thread_name_prefix='metadata') as pool:
+                    for movie, response, tmdb_data in zip(batch, responses, pool.map(lambda m: TheMovieDatabase._search_tmdbid(m['id']), batch)):
+                        if not tmdb_data:
+                            response.update({'response': False, 'error': _('Unable to find {} on TMDB.').format(movie['id'])})
+                            continue
+                        tmdb_data = tmdb_data[0]
+                        tmdb_data.pop('status')
+                        if not tmdb_data.get('imdbid'):
+                            tmdb_data.pop('imdbid', None)
+                        movie.update(tmdb_data)
+
+            for movie, response in zip(batch, responses):
+                if not response and not movie.get('imdbid'):
+                    logging.warning('Unable to find IMDB ID for {}.'.format(movie.get('title', movie.get('id'))))
+                    response.update({'response': False, 'error': _('Unable to find IMDB ID for {} on TheMovieDB.').format(movie.get('title', movie.get('id')))})
+
+            existing = core.sql.get_movies_status('imdbid', [m['imdbid'] for m, r in zip(batch, responses) if not r])
+            seen.update(i['imdbid'].lower() for i in existing)
+
+            rows = []
+            posters = []
+            fake_results = []
+            for movie, response in zip(batch, responses):
+                if response:
+                    continue
+
+                if movie['imdbid'].lower() in seen:
+                    logging.info('{} already exists in library.'.format(movie['title']))
+                    response.update({'response': False, 'error': _('{} already exists in library.').format(movie['title'])})
+                    continue
+                seen.add(movie['imdbid'].lower())
+
+                if not movie.get('category', None) and movie.get('finished_file', None):
+                    movie['category'] = Metadata.get_category_from_path(movie['finished_file'])
+                movie.setdefault('quality', 'Default')
+                movie.setdefault('category', 'Default')
+                movie.setdefault('status', 'Waiting')
+                movie.setdefault('origin', 'Search')
+
+                row = Metadata.convert_to_db(movie)
+                rows.append(row)
+                if movie.get('poster_path'):
+                    posters.append((row['imdbid'], 'http://image.tmdb.org/t/p/w300/{}'.format(movie['poster_path'])))
+                if imported:
+                    fake_results.append(searchresults.generate_simulacrum(movie))
+
+            if fake_results:
+                scores = {r['imdbid']: r['score'] for r in reversed(searchresults.score(fake_results, imported=True))}
+                for row in rows:
+                    row['finished_score'] = scores.get(row['imdbid'])
+
+            if rows:
+                with core.sql.transaction():
+                    written = core.sql.write_movies(rows) and core.sql.write_search_results(fake_results)
+            else:
+                written = True
+
+            rows = iter(rows)
+            for movie, response in zip(batch, responses):
+                if response:
+                    continue
+                row = next(rows)
+                if not written:
+                    seen.discard(row['imdbid'].lower())
+                    response.update({'response': False, 'error': _('Could not write to database.')})
+                    continue
+                response.update({'response': True, 'message': _('{} {} added to library.').format(row['title'], row['year'])})
+                plugins.added(row['title'], row['year'], row['imdbid'], row['quality'])
+
+            if written:
+                for imdbid, url in posters:
+                    Poster.queue(imdbid, url)
+
+            yield from zip(batch, responses)
+
     @staticmethod
     def remove_movie(imdbid):
         ''' Remove movie from library
@@ -1082,18 +1262,24 @@ class Manage:
         Returns str new movie status
         '''
 
-        logging.info(f'Determining appropriate status for movie {imdbid}.')
+        return Manage.movie_statuses([imdbid]).get(imdbid, '')
 
-        movie = core.sql.get_movie_details('imdbid', imdbid)
-        if movie:
-            current_status = movie.get('status')
-        else:
-            return ''
+    @staticmethod
+    def movie_statuses(imdbids):
+        ''' Updates status of several movies.
+        imdbids (list): imdb identification numbers
+
+        Same rules as movie_status, but reads the movies and their search
+            results with one query each and writes every new status in a
+            single statement.
+
+        Returns dict {imdbid: new status}, status is '' if the movie was not
+            found or could not be updated
+        '''
 
-        if current_status == 'Disabled':
-            return 'Disabled'
+        logging.info(f'Determining appropriate status for {len(imdbids)} movies.')
 
-        new_status = None
+        movies = {i['imdbid']: i for i in core.sql.get_movies(imdbids)}
 
         t = []
 
@@ -1102,30 +1288,45 @@ class Manage:
         if core.CONFIG['Downloader']['Sources']['torrentenabled']:
             t += ['torrent', 'magnet']
 
-        cmd = 'SELECT DISTINCT status FROM SEARCHRESULTS WHERE imdbid="{}" AND (reject_reason IS NULL OR status <> "{}")' \
-              'AND type IN ("import", "{}")'.format(imdbid, 'Available', '", "'.join(t))
+        active = [i for i in imdbids if i in movies and movies[i].get('status') != 'Disabled']
 
-        try:
-            result_status = [i['status'] for i in core.sql.execute([cmd]).fetchall()] or []
-        except Exception as e:
-            logging.warning('Unable to determine movie status.', exc_info=True)
-            result_status = []
-
-        if 'Finished' in result_status:
-            new_status = 'Finished'
-        elif 'Snatched' in result_status:
-            new_status = 'Snatched'
-        elif 'Available' in result_status:
-            new_status = 'Found'
-        else:
-            new_status = 'Wanted' if Manage.verify(movie) else 'Waiting'
+        result_statuses = core.sql.get_search_result_statuses(active, ['import'] + t) if active else {}
+        if result_statuses is None:
+            logging.warning('Unable to determine movie status.')
+            result_statuses = {}
+
+        statuses = {}
+        updates = {}
+        for imdbid in imdbids:
+            movie = movies.get(imdbid)
+            if not movie:
+                statuses[imdbid] = ''
+                continue
+            if movie.get('status') == 'Disabled':
+                statuses[imdbid] = 'Disabled'
+                continue
 
-        logging.info(f'Setting MOVIES {imdbid} status to {new_status}.')
-        if core.sql.update('MOVIES', 'status', new_status, 'imdbid', imdbid):
-            return new_status
+            result_status = result_statuses.get(imdbid, set())
+
+            if 'Finished' in result_status:
+                new_status = 'Finished'
+            elif 'Snatched' in result_status:
+                new_status = 'Snatched'
+            elif 'Available' in result_status:
+                new_status = 'Found'
+            else:
+                new_status = 'Wanted' if Manage.verify(movie) else 'Waiting'
+
+            logging.info(f'Setting MOVIES {imdbid} status to {new_status}.')
+            updates[imdbid] = new_status
+
+        if core.sql.update_movie_statuses(updates):
+            statuses.update(updates)
         else:
-            logging.error(f'Could not set {imdbid} to {new_status}')
-            return ''
+            logging.error('Could not set status for {}'.format(', '.join(updates)))
+            statuses.update({k: '' for k in updates})
+
+        return statuses
 
     @staticmethod
     def add_status_to_search_movies(results):
@@ -0,0 +1,23 @@
+from hachoir.parser import createParser
+from hachoir.metadata import extractMetadata
+
+# Reads media file headers with hachoir
+#
+# Only imports hachoir so it can be loaded quickly in the worker processes used
+# by library.Metadata.from_files(), which don't run watcher.py's setup and can't
+# import the rest of core.
+
+
+def read_header(filepath):
+    ''' Parses file header
+    filepath (str): absolute path to file
+
+    Raises exception if the header can't be parsed
+
+    Returns dict of hachoir metadata
+    '''
+    with createParser(filepath) as parser:
+        extractor = extractMetadata(parser)
+    filedata = extractor.exportDictionary(human=False)
+    parser.stream._input.close()
+    return filedata
@@ -1,9 +1,14 @@
 import json
 import logging
-from time import time, sleep
 import core
 import os
 import re
+import collections
+import queue
+import tempfile
+import threading
+import time
+from core import tmdbcache
 from core.helpers import Comparisons, Url
 _k = Comparisons._k
 
@@ -11,38 +16,16 @@ logging = logging.getLogger(__name__)
 
 
 class TheMovieDatabase:
-    tokens = 30             # int initial amount of tokens for TMDB rate limiting
-    last_token_fill = time()      # float epoch time of last token fill
-    token_capacity = 30     # int max number of tokens. TMDB allows more, but artificially restricting the hit rate doesn't hurt
 
     @staticmethod
-    def _get_tokens():
-        ''' Refills TMDB tokens if possible
+    def _open(url, endpoint):
+        ''' Requests url from TMDB api, using cached response if possible
+        url (str): api url, including api key
+        endpoint (str): type of request, see core.tmdbcache.ttls
 
-        If tokens are needed, checks if they've been refilled in the
-            last 10 seconds and tops off the capacity.
-
-        Returns int # of tmdb tokens available
-        '''
-        if TheMovieDatabase.tokens < TheMovieDatabase.token_capacity:
-            now = time()
-            if (now - TheMovieDatabase.last_token_fill) > 10:
-                TheMovieDatabase.tokens = TheMovieDatabase.token_capacity
-                TheMovieDatabase.last_token_fill = time()
-        return TheMovieDatabase.tokens
-
-    @staticmethod
-    def _use_token():
-        ''' Uses tmdb api token
-
-        Used as a blocking method before url requests.
-        If remaining tokens are fewer than 3 waits for refill.
-
-        Does not return
+        Returns object response with status_code and text
         '''
-        while TheMovieDatabase._get_tokens() < 3:
-            sleep(0.3)
-        TheMovieDatabase.tokens -= 1
+        return tmdbcache.get(url, endpoint)
 
     @staticmethod
     def search(search_term, single=False):
@@ -103,10 +86,8 @@ class TheMovieDatabase:
         logging.info(f'Searching TMDB {url}')
         url = url + '&api_key={}'.format(_k(b'tmdb'))
 
-        TheMovieDatabase._use_token()
-
         try:
-            results = json.loads(Url.open(url).text)
+            results = json.loads(TheMovieDatabase._open(url, 'search').text)
             if results.get('success') == 'false':
                 return []
             else:
@@ -132,10 +113,8 @@ class TheMovieDatabase:
         logging.info(f'Searching TMDB {url}')
         url = url + '&api_key={}'.format(_k(b'tmdb'))
 
-        TheMovieDatabase._use_token()
-
         try:
-            results = json.loads(Url.open(url).text)
+            results = json.loads(TheMovieDatabase._open(url, 'find').text)
             if results['movie_results'] == []:
                 return []
             else:
@@ -165,10 +144,8 @@ class TheMovieDatabase:
         logging.info(f'Searching TMDB {url}')
         url += '&api_key={}'.format(_k(b'tmdb'))
 
-        TheMovieDatabase._use_token()
-
         try:
-            response = Url.open(url)
+            response = TheMovieDatabase._open(url, 'movie')
             if response.status_code != 200:
                 logging.warning(f'Unable to reach TMDB, error {response.status_code}')
                 return []
@@ -254,10 +231,8 @@ class TheMovieDatabase:
 
             url = 'https://api.themoviedb.org/3/search/movie?api_key={}&language=en-US&query={}&year={}&page=1&include_adult={}'.format(_k(b'tmdb'), title, year, 'true' if core.CONFIG['Search']['allowadult'] else 'false')
 
-            TheMovieDatabase._use_token()
-
             try:
-                results = json.loads(Url.open(url).text)
+                results = json.loads(TheMovieDatabase._open(url, 'search').text)
                 results = results['results']
                 if results:
                     tmdbid = results[0]['id']
@@ -271,10 +246,8 @@ class TheMovieDatabase:
 
         url = 'https://api.themoviedb.org/3/movie/{}?api_key={}'.format(tmdbid, _k(b'tmdb'))
 
-        TheMovieDatabase._use_token()
-
         try:
-            results = json.loads(Url.open(url).text)
+            results = json.loads(TheMovieDatabase._open(url, 'movie').text)
             return results.get('imdb_id')
         except Exception as e:
             logging.error('Error attempting to get IMDBID from TMDB.', exc_info=True)
@@ -302,10 +275,8 @@ class TheMovieDatabase:
 
         url += '&api_key={}'.format(_k(b'tmdb'))
 
-        TheMovieDatabase._use_token()
-
         try:
-            results = json.loads(Url.open(url).text)
+            results = json.loads(TheMovieDatabase._open(url, 'similar' if cat == 'similar' else 'category').text)
             if results.get('success') == 'false':
                 logging.warning('Bad request to TheMovieDatabase.')
                 return []
@@ -356,58 +327,325 @@ class Poster:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
+    # threads downloading posters in the background
+    workers = 4
+
+    # tries per poster, seconds before the first retry are doubled for each retry after
+    attempts = 3
+    backoff = 5
+
+    # thumbnail name: TMDB rendition, grid for library tiles and list for rows in library manager
+    sizes = {'grid': 'w185', 'list': 'w92'}
+
+    _queue = queue.Queue()
+    _pending = {}
+    _threads = []
+    _lock = threading.Lock()
+    _stats = {'saved': 0, 'failed': 0, 'retried': 0, 'duplicates': 0}
+    _saved_times = collections.deque(maxlen=1000)
+    _unavailable = set()
+
     @staticmethod
-    def save(imdbid, poster):
+    def queue(imdbid, poster, replace=False):
+        ''' Saves poster locally in the background
+        imdbid (str): imdb id #
+        poster (str): url of poster image.jpg
+        replace (bool): replace existing poster       <optional - default False>
+
+        Posters are saved by Poster.workers threads, so adding many movies at
+            once doesn't start a thread for each. Posters already waiting in
+            the queue are not queued again, the newest url is used. Posters
+            queued with a new url while downloading are downloaded again.
+
+        Does not return
+        '''
+        with Poster._lock:
+            if imdbid in Poster._pending:
+                logging.debug(f'Poster for {imdbid} is already queued.')
+                Poster._stats['duplicates'] += 1
+                Poster._pending[imdbid] = (poster, replace or Poster._pending[imdbid][1])
+                return
+            Poster._pending[imdbid] = (poster, replace)
+            Poster._start_workers()
+
+        Poster._queue.put(imdbid)
+
+    @staticmethod
+    def stats():
+        ''' Gets poster download statistics
+
+        Counts are since start.
+
+        Returns dict {'queued': int, 'saved': int, 'failed': int, 'retried': int, 'duplicates': int, 'per_minute': int}
+        '''
+        now = time.monotonic()
+        with Poster._lock:
+            s = dict(Poster._stats)
+            s['queued'] = len(Poster._pending)
+            s['per_minute'] = len([i for i in Poster._saved_times if now - i < 60])
+        return s
+
+    @staticmethod
+    def _start_workers():
+        ''' Starts missing download threads, call with Poster._lock held '''
+        while len(Poster._threads) < Poster.workers:
+            t = threading.Thread(target=Poster._work, name=f'poster-{len(Poster._threads)}', daemon=True)
+            t.start()
+            Poster._threads.append(t)
+
+    @staticmethod
+    def _work():
+        ''' Saves queued posters and thumbnails until Watcher stops '''
+        while True:
+            key = Poster._queue.get()
+            with Poster._lock:
+                poster, replace = Poster._pending[key]
+            try:
+                if isinstance(key, tuple):
+                    saved = Poster.save_thumbnail(*key)
+                else:
+                    saved = Poster.save(key, poster, replace=replace)
+            except Exception as e:
+                logging.error(f'Unable to save poster for {key}.', exc_info=True)
+                saved = False
+            with Poster._lock:
+                if Poster._pending[key] == (poster, replace):
+                    del Poster._pending[key]
+                else:
+                    # queued again with a new url while downloading
+                    Poster._queue.put(key)
+                if saved:
+                    Poster._stats['saved'] += 1
+                    Poster._saved_times.append(time.monotonic())
+                else:
+                    Poster._stats['failed'] += 1
+
+    @staticmethod
+    def save(imdbid, poster, replace=False):
         ''' Saves poster locally
         imdbid (str): imdb id #
         poster (str): url of poster image.jpg
+        replace (bool): replace existing poster       <optional - default False>
 
         Saves poster as watcher/userdata/posters/[imdbid].jpg
 
-        Does not return
+        The image is streamed into a temporary file that replaces the poster
+            once complete, so a partial download is never served. Failed
+            downloads are tried Poster.attempts times, waiting longer before
+            each retry. Client errors are not retried.
+
+        Thumbnails of TMDB posters are saved along with the poster, replaced
+            posters lose their old thumbnails.
+
+        Returns bool
         '''
 
         logging.info(f'Downloading poster for {imdbid}.')
 
-        new_poster_path = os.path.join(Poster.folder, f'{imdbid}.jpg')
+        new_poster_path = Poster.path(imdbid)
 
-        if os.path.exists(new_poster_path):
+        if os.path.exists(new_poster_path) and not replace:
             logging.warning(f'{new_poster_path} already exists.')
-            return
+            return True
+
+        logging.info(f'Saving poster to {new_poster_path}')
+
+        if not Poster._fetch(poster, new_poster_path, imdbid):
+            logging.error(f'Unable to save poster for {imdbid}.')
+            return False
+
+        logging.info(f'Poster saved to {new_poster_path}')
+
+        Poster._remove_thumbnails(imdbid)
+        for size in Poster.sizes:
+            url = Poster._thumbnail_url(poster, size)
+            if url:
+                Poster._fetch(url, Poster.path(imdbid, size), imdbid)
+        return True
+
+    @staticmethod
+    def thumbnail(imdbid, size):
+        ''' Gets path to poster thumbnail
+        imdbid (str): imdb id #
+        size (str): key in Poster.sizes
+
+        Missing thumbnails of movies that have a poster are queued to be
+            downloaded. Thumbnails that couldn't be downloaded are not tried
+            again until the poster is replaced.
+
+        Returns str absolute path to thumbnail, or None if it doesn't exist yet
+        '''
+        path = Poster.path(imdbid, size)
+        if os.path.exists(path):
+            return path
+
+        if not os.path.exists(Poster.path(imdbid)):
+            return None
+
+        key = (imdbid, size)
+        with Poster._lock:
+            if key in Poster._pending or key in Poster._unavailable:
+                return None
+            Poster._pending[key] = (None, False)
+            Poster._start_workers()
+
+        Poster._queue.put(key)
+        return None
+
+    @staticmethod
+    def save_thumbnail(imdbid, size):
+        ''' Saves thumbnail of an existing poster
+        imdbid (str): imdb id #
+        size (str): key in Poster.sizes
+
+        The url of the poster isn't kept, so it is looked up on TMDB using the
+            movie's tmdbid.
+
+        Saves thumbnail as watcher/userdata/posters/[size]/[imdbid].jpg
+
+        Returns bool
+        '''
+        logging.info(f'Downloading {size} thumbnail for {imdbid}.')
+
+        movie = core.sql.get_movie_details('imdbid', imdbid) or {}
+        results = TheMovieDatabase._search_tmdbid(movie['tmdbid']) if movie.get('tmdbid') else []
+        poster_path = results[0].get('poster_path') if results else None
+        if not poster_path:
+            logging.warning(f'TMDB has no poster for {imdbid}, unable to save {size} thumbnail.')
+            saved = False
         else:
-            logging.info(f'Saving poster to {new_poster_path}')
+            url = 'http://image.tmdb.org/t/p/{}/{}'.format(Poster.sizes[size], poster_path)
+            saved = Poster._fetch(url, Poster.path(imdbid, size), imdbid)
+
+        if not saved:
+            with Poster._lock:
+                Poster._unavailable.add((imdbid, size))
+        return saved
+
+    @staticmethod
+    def path(imdbid, size=None):
+        ''' Gets path to poster or thumbnail
+        imdbid (str): imdb id #
+        size (str): key in Poster.sizes, or None for full size poster     <optional - default None>
+
+        Returns str absolute path
+        '''
+        if size:
+            return os.path.join(Poster.folder, size, f'{imdbid}.jpg')
+        return os.path.join(Poster.folder, f'{imdbid}.jpg')
+
+    @staticmethod
+    def version(imdbid):
+        ''' Gets version of poster to use in urls
+        imdbid (str): imdb id #
+
+        The version changes when the poster is replaced, so it can be added to
+            thumbnail urls that are cached by browsers indefinitely.
+
+        Returns int modification time of poster, or 0 if there is no poster
+        '''
+        try:
+            return int(os.stat(Poster.path(imdbid)).st_mtime)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _thumbnail_url(poster, size):
+        ''' Gets url of TMDB's rendition of poster in size
+        poster (str): url of full size TMDB poster
+        size (str): key in Poster.sizes
+
+        Returns str url, or None if poster is not from TMDB
+        '''
+        prefix = 'http://image.tmdb.org/t/p/w300/'
+        if not poster or not poster.startswith(prefix):
+            return None
+        return 'http://image.tmdb.org/t/p/{}/{}'.format(Poster.sizes[size], poster[len(prefix):])
+
+    @staticmethod
+    def _fetch(url, path, imdbid):
+        ''' Downloads image, retrying failures
+        url (str): url of image
+        path (str): absolute path to save image to
+        imdbid (str): imdb id # of movie image belongs to
+
+        Returns bool
+        '''
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for attempt in range(Poster.attempts):
+            if attempt:
+                wait = Poster.backoff * 2 ** (attempt - 1)
+                logging.info(f'Retrying poster for {imdbid} in {wait} seconds.')
+                with Poster._lock:
+                    Poster._stats['retried'] += 1
+                time.sleep(wait)
 
             try:
-                poster_bytes = Url.open(poster, stream=True).content
+                status = Poster._download(url, path)
             except (SystemExit, KeyboardInterrupt):
                 raise
             except Exception as e:
-                logging.error('Poster save_poster get', exc_info=True)
-                return
+                logging.warning(f'Unable to download poster for {imdbid}.', exc_info=True)
+                continue
+
+            if status == 200:
+                return True
+            elif status < 500 and status != 429:
+                break
+
+        return False
+
+    @staticmethod
+    def _download(url, path):
+        ''' Streams image to file
+        url (str): url of image
+        path (str): absolute path to save image to
 
+        Returns int http status code of response, file is only written if 200
+        '''
+        with Url.open(url, stream=True) as response:
+            if response.status_code != 200:
+                return response.status_code
+
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.{}.'.format(os.path.basename(path)), suffix='.part')
             try:
-                with open(new_poster_path, 'wb') as output:
-                    output.write(poster_bytes)
-                del poster_bytes
-            except (SystemExit, KeyboardInterrupt):
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
                 raise
-            except Exception as e:
-                logging.error('Unable to save poster to disk.', exc_info=True)
-                return
 
-            logging.info(f'Poster saved to {new_poster_path}')
+        return 200
 
     @staticmethod
     def remove(imdbid):
-        ''' Deletes poster from disk.
+        ''' Deletes poster and its thumbnails from disk.
         imdbid (str): imdb id #
 
         Does not return
         '''
 
         logging.info(f'Removing poster for {imdbid}')
-        path = os.path.join(Poster.folder, f'{imdbid}.jpg')
+        path = Poster.path(imdbid)
         if os.path.exists(path):
             os.remove(path)
         else:
             logging.warning(f'{path} doesn\'t exist, cannot remove.')
+        Poster._remove_thumbnails(imdbid)
+
+    @staticmethod
+    def _remove_thumbnails(imdbid):
+        ''' Deletes thumbnails of poster from disk
+        imdbid (str): imdb id #
+
+        Does not return
+        '''
+        for size in Poster.sizes:
+            try:
+                os.remove(Poster.path(imdbid, size))
+            except FileNotFoundError:
+                pass
+            with Poster._lock:
+                Poster._unavailable.discard((imdbid, size))
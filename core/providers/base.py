@@ -1,27 +1,372 @@
-from xml.etree.ElementTree import fromstring
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import fromstring, iterparse, ParseError
 from xmljson import yahoo
+import asyncio
+import functools
+import io
 import logging
-import re
+import threading
+import time
 import urllib.parse
 
 import core
-from core.helpers import Url
+from core.helpers import RateLimiter, Url
 from core import proxy
+from core.providers import rsscursor
 from gettext import gettext as _
 
 
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+_loop = None
+
+# indexer workers when Search.indexerworkers is not a number, ie saved blank
+default_workers = 8
+
+
+def throttle(indexer, interval):
+    ''' Waits until indexer's request budget allows another request
+    indexer (str): key identifying indexer, ie url base or module name
+    interval (int/float): minimum seconds between requests to indexer
+
+    Waiting threads are released one at a time, in order, so concurrent
+        searches can never hit a single indexer faster than once per interval.
+        Other indexers are not affected.
+
+    Does not return
+    '''
+    if interval <= 0:
+        return
+    RateLimiter.get(f'indexer:{indexer}', rate=1 / interval, capacity=1).acquire()
+
+
+async def throttle_async(indexer, interval):
+    ''' Async version of throttle(), waits without blocking the event loop
+    indexer (str): key identifying indexer, ie url base or module name
+    interval (int/float): minimum seconds between requests to indexer
+
+    Does not return
+    '''
+    if interval <= 0:
+        return
+    await RateLimiter.get(f'indexer:{indexer}', rate=1 / interval, capacity=1).acquire_async()
+
+
+def _event_loop():
+    ''' Gets shared indexer event loop
+
+    Loop runs forever in its own daemon thread, started on first use.
+
+    Returns object asyncio.AbstractEventLoop
+    '''
+    global _loop
+
+    with _pool_lock:
+        if _loop is None:
+            logging.debug('Starting indexer event loop.')
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='indexer-loop', daemon=True).start()
+        return _loop
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_sync(coro):
+    ''' Runs coroutine on the shared indexer event loop and waits for it
+    coro (coroutine): coroutine to run, ie from search_newznab_async()
+
+    Synchronous adapter for the async provider interface. Blocking callers from
+        any thread share the same loop, so all of their indexer requests are
+        in flight together. Must not be called from the loop itself.
+
+    Returns result of coro
+    '''
+    loop = _event_loop()
+    if loop is _running_loop():
+        coro.close()
+        raise RuntimeError('run_sync() called from indexer event loop, await coroutine instead.')
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def _executor():
+    ''' Gets shared indexer worker pool
+
+    Pool is (re)created when the configured number of workers changes.
+
+    Returns object concurrent.futures.ThreadPoolExecutor
+    '''
+    global _pool
+    global _pool_size
+
+    try:
+        size = max(1, int(core.CONFIG['Search']['indexerworkers']))
+    except (TypeError, ValueError):
+        size = default_workers
+
+    with _pool_lock:
+        if _pool is None or size != _pool_size:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            logging.debug(f'Creating indexer worker pool with {size} workers.')
+            _pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='indexer')
+            _pool_size = size
+        return _pool
+
+
+def _run_job(name, func, args):
+    ''' Executes single indexer job, isolating errors
+    name (str): name of indexer for logging
+    func (func): method to call
+    args (tuple): positional arguments for func
+
+    Returns list of results
+    '''
+    try:
+        return func(*args) or []
+    except (SystemExit, KeyboardInterrupt):
+        raise
+    except Exception as e:
+        logging.error(f'Indexer {name} failed.', exc_info=True)
+        return []
+
+
+async def _run_job_async(name, func, args, timeout):
+    ''' Executes single indexer job on the event loop, isolating errors
+    name (str): name of indexer for logging
+    func (func): method or coroutine function to call
+    args (tuple): positional arguments for func
+    timeout (int/float): seconds job may run
+
+    Coroutine functions are awaited directly, plain functions are run in the
+        shared indexer pool. Time spent waiting for a free worker in the pool
+        doesn't count against timeout.
+
+    Raises asyncio.TimeoutError if job runs longer than timeout
+
+    Returns list of results
+    '''
+    if not asyncio.iscoroutinefunction(func):
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def job():
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+            return _run_job(name, func, args)
+
+        future = loop.run_in_executor(_executor(), job)
+        try:
+            await started
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        return await asyncio.wait_for(future, timeout)
+
+    async def job():
+        try:
+            return await func(*args) or []
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except Exception as e:
+            logging.error(f'Indexer {name} failed.', exc_info=True)
+            return []
+
+    return await asyncio.wait_for(job(), timeout)
+
+
+async def fan_out_async(jobs, timings=None):
+    ''' Queries indexers concurrently
+    jobs (list): tuples of (name, func, args) to execute
+    timings (list): list to append seconds each job took to        <optional - default None>
+
+    All jobs are started at once. Async jobs, ie search_newznab_async, only
+        wait on the event loop so any number of them can be in flight. Blocking
+        jobs, ie torrent_modules, are submitted to the shared indexer pool.
+
+    Each job must finish within the configured indexer timeout, measured from
+        the time the job starts running. Blocking jobs waiting for a worker in
+        the shared pool, which concurrent searches also use, start their clock
+        once they get one. Jobs that are still running after their timeout are
+        abandoned.
+
+    If timings is passed, the seconds from the start of the fan-out until each
+        job finished are appended in the same order as jobs, None if the job
+        timed out.
+
+    Returns list of lists of results, in the same order as jobs
+    '''
+    if not jobs:
+        return []
+
+    timeout = core.CONFIG['Search']['indexertimeout']
+    start = time.monotonic()
+    finished = {}
+
+    tasks = [asyncio.ensure_future(_run_job_async(name, func, args, timeout)) for name, func, args in jobs]
+    for task in tasks:
+        task.add_done_callback(lambda t: finished.setdefault(t, time.monotonic() - start))
+    try:
+        await asyncio.wait(tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    results = []
+    for (name, func, args), task in zip(jobs, tasks):
+        try:
+            results.append(task.result())
+            seconds = finished[task]
+        except asyncio.TimeoutError:
+            logging.warning(f'Indexer {name} did not respond within {timeout} seconds.')
+            results.append([])
+            seconds = None
+        if timings is not None:
+            timings.append(seconds)
+    return results
+
+
+def fan_out(jobs, timings=None):
+    ''' Queries indexers concurrently
+    jobs (list): tuples of (name, func, args) to execute
+    timings (list): list to append seconds each job took to        <optional - default None>
+
+    Synchronous adapter for fan_out_async().
+
+    Returns list of lists of results, in the same order as jobs
+    '''
+    if not jobs:
+        return []
+    return run_sync(fan_out_async(jobs, timings=timings))
+
+
+def merge_rss(jobs, responses, timings, record=None):
+    ''' Merges rss results of all indexers
+    jobs (list): tuples of (name, func, args) passed to fan_out()
+    responses (list): lists of results returned by fan_out()
+    timings (list): seconds each job took, from fan_out()
+    record (dict): indexer cursors from rsscursor.load()       <optional - default None>
+
+    Releases are kept in indexer order. A release whose guid was already
+        returned by an earlier indexer is dropped.
+
+    If record is passed, releases behind the indexer's cursor are dropped as
+        well and the cursor is moved past the rest. Record is modified in place.
+
+    Logs number of items and latency of each indexer.
+
+    Returns list of dicts
+    '''
+    results = []
+    guids = set()
+    report = []
+
+    for (name, func, args), response, seconds in zip(jobs, responses, timings):
+        fresh = response
+        if record is not None:
+            fresh = rsscursor.new_items(response, record.get(name))
+            if fresh:
+                record[name] = rsscursor.advance(record.get(name), fresh)
+
+        new = 0
+        for i in fresh:
+            if i.get('guid'):
+                guid = i['guid'].lower()
+                if guid in guids:
+                    continue
+                guids.add(guid)
+            results.append(i)
+            new += 1
+
+        if seconds is None:
+            report.append(f'{name} timed out')
+        else:
+            report.append(f'{name} {len(response)} items ({new} new) in {seconds:.2f}s')
+
+    logging.info('RSS sync found {} items: {}'.format(len(results), ', '.join(report)))
+    return results
+
+
+# item elements read by _newznab_item
+_item_fields = frozenset(('title', 'description', 'link', 'comments', 'pubDate', 'size', 'enclosure'))
+
+
+def _yahoo_value(elem):
+    ''' Reads element as xmljson's yahoo format would
+    elem (object): xml.etree.ElementTree.Element
+
+    Returns str, or dict if element has attributes or children
+    '''
+    if len(elem):
+        return yahoo.data(elem)[elem.tag]
+    value = dict(elem.attrib)
+    if elem.text and elem.text.strip():
+        if not value:
+            return elem.text
+        value['content'] = elem.text
+    return value or ''
+
+
+def _newznab_item(elem):
+    ''' Reads fields of newznab item element
+    elem (object): xml.etree.ElementTree.Element <item>
+
+    Fields that appear more than once become lists, as in xmljson's yahoo format.
+
+    Returns dict of fields, with attributes of attr elements in key 'attr' (None if item has no attrs)
+    '''
+    item = {}
+    attr = None
+    duplicates = set()
+    for child in elem:
+        tag = child.tag
+        if tag in _item_fields:
+            value = _yahoo_value(child)
+            if tag not in item:
+                item[tag] = value
+            elif tag in duplicates:
+                item[tag].append(value)
+            else:
+                item[tag] = [item[tag], value]
+                duplicates.add(tag)
+        elif tag[0] == '{' and tag.endswith('}attr'):
+            if attr is None:
+                attr = []
+            attr.append(child.attrib)
+    item['attr'] = attr
+    return item
+
+
 class NewzNabProvider:
     '''
     Base class for NewzNab and TorzNab providers.
     Methods:
         search_newznab      searches indexer for imdbid
+        search_newznab_async    coroutine version of search_newznab
         parse_newznab_xml   parses newznab-formatted xml into dictionary
+        parse_newznab_page  parses one page of newznab-formatted xml and counts its items
+        iter_newznab_xml    parses newznab-formatted xml one item at a time
         test_connection     static_method to test connetion and apikey
 
     '''
 
     def search_newznab(self, url_base, apikey, type_, q=None, imdbid=None):
         ''' Searches Newznab/Torznab for movie
+
+        Synchronous adapter for search_newznab_async(), takes the same arguments.
+
+        Returns list of dicts of search results
+        '''
+        return run_sync(self.search_newznab_async(url_base, apikey, type_, q=q, imdbid=imdbid))
+
+    async def search_newznab_async(self, url_base, apikey, type_, q=None, imdbid=None):
+        ''' Searches Newznab/Torznab for movie
         url_base (str): base url for all requests (https://indexer.com/)
         apikey (str): api key for indexer
         type_ (str): one of 'movie' or 'search'
@@ -45,15 +390,12 @@ class NewzNabProvider:
 
         logging.info('SEARCHING: {}'.format(url.replace(apikey, 'APIKEY')))
 
-        proxy_enabled = core.CONFIG['Server']['Proxy']['enabled']
+        await throttle_async(url_base, core.CONFIG['Search']['indexerinterval'])
 
         try:
-            if proxy_enabled and proxy.whitelist(url) is True:
-                response = Url.open(url, proxy_bypass=True).text
-            else:
-                response = Url.open(url).text
+            response = await self._open_async(url)
 
-            results = self.parse_newznab_xml(response, imdbid=imdbid)
+            results = await self._parse_async(response, imdbid=imdbid)
             logging.info(f'Found {len(results)} results from {url_base}.')
             return results
         except (SystemExit, KeyboardInterrupt):
@@ -62,135 +404,280 @@ class NewzNabProvider:
             logging.error('Newz/TorzNab backlog search.', exc_info=True)
             return []
 
-    def _get_rss(self):
+    @staticmethod
+    async def _open_async(url):
+        ''' Requests indexer url, bypassing proxy if url is whitelisted
+        url (str): url to request
+
+        Returns str response text
+        '''
+        proxy_bypass = core.CONFIG['Server']['Proxy']['enabled'] and proxy.whitelist(url) is True
+        response = await Url.open_async(url, timeout=core.CONFIG['Search']['indexertimeout'], proxy_bypass=proxy_bypass)
+        return response.text
+
+    def _get_rss(self, record=None):
         ''' Get latest uploads from all indexers
+        record (dict): indexer cursors from rsscursor.load()       <optional - default None>
+
+        Queries all enabled indexers concurrently, see merge_rss(). Only
+            releases that are new since the last sync are returned.
+
+        Cursors in record are moved past the returned releases. The caller
+            stores record with rsscursor.save() once the releases are handled,
+            so releases of a failed sync are returned again. Without record the
+            stored cursors are used but not moved.
 
         Returns list of dicts with parsed release info
         '''
+        if record is None:
+            record = rsscursor.load()
+        jobs = self._rss_jobs(record)
+        timings = []
+        return merge_rss(jobs, fan_out(jobs, timings=timings), timings, record=record)
 
-        proxy_enabled = core.CONFIG['Server']['Proxy']['enabled']
+    def _rss_jobs(self, record):
+        ''' Creates fan_out() jobs to get rss of enabled NewzNab or TorzNab indexers
+        record (dict): indexer cursors from rsscursor.load()
 
+        Returns list of tuples (name, func, args)
+        '''
         if self.feed_type == 'nzb':
             indexers = core.CONFIG['Indexers']['NewzNab'].values()
         else:
             indexers = core.CONFIG['Indexers']['TorzNab'].values()
 
-        results = []
-
+        jobs = []
         for indexer in indexers:
             if indexer[2] is False:
                 continue
             url_base = indexer[0]
-            logging.info(f'Fetching latest RSS from {url_base}.')
             if url_base[-1] != '/':
                 url_base = url_base + '/'
             apikey = indexer[1]
 
-            url = f'{url_base}api?t=movie&cat=2000&extended=1&offset=0&apikey={apikey}'
+            jobs.append((url_base, self.rss_newznab_async, (url_base, apikey, record.get(url_base))))
+        return jobs
 
-            logging.info(f'RSS_SYNC: {url_base}api?t=movie&cat=2000&extended=1&offset=0&apikey=APIKEY')
+    async def rss_newznab_async(self, url_base, apikey, cursor=None):
+        ''' Gets latest uploads from single Newznab/Torznab indexer
+        url_base (str): base url for all requests (https://indexer.com/)
+        apikey (str): api key for indexer
+        cursor (dict): indexer's cursor from rsscursor.load()       <optional - default None>
 
-            try:
-                if proxy_enabled and proxy.whitelist(url) is True:
-                    response = Url.open(url, proxy_bypass=True).text
-                else:
-                    response = Url.open(url).text
+        Reads further pages of the feed until an item behind the cursor is
+            found, so nothing is missed if more than a page was uploaded since
+            the last sync. Reads up to rsscursor.max_pages pages, without a
+            cursor only the first page.
+
+        Returns list of dicts with parsed release info
+        '''
+        logging.info(f'Fetching latest RSS from {url_base}.')
+
+        results = []
+        guids = set()
+        offset = 0
+
+        for page in range(rsscursor.max_pages):
+            url = f'{url_base}api?t=movie&cat=2000&extended=1&offset={offset}&apikey={apikey}'
+
+            logging.info(f'RSS_SYNC: {url_base}api?t=movie&cat=2000&extended=1&offset={offset}&apikey=APIKEY')
+
+            await throttle_async(url_base, core.CONFIG['Search']['indexerinterval'])
 
-                results = self.parse_newznab_xml(response)
-                logging.info(f'Found {len(results)} results from {url_base}.')
-                return results
+            try:
+                response = await self._open_async(url)
+                parse = functools.partial(self.parse_newznab_page, response)
+                items, count = await asyncio.get_running_loop().run_in_executor(_executor(), parse)
             except (SystemExit, KeyboardInterrupt):
                 raise
             except Exception as e:
                 logging.error('Newz/TorzNab rss get xml.', exc_info=True)
+                break
+
+            # indexers that ignore offset send the first page again
+            if not count or (items and items[0]['guid'] in guids):
+                break
+            guids.update(i['guid'] for i in items)
+            results += items
+            # items that can't be parsed still take up their place in the feed
+            offset += count
+
+            if rsscursor.reached(items, cursor):
+                break
+        else:
+            logging.warning(f'Read {rsscursor.max_pages} RSS pages from {url_base} without reaching last sync, some releases may be missed.')
 
         return results
 
+    async def _parse_async(self, feed, imdbid=None):
+        ''' Runs parse_newznab_xml() in the shared indexer pool
+        feed (str): xml feed text
+        imdbid (str): imdb id #         <optional - default None>
+
+        Large feeds would otherwise block the event loop, and with it the
+            requests and timeouts of every other indexer.
+
+        Returns list of dicts of parsed releases
+        '''
+        parse = functools.partial(self.parse_newznab_xml, feed, imdbid=imdbid)
+        return await asyncio.get_running_loop().run_in_executor(_executor(), parse)
+
     def parse_newznab_xml(self, feed, imdbid=None):
         ''' Parse xml from Newznab api.
         feed (str): xml feed text
         imdbid (str): imdb id #. Just numbers, do not include 'tt'
 
-        Replaces all namespaces with 'ns', so namespaced attributes are
-            accessible with the key '{ns}attr'
-
-        Loads feed with xmljson in yahoo format
-        Creates item dict for database table SEARCHRESULTS -- removes unused
-            keys and ensures required keys are present (even if blank)
+        Collects all results of iter_newznab_xml()
 
         Returns list of dicts of parsed nzb information.
         '''
-        results = []
+        return list(self.iter_newznab_xml(feed, imdbid=imdbid))
+
+    def parse_newznab_page(self, feed, imdbid=None):
+        ''' Parse one page of xml from Newznab api
+        feed (str): xml feed text
+        imdbid (str): imdb id #. Just numbers, do not include 'tt'     <optional - default None>
+
+        Like parse_newznab_xml(), but also counts the items in the feed,
+            including those that can't be parsed, for paging by offset.
+
+        Returns tuple (list of dicts of parsed nzb information, int number of items in feed)
+        '''
+        stats = {}
+        return list(self.iter_newznab_xml(feed, imdbid=imdbid, stats=stats)), stats['items']
+
+    def iter_newznab_xml(self, feed, imdbid=None, stats=None):
+        ''' Parses xml from Newznab api one item at a time
+        feed (str/bytes): xml feed text
+        imdbid (str): imdb id #. Just numbers, do not include 'tt'
+        stats (dict): receives 'items', the number of items read      <optional - default None>
+
+        Feed is read with iterparse and each item is discarded as soon as it
+            is parsed, so only one item is ever held as elements. Fields are
+            read the same way xmljson's yahoo format reads them. Attrs are read
+            from namespaced attr elements, ie newznab:attr or torznab:attr.
+
+        Items that can't be parsed are skipped. If the feed is malformed,
+            items before the error are still yielded.
 
-        feed = re.sub(r'xmlns:([^=]*)=[^ ]*"', r'xmlns:\1="ns"', feed)
+        Yields dicts for database table SEARCHRESULTS
+        '''
+        source = io.BytesIO(feed) if isinstance(feed, bytes) else io.StringIO(feed)
+        if stats is None:
+            stats = {}
+        stats['items'] = 0
+
+        indexer = None
+        pending = []            # items read before channel title
+        depth = 0
+        root = channel = None
 
         try:
-            channel = yahoo.data(fromstring(feed))['rss']['channel']
-            indexer = channel['title']
-            items = channel.get('item', [])
-            if type(items) != list:
-                items = [items]
-        except Exception as e:
+            for event, elem in iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                    elif depth == 2 and root.tag == 'rss' and elem.tag == 'channel':
+                        channel = elem
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    channel = None
+                if depth != 2 or channel is None or elem.tag not in ('item', 'title'):
+                    continue
+                if elem.tag == 'title':
+                    if indexer is None:
+                        indexer = _yahoo_value(elem)
+                        for item in pending:
+                            result = self._newznab_result(item, indexer, imdbid)
+                            if result:
+                                yield result
+                        pending = []
+                    continue
+
+                stats['items'] += 1
+                item = _newznab_item(elem)
+                channel.remove(elem)
+                if indexer is None:
+                    pending.append(item)
+                    continue
+                result = self._newznab_result(item, indexer, imdbid)
+                if result:
+                    yield result
+        except ParseError:
             logging.error('Unexpected XML format from NewzNab indexer.', exc_info=True)
             logging.debug(feed)
-            return []
+            return
 
-        for item in items:
-            try:
-                item['attr'] = {}
-                for i in item['{ns}attr']:
-                    item['attr'][i['name']] = i['value']
-
-                if(self.feed_type == 'torrent'):
-                    # Jackett doesn't properly encode query string params so we do it here.
-                    rt, qs = item.get('link', '?').split('?')
-                    if rt == qs == '':
-                        guid = None
-                    else:
-                        qsprs = urllib.parse.parse_qs(qs)
-                        params = []
-                        if 'xt' in qsprs:
-                            params.append('xt=' + qsprs.pop('xt')[0])
-                        for k in qsprs:
-                            for v in qsprs[k]:
-                                params.append(f'{k}={urllib.parse.quote(v)}')
-                        guid = rt + '?' + '&'.join(params)
-                else:
-                    guid = item.get('link')
-
-                result = {
-                    "download_client": None,
-                    "downloadid": None,
-                    "freeleech": float(item['attr'].get('downloadvolumefactor', 1)) == 0.0,
-                    "guid": guid,
-                    "indexer": indexer,
-                    "info_link": item.get('comments', '').split('#')[0],
-                    "imdbid": imdbid if imdbid is not None else 'tt{}'.format(item['attr'].get('imdb')),
-                    "pubdate": item.get('pubDate', '')[5:16],
-                    "score": 0,
-                    "seeders": 0,
-                    "size": int(item.get('size') or item.get('enclosure', {}).get('length', 0)),
-                    "status": "Available",
-                    "title": item.get('title') or item.get('description'),
-                    "torrentfile": None,
-                    "type": self.feed_type
-                }
-
-                if result['type'] != 'nzb':
-                    result['torrentfile'] = result['guid']
-                    if result['guid'].startswith('magnet'):
-                        result['guid'] = result['guid'].split('&')[0].split(':')[-1]
-                        result['type'] = 'magnet'
-
-                    result['seeders'] = int(item['attr'].get('seeders', 0))
-                    result['leechers'] = int(item['attr'].get('peers', 0))
-
-                results.append(result)
-            except Exception as e:
-                logging.warning('', exc_info=True)
-                continue
+        if indexer is None:
+            logging.error('Unexpected XML format from NewzNab indexer, channel title not found.')
+            logging.debug(feed)
 
-        return results
+    def _newznab_result(self, item, indexer, imdbid):
+        ''' Creates SEARCHRESULTS dict from newznab item
+        item (dict): item fields from _newznab_item()
+        indexer (str): title of indexer's channel
+        imdbid (str): imdb id #. Just numbers, do not include 'tt'
+
+        Removes unused keys and ensures required keys are present (even if blank)
+
+        Returns dict or None if item can't be parsed
+        '''
+        try:
+            if item['attr'] is None:
+                raise KeyError('attr')
+            attr = {i['name']: i['value'] for i in item['attr']}
+
+            if(self.feed_type == 'torrent'):
+                # Jackett doesn't properly encode query string params so we do it here.
+                rt, qs = item.get('link', '?').split('?')
+                if rt == qs == '':
+                    guid = None
+                else:
+                    qsprs = urllib.parse.parse_qs(qs)
+                    params = []
+                    if 'xt' in qsprs:
+                        params.append('xt=' + qsprs.pop('xt')[0])
+                    for k in qsprs:
+                        for v in qsprs[k]:
+                            params.append(f'{k}={urllib.parse.quote(v)}')
+                    guid = rt + '?' + '&'.join(params)
+            else:
+                guid = item.get('link')
+
+            result = {
+                "download_client": None,
+                "downloadid": None,
+                "freeleech": float(attr.get('downloadvolumefactor', 1)) == 0.0,
+                "guid": guid,
+                "indexer": indexer,
+                "info_link": item.get('comments', '').split('#')[0],
+                "imdbid": imdbid if imdbid is not None else 'tt{}'.format(attr.get('imdb')),
+                "pubdate": item.get('pubDate', '')[5:16],
+                "score": 0,
+                "seeders": 0,
+                "size": int(item.get('size') or item.get('enclosure', {}).get('length', 0)),
+                "status": "Available",
+                "title": item.get('title') or item.get('description'),
+                "torrentfile": None,
+                "type": self.feed_type
+            }
+
+            if result['type'] != 'nzb':
+                result['torrentfile'] = result['guid']
+                if result['guid'].startswith('magnet'):
+                    result['guid'] = result['guid'].split('&')[0].split(':')[-1]
+                    result['type'] = 'magnet'
+
+                result['seeders'] = int(attr.get('seeders', 0))
+                result['leechers'] = int(attr.get('peers', 0))
+
+            return result
+        except Exception as e:
+            logging.warning('', exc_info=True)
+            return None
 
     @staticmethod
     def test_connection(indexer, apikey):
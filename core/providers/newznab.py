@@ -1,7 +1,7 @@
 import logging
 
 import core
-from core.providers.base import NewzNabProvider
+from core.providers.base import NewzNabProvider, fan_out
 
 logging = logging.getLogger(__name__)
 
@@ -17,6 +17,9 @@ class NewzNab(NewzNabProvider):
         ''' Search all Newznab indexers.
         imdbid (str): imdb id #
 
+        Queries all enabled indexers concurrently, results are merged in
+            the order indexers appear in the config.
+
         Returns list of dicts with sorted nzb information.
         '''
 
@@ -24,7 +27,7 @@ class NewzNab(NewzNabProvider):
 
         indexers = core.CONFIG['Indexers']['NewzNab'].values()
 
-        results = []
+        jobs = []
 
         for indexer in indexers:
             if indexer[2] is False:
@@ -35,15 +38,19 @@ class NewzNab(NewzNabProvider):
                 url_base = url_base + '/'
             apikey = indexer[1]
 
-            r = self.search_newznab(url_base, apikey, 'movie', imdbid=imdbid)
+            jobs.append((url_base, self.search_newznab_async, (url_base, apikey, 'movie', None, imdbid)))
+
+        results = []
+        for r in fan_out(jobs):
             for i in r:
                 results.append(i)
 
         return results
 
-    def get_rss(self):
+    def get_rss(self, record=None):
         ''' Calls _get_rss from inherited Base class
+        record (dict): indexer cursors from rsscursor.load()       <optional - default None>
 
         Returns list of dicts with parsed nzb info
         '''
-        return self._get_rss()
+        return self._get_rss(record)
@@ -0,0 +1,118 @@
+import datetime
+import json
+import logging
+
+import core
+
+logging = logging.getLogger(__name__)
+
+# Per-indexer high-water mark of RSS items already synced
+#
+# Each indexer's cursor holds the newest pubdate seen and the guids of the most
+# recent items, newest first. Items with a known guid were handled by an earlier
+# sync and are dropped before they are parsed and scored. Feed pages are read
+# until one reaches the cursor. Cursors of all indexers are stored as json in
+# SYSTEM as rss_sync_record, keyed by indexer url base or torrent_modules name.
+#
+# Newznab pubdates are often the usenet post date, which may be older than items
+# already seen, so pubdate only ends paging and never drops items.
+
+# guids remembered per indexer, should cover a few syncs worth of items
+max_guids = 1000
+
+# max feed pages to read from a Newznab/Torznab indexer in one sync
+max_pages = 5
+
+_record_name = 'rss_sync_record'
+
+
+def load():
+    ''' Gets cursors of all indexers
+
+    Returns dict {indexer: cursor dict}
+    '''
+    try:
+        return json.loads(core.sql.system(_record_name) or '{}')
+    except Exception as e:
+        logging.warning('Unable to read RSS sync record, starting over.', exc_info=True)
+        return {}
+
+
+def save(record):
+    ''' Stores cursors of all indexers
+    record (dict): cursors as returned by load()
+
+    Does not return
+    '''
+    if core.sql.row_exists('SYSTEM', name=_record_name):
+        core.sql.update('SYSTEM', 'data', json.dumps(record), 'name', _record_name)
+    else:
+        core.sql.write('SYSTEM', {'data': json.dumps(record), 'name': _record_name})
+
+
+def new_items(items, cursor):
+    ''' Drops items that were seen by an earlier sync
+    items (list): dicts of parsed releases
+    cursor (dict): indexer's cursor, or None if indexer was never synced
+
+    Returns list of dicts
+    '''
+    if not cursor:
+        return list(items)
+
+    seen = set(cursor['guids'])
+    return [i for i in items if _guid(i) not in seen]
+
+
+def reached(items, cursor):
+    ''' Checks if feed page reached cursor
+    items (list): dicts of parsed releases from one feed page
+    cursor (dict): indexer's cursor, or None if indexer was never synced
+
+    Page reached the cursor if any item was seen by an earlier sync, or if all
+        items were published before the newest item seen. Used to stop paging
+        through an indexer's feed. Without a cursor only the first page is read.
+
+    Returns bool
+    '''
+    if not cursor:
+        return True
+    if len(new_items(items, cursor)) < len(items):
+        return True
+
+    dates = [_date(i) for i in items]
+    return bool(cursor['pubdate'] and dates and all(d and d < cursor['pubdate'] for d in dates))
+
+
+def advance(cursor, items):
+    ''' Moves cursor past new items
+    cursor (dict): indexer's cursor, or None if indexer was never synced
+    items (list): dicts of new releases from indexer, newest first
+
+    Returns dict cursor
+    '''
+    cursor = cursor or {'pubdate': None, 'guids': []}
+
+    dates = [d for d in map(_date, items) if d]
+    if cursor['pubdate']:
+        dates.append(cursor['pubdate'])
+
+    guids = [i for i in map(_guid, items) if i]
+    guids = list(dict.fromkeys(guids + cursor['guids']))[:max_guids]
+
+    return {'pubdate': max(dates) if dates else None, 'guids': guids}
+
+
+def _guid(item):
+    return item['guid'].lower() if item.get('guid') else None
+
+
+def _date(item):
+    ''' Gets pubdate of item as iso date, ie "03 Oct 2020" -> "2020-10-03"
+
+    Returns str or None if item has no valid pubdate
+    '''
+    try:
+        return datetime.datetime.strptime(item.get('pubdate') or '', '%d %b %Y').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
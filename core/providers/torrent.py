@@ -2,8 +2,8 @@ from xml.etree.ElementTree import fromstring
 from xmljson import yahoo
 import core
 from core.helpers import Url
-from core.providers.base import NewzNabProvider
-from core.providers import torrent_modules  # noqa
+from core.providers.base import NewzNabProvider, fan_out, merge_rss
+from core.providers import rsscursor, torrent_modules  # noqa
 import logging
 
 logging = logging.getLogger(__name__)
@@ -49,12 +49,15 @@ class Torrent(NewzNabProvider):
         title (str): movie title
         year (str/int): year of movie release
 
+        Queries all enabled indexers concurrently, results are merged in
+            the order indexers appear in the config.
+
         Returns list of dicts with sorted release information.
         '''
 
         torz_indexers = core.CONFIG['Indexers']['TorzNab'].values()
 
-        results = []
+        jobs = []
 
         term = Url.normalize(f'{title} {year}')
 
@@ -77,17 +80,14 @@ class Torrent(NewzNabProvider):
 
             if 'imdbid' in caps:
                 if ignore_if_imdbid_cap:
-                    return results
+                    return self._merge(fan_out(jobs), len(jobs))
                 logging.info(f'{url_base} supports imdbid search.')
-                r = self.search_newznab(url_base, apikey, 'movie', imdbid=imdbid)
             else:
                 logging.info(f'{url_base} does not support imdbid search, using q={term}')
-                r = self.search_newznab(url_base, apikey, 'search', q=term, imdbid=imdbid)
-                if not r and no_year:
-                    logging.info(f'{url_base} does not find anything, trying without year, using q={title}')
-                    r = self.search_newznab(url_base, apikey, 'search', q=title, imdbid=imdbid)
-            for i in r:
-                results.append(i)
+
+            jobs.append((url_base, self._search_torznab, (url_base, apikey, 'imdbid' in caps, no_year, imdbid, title, term)))
+
+        torznab_jobs = len(jobs)
 
         for indexer, settings in core.CONFIG['Indexers']['Torrent'].items():
             if settings['enabled']:
@@ -95,9 +95,7 @@ class Torrent(NewzNabProvider):
                     logging.warning(f'Torrent indexer {indexer} enabled but not found in torrent_modules.')
                     continue
                 else:
-                    for i in getattr(torrent_modules, indexer).search(imdbid, term, ignore_if_imdbid_cap):
-                        if i not in results:
-                            results.append(i)
+                    jobs.append((indexer, getattr(torrent_modules, indexer).search, (imdbid, term, ignore_if_imdbid_cap)))
 
         for indexer, indexerobject in core.CONFIG['Indexers']['PrivateTorrent'].items():
             if indexerobject['enabled']:
@@ -105,23 +103,67 @@ class Torrent(NewzNabProvider):
                     logging.warning(f'Torrent indexer {indexer} enabled but not found in torrent_modules.')
                     continue
                 else:
-                    for i in getattr(torrent_modules, indexer).search(imdbid, term, ignore_if_imdbid_cap):
-                        if i not in results:
-                            results.append(i)
+                    jobs.append((indexer, getattr(torrent_modules, indexer).search, (imdbid, term, ignore_if_imdbid_cap)))
+
+        return self._merge(fan_out(jobs), torznab_jobs)
+
+    async def _search_torznab(self, url_base, apikey, imdbid_cap, no_year, imdbid, title, term):
+        ''' Searches single TorzNab indexer
+        url_base (str): url of torznab indexer
+        apikey (str): api key for indexer
+        imdbid_cap (bool): if indexer supports imdbid search
+        no_year (bool): retry search without year if nothing is found
+        imdbid (str): imdb id #
+        title (str): movie title
+        term (str): normalized title and year search term
+
+        Returns list of dicts of search results
+        '''
+        if imdbid_cap:
+            return await self.search_newznab_async(url_base, apikey, 'movie', imdbid=imdbid)
 
+        r = await self.search_newznab_async(url_base, apikey, 'search', q=term, imdbid=imdbid)
+        if not r and no_year:
+            logging.info(f'{url_base} does not find anything, trying without year, using q={title}')
+            r = await self.search_newznab_async(url_base, apikey, 'search', q=title, imdbid=imdbid)
+        return r
+
+    @staticmethod
+    def _merge(responses, torznab_jobs):
+        ''' Merges per-indexer results into one list
+        responses (list): lists of results in indexer order
+        torznab_jobs (int): number of leading responses from TorzNab indexers
+
+        Releases from torrent_modules are dropped if an earlier indexer
+            already returned them.
+
+        Returns list of dicts
+        '''
+        results = []
+        for idx, r in enumerate(responses):
+            for i in r:
+                if idx < torznab_jobs or i not in results:
+                    results.append(i)
         return results
 
-    def get_rss(self):
+    def get_rss(self, record=None):
         ''' Gets rss from all torznab providers and individual providers
+        record (dict): indexer cursors from rsscursor.load()       <optional - default None>
+
+        All indexers are queried concurrently, see merge_rss(). Only releases
+            that are new since the last sync are returned.
+
+        Cursors in record are moved past the returned releases, see
+            Base._get_rss() for storing them.
 
         Returns list of dicts of latest movies
         '''
 
         logging.info('Syncing Torrent indexer RSS feeds.')
 
-        results = []
-
-        results = self._get_rss()
+        if record is None:
+            record = rsscursor.load()
+        jobs = self._rss_jobs(record)
 
         for indexer, settings in core.CONFIG['Indexers']['Torrent'].items():
             if settings['enabled']:
@@ -129,10 +171,10 @@ class Torrent(NewzNabProvider):
                     logging.warning(f'Torrent indexer {indexer} enabled but not found in torrent_modules.')
                     continue
                 else:
-                    for i in getattr(torrent_modules, indexer).get_rss():
-                        if i not in results:
-                            results.append(i)
-        return results
+                    jobs.append((indexer, getattr(torrent_modules, indexer).get_rss, ()))
+
+        timings = []
+        return merge_rss(jobs, fan_out(jobs, timings=timings), timings, record=record)
 
     def _get_caps(self, url_base, apikey):
         ''' Gets caps for indexer url
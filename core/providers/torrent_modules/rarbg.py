@@ -1,9 +1,10 @@
 import datetime
 import core
 import logging
-import time
 from core.helpers import Url
+from core.providers.base import throttle
 import json
+import threading
 
 logging = logging.getLogger(__name__)
 
@@ -13,9 +14,10 @@ https://torrentapi.org/apidocs_v2.txt
 This api is limited to one request every 2 seconds.
 '''
 
-timeout = None
+interval = 2
 _api_token = None
 _token_timeout = datetime.datetime.now()
+_token_lock = threading.Lock()
 
 def base_url():
     url = core.CONFIG['Indexers']['Torrent']['rarbg']['url']
@@ -33,14 +35,15 @@ def _token():
     global _api_token
     global _token_timeout
 
-    if not _api_token:
-        _api_token = _get_token()
-    else:
-        now = datetime.datetime.now()
-        if (now - _token_timeout).total_seconds() > 900:
+    with _token_lock:
+        if not _api_token:
             _api_token = _get_token()
-            _token_timeout = now
-    return _api_token
+        else:
+            now = datetime.datetime.now()
+            if (now - _token_timeout).total_seconds() > 900:
+                _api_token = _get_token()
+                _token_timeout = now
+        return _api_token
 
 
 def search(imdbid, term, ignore_if_imdbid_cap = False):
@@ -49,24 +52,17 @@ def search(imdbid, term, ignore_if_imdbid_cap = False):
 
     Returns list of dicts of parsed releases
     '''
-    global timeout
-
     if ignore_if_imdbid_cap:
         return []
     proxy_enabled = core.CONFIG['Server']['Proxy']['enabled']
 
     host = base_url()
     logging.info(f'Performing backlog search on Rarbg for {imdbid}.')
-    if timeout:
-        now = datetime.datetime.now()
-        while timeout > now:
-            time.sleep(1)
-            now = datetime.datetime.now()
 
     try:
         url = f'{host}/pubapi_v2.php?token={_token()}&mode=search&search_imdb={imdbid}&category=14;48;17;44;45;47;50;51;52;42;46;54&format=json_extended&app_id=Watcher'
 
-        timeout = datetime.datetime.now() + datetime.timedelta(seconds=2)
+        throttle('rarbg', interval)
 
         if proxy_enabled and core.proxy.whitelist(host) is True:
             response = Url.open(url, proxy_bypass=True)
@@ -94,21 +90,14 @@ def get_rss():
 
     Returns list of dicts of parsed releases
     '''
-    global timeout
-
     host = base_url()
     proxy_enabled = core.CONFIG['Server']['Proxy']['enabled']
 
     logging.info('Fetching latest RSS from ')
-    if timeout:
-        now = datetime.datetime.now()
-        while timeout > now:
-            time.sleep(1)
-            now = datetime.datetime.now()
 
     try:
         url = f'{host}/pubapi_v2.php?token={_token()}&mode=list&category=movies&format=json_extended&app_id=Watcher'
-        timeout = datetime.datetime.now() + datetime.timedelta(seconds=2)
+        throttle('rarbg', interval)
 
         if proxy_enabled and core.proxy.whitelist(host) is True:
             response = Url.open(url, proxy_bypass=True)
@@ -140,6 +129,8 @@ def _get_token():
     host = base_url()
     url = f'{host}/pubapi_v2.php?get_token=get_token&app_id=Watcher'
 
+    throttle('rarbg', interval)
+
     try:
         result = json.loads(Url.open(url).text)
         token = result.get('token')
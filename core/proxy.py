@@ -1,6 +1,7 @@
 import urllib.request
 import core
 import logging
+import threading
 from core.helpers import Url
 
 logging = logging.getLogger(__name__)
@@ -11,12 +12,30 @@ bypass_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
 proxy_socket = urllib.request.socket.socket
 
 on = False
+users = 0                   # int number of callers currently inside a create/destroy bracket
+lock = threading.RLock()
 
 
 def create():
     ''' Starts proxy connection
     Sets global on to True
 
+    Calls are counted so concurrent searches can share the proxy. The
+        connection is only set up by the first caller.
+
+    Does not return
+    '''
+    global users
+    with lock:
+        users += 1
+        if users > 1:
+            return
+        _create()
+
+
+def _create():
+    ''' Sets up proxy connection for create()
+
     Does not return
     '''
     global on
@@ -82,15 +101,20 @@ def destroy():
     ''' Ends proxy connection
     Sets global on to False
 
+    Connection is only closed once the last caller of create() is finished.
+
     Does not return
     '''
     global on
-    if on:
-        logging.info('Closing proxy connection.')
-        Url.proxies = None
-        on = False
-        return
-    else:
+    global users
+    with lock:
+        users = max(0, users - 1)
+        if users > 0:
+            return
+        if on:
+            logging.info('Closing proxy connection.')
+            Url.proxies = None
+            on = False
         return
 
 
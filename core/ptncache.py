@@ -0,0 +1,45 @@
+import copy
+import functools
+import logging
+
+import PTN
+
+logging = logging.getLogger(__name__)
+
+# Release titles parsed per backlog search and rss sync are mostly the same
+# from one run to the next, so keep plenty around.
+max_size = 20000
+
+
+@functools.lru_cache(maxsize=max_size)
+def _parse(title):
+    return PTN.parse(title)
+
+
+def parse(title):
+    ''' Parses release title with PTN
+    title (str): release title or file name
+
+    Results are cached by title. A copy is returned so callers can modify it.
+
+    Returns dict
+    '''
+    return copy.deepcopy(_parse(title))
+
+
+def stats():
+    ''' Gets cache statistics
+
+    Returns dict {'hits': int, 'misses': int, 'size': int, 'max_size': int}
+    '''
+    info = _parse.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+
+def clear():
+    ''' Empties cache and resets statistics
+
+    Does not return
+    '''
+    logging.debug('Clearing PTN cache.')
+    _parse.cache_clear()
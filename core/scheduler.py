@@ -7,7 +7,7 @@ import os
 import time
 import hashlib
 
-from core import searcher, postprocessing, downloaders, snatcher
+from core import fileindex, searcher, postprocessing, downloaders, snatcher
 from core.rss import imdb, popularmovies
 from lib.cherrypyscheduler import SchedulerPlugin
 from core import trakt
@@ -94,21 +94,15 @@ class PostProcessingScan:
 
             logging.info(f'Scanning {d} for new files only (last scan: {le}).')
 
-            for i in os.listdir(d):
-                f = os.path.join(d, i)
-                if f in postprocessed_paths:
+            for i in fileindex.walk(d, recursive=False):
+                if i.path in postprocessed_paths:
                     continue
-                if os.path.isfile(f) and os.path.getmtime(f) > threshold and os.path.getsize(f) > minsize:
-                    files.append(f)
-                elif os.path.isdir(f) and os.path.getmtime(f) > threshold:
-                    files.append(f)
+                if i.mtime > threshold and (i.is_dir or i.size > minsize):
+                    files.append(i.path)
         else:
-            for i in os.listdir(d):
-                f = os.path.join(d, i)
-                if os.path.isfile(f) and os.path.getsize(f) > minsize:
-                    files.append(f)
-                elif os.path.isdir(f):
-                    files.append(f)
+            for i in fileindex.walk(d, recursive=False):
+                if i.is_dir or i.size > minsize:
+                    files.append(i.path)
 
         if files == []:
             logging.info('No new files found in directory scan.')
@@ -1,12 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import datetime
 import logging
-import PTN
-import re
+import threading
 
+import cherrypy
+from cherrypy.process.wspbus import states
 import core
-from core import searchresults, snatcher, proxy
+from core import searchresults, snatcher, proxy, ptncache, sources
 from core.library import Manage
-from core.providers import torrent, newznab
+from core.providers import rsscursor, torrent, newznab
 from core.rss import predb
 from stringscore import liquidmetal as lm
 
@@ -15,6 +17,17 @@ logging = logging.getLogger(__name__)
 nn = newznab.NewzNab()
 torrent = torrent.Torrent()
 
+# Progress of the running search_all backlog, read by the System page
+progress = {'running': False,
+            'total': 0,
+            'done': 0,
+            'started': None
+            }
+_progress_lock = threading.Lock()
+
+# concurrent backlog searches when Search.searchworkers is not a number, ie saved blank
+default_workers = 4
+
 
 def _t_search_grab(movie):
     ''' Run verify/search/snatch chain
@@ -72,10 +85,11 @@ def search_all():
     backlog_movies = [i for i in movies if i['backlog'] != 1 and i['status'] != 'Disabled' and Manage.verify(i, today=today)]
     if backlog_movies:
         logging.debug('Backlog movies: {}'.format(', '.join(i['title'] for i in backlog_movies)))
-        for movie in backlog_movies:
-            logging.info('Performing backlog search for {} {}.'.format(movie['title'], movie['year']))
-            search(movie)
-            continue
+        _search_backlog(backlog_movies)
+
+    if _stopping():
+        logging.info('Server is shutting down, skipping RSS sync.')
+        return
 
     rss_movies = [i for i in _get_rss_movies(movies) if Manage.verify(i, today=today)]
     if rss_movies:
@@ -87,6 +101,68 @@ def search_all():
     return
 
 
+def _stopping():
+    ''' Checks if cherrypy is shutting down
+
+    Returns bool
+    '''
+    return cherrypy.engine.state in (states.STOPPING, states.EXITING)
+
+
+def _search_backlog(movies):
+    ''' Runs backlog searches for several movies at once
+    movies (list): dicts of movies to search for
+
+    Runs up to core.CONFIG['Search']['searchworkers'] movie searches at the
+        same time. Indexer request budgets are enforced per indexer in the
+        providers, so more indexers allow more movies per minute.
+
+    Updates module-level progress as searches finish. Stops submitting new
+        searches once cherrypy begins to shut down and waits only for the
+        searches that are already running.
+
+    Does not return
+    '''
+    try:
+        workers = max(1, int(core.CONFIG['Search']['searchworkers']))
+    except (TypeError, ValueError):
+        workers = default_workers
+
+    with _progress_lock:
+        progress.update({'running': True, 'total': len(movies), 'done': 0, 'started': datetime.datetime.now()})
+
+    def _search(movie):
+        logging.info('Performing backlog search for {} {}.'.format(movie['title'], movie['year']))
+        try:
+            search(movie)
+        except Exception as e:
+            logging.error('Backlog search for {} failed.'.format(movie['title']), exc_info=True)
+        finally:
+            with _progress_lock:
+                progress['done'] += 1
+
+    movies = iter(movies)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='search') as executor:
+        pending = set()
+        while True:
+            while len(pending) < workers and not _stopping():
+                movie = next(movies, None)
+                if movie is None:
+                    break
+                pending.add(executor.submit(_search, movie))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    with _progress_lock:
+        progress['running'] = False
+
+    if _stopping():
+        logging.info('Server is shutting down, backlog search stopped after {} of {} movies.'.format(progress['done'], progress['total']))
+    else:
+        logging.info('Backlog search finished for {} movies.'.format(progress['done']))
+
+
 def search(movie):
     ''' Executes backlog search for required movies
     movie (dict): movie to run search for
@@ -138,22 +214,22 @@ default status Available.
         if old['type'] == 'import':
             results.append(old)
 
-    active_old_results = remove_inactive(old_results)
+    active_old_results = {}
+    for old in remove_inactive(old_results):
+        active_old_results.setdefault(old['guid'], []).append(old)
 
     # update results with old info if guids match
-    for idx, result in enumerate(results):
-        for old in active_old_results:
-            if old['guid'] == result['guid']:
-                if 'seeders' in result:
-                    old['seeders'] = result['seeders']
-                if 'leechers' in result:
-                    old['leechers'] = result['leechers']
-                result.update(old)
-                results[idx] = result
+    for result in results:
+        for old in active_old_results.get(result['guid'], []):
+            if 'seeders' in result:
+                old['seeders'] = result['seeders']
+            if 'leechers' in result:
+                old['leechers'] = result['leechers']
+            result.update(old)
 
     for idx, result in enumerate(results):
         logging.debug('Parse {}'.format(result['title']))
-        results[idx]['ptn'] = PTN.parse(result['title'])
+        results[idx]['ptn'] = ptncache.parse(result['title'])
         results[idx]['resolution'] = get_source(results[idx]['ptn'])
 
     scored_results = searchresults.score(results, imdbid=imdbid)
@@ -165,17 +241,18 @@ default status Available.
             if result['guid'] in marked_results:
                 result['status'] = marked_results[result['guid']]
 
-    if not store_results(scored_results, imdbid, backlog=True):
-        logging.error(f'Unable to store search results for {imdbid}')
-        return False
+    with core.sql.transaction():
+        if not store_results(scored_results, imdbid, backlog=True):
+            logging.error(f'Unable to store search results for {imdbid}')
+            return False
 
-    if not Manage.movie_status(imdbid):
-        logging.error(f'Unable to update movie status for {imdbid}')
-        return False
+        if not Manage.movie_status(imdbid):
+            logging.error(f'Unable to update movie status for {imdbid}')
+            return False
 
-    if not core.sql.update('MOVIES', 'backlog', '1', 'imdbid', imdbid):
-        logging.error(f'Unable to flag backlog search as complete for {imdbid}')
-        return False
+        if not core.sql.update('MOVIES', 'backlog', '1', 'imdbid', imdbid):
+            logging.error(f'Unable to flag backlog search as complete for {imdbid}')
+            return False
 
     return True
 
@@ -193,6 +270,9 @@ def rss_sync(movies):
 
     Finally stores results in SEARCHRESULTS
 
+    Indexer RSS cursors are only stored along with the results, so feed items
+        of a failed sync are read again by the next one.
+
     Returns bool
     '''
     logging.info('Syncing indexer RSS feeds.')
@@ -200,57 +280,63 @@ def rss_sync(movies):
     newznab_results = []
     torrent_results = []
 
+    record = rsscursor.load()
+
     proxy.create()
 
     if core.CONFIG['Downloader']['Sources']['usenetenabled']:
-        newznab_results = nn.get_rss()
+        newznab_results = nn.get_rss(record)
     if core.CONFIG['Downloader']['Sources']['torrentenabled']:
-        torrent_results = torrent.get_rss()
+        torrent_results = torrent.get_rss(record)
 
     proxy.destroy()
 
-    for movie in movies:
-        imdbid = movie['imdbid']
-        title = movie['title']
-        year = movie['year']
-        english_title = movie.get('english_title')
+    newznab_index = {}
+    for i in newznab_results:
+        newznab_index.setdefault(i['imdbid'], []).append(i)
 
-        logging.info(f'Parsing RSS for {title} {year}')
+    torrent_matches = _match_torrents(movies, torrent_results)
 
-        nn_found = [i for i in newznab_results if i['imdbid'] == imdbid]
+    found = []
+    for movie, tor_found in zip(movies, torrent_matches):
+        imdbid = movie['imdbid']
 
-        tor_found = []
-        for i in torrent_results:
-            if _match_torrent_name(title, year, i['title']):
-                tor_found.append(i)
-            elif english_title and _match_torrent_name(english_title, year, i['title']):
-                tor_found.append(i)
-        for idx, result in enumerate(tor_found):
-            result['imdbid'] = imdbid
-            tor_found[idx] = result
+        logging.info('Parsing RSS for {} {}'.format(movie['title'], movie['year']))
 
-        results = nn_found + tor_found
+        # Copy results since a torrent may match more than one movie
+        results = [dict(i) for i in newznab_index.get(imdbid, []) + tor_found]
+        for result in results:
+            result['imdbid'] = imdbid
 
         if not results:
-            logging.info(f'Nothing found in RSS for {title} {year}')
+            logging.info('Nothing found in RSS for {} {}'.format(movie['title'], movie['year']))
             continue
 
-        # Ignore results we've already stored
-        old_results = core.sql.get_search_results(imdbid, rejected=True)
-        new_results = []
-        for res in results:
-            guid = res['guid']
-            if all(guid != i['guid'] for i in old_results):
-                new_results.append(res)
-            else:
-                continue
+        found.append((movie, results))
+
+    if not found:
+        rsscursor.save(record)
+        return True
+
+    # Ignore results we've already stored
+    old_guids = core.sql.get_search_result_guids([movie['imdbid'] for movie, results in found])
+
+    batch = []
+    affected = []
+    for movie, results in found:
+        imdbid = movie['imdbid']
+        title = movie['title']
+        year = movie['year']
+
+        stored = old_guids.get(imdbid, set())
+        new_results = [res for res in results if res['guid'] not in stored]
 
         logging.info(f'Found {len(new_results)} new results for {title} {year}.')
 
         # Get source media and resolution
         for idx, result in enumerate(new_results):
             logging.debug('Parse {}'.format(result['title']))
-            new_results[idx]['ptn'] = PTN.parse(result['title'])
+            new_results[idx]['ptn'] = ptncache.parse(result['title'])
             new_results[idx]['resolution'] = get_source(new_results[idx]['ptn'])
 
         scored_results = searchresults.score(new_results, imdbid=imdbid)
@@ -259,12 +345,24 @@ def rss_sync(movies):
             logging.info(f'No acceptable results found for {imdbid}')
             continue
 
-        if not store_results(scored_results, imdbid):
-            return False
+        batch += scored_results
+        affected.append(imdbid)
 
-        if not Manage.movie_status(imdbid):
+    with core.sql.transaction():
+        if batch:
+            logging.info(f'Storing {len(batch)} RSS results for {len(affected)} movies.')
+            today = datetime.date.today()
+            for result in batch:
+                result.setdefault('date_found', today)
+            if not core.sql.write_search_results(batch):
+                return False
+
+        statuses = Manage.movie_statuses(affected)
+        if not all(statuses.values()):
             return False
 
+        rsscursor.save(record)
+
     return True
 
 
@@ -310,10 +408,10 @@ default False>
 
     Writes batch of search results to table.
 
-    If storing backlog search results, will purge existing results. This is because
-        backlog searches pull all existing results from the table and re-score them
-        as to not change the found_date. Purging lets us write old results back in
-        with updated scores and other info.
+    If storing backlog search results, results replace all existing results for
+        imdbid. This is because backlog searches pull all existing results from the
+        table and re-score them as to not change the found_date. Only rows that are
+        new, changed, or gone are written, see SQL.sync_search_results().
 
     Returns bool
     '''
@@ -329,8 +427,8 @@ default False>
         BATCH_DB_STRING.append(result)
 
     if backlog:
-        logging.info('Storing backlog search results -- purging existing results before writing to database.')
-        core.sql.purge_search_results(imdbid=imdbid)
+        logging.info('Storing backlog search results -- replacing existing results.')
+        return core.sql.sync_search_results(imdbid, BATCH_DB_STRING)
 
     if BATCH_DB_STRING:
         if core.sql.write_search_results(BATCH_DB_STRING):
@@ -366,22 +464,20 @@ def get_source(ptn_data):
         logging.warning('Unknown resolution {}, default to SD'.format(ptn_data['resolution']))
         resolution = 'SD'
 
+    matcher = sources.get_matcher()
+
+    source = None
     if 'quality' in ptn_data:
-        parsed_quality = ptn_data['quality'].lower()
-        for source, aliases in core.CONFIG['Quality']['Aliases'].items():
-            if re.search(r"\b(%s)\b" % '|'.join(aliases), parsed_quality):
-                src = f'{source}-{resolution}'
-                logging.info(f'Source media determined as {src}')
-                return src
+        source = matcher.search(ptn_data['quality'].lower())
 
     # sometimes PTN doesn't find quality, but aliases may match with excess
-    if 'excess' in ptn_data:
-        parsed_quality = ' '.join(ptn_data['excess']).lower()
-        for source, aliases in core.CONFIG['Quality']['Aliases'].items():
-            if re.search(r"\b(%s)\b" % '|'.join(aliases), parsed_quality):
-                src = f'{source}-{resolution}'
-                logging.info(f'Source media determined as {src}')
-                return src
+    if source is None and 'excess' in ptn_data:
+        source = matcher.search(' '.join(ptn_data['excess']).lower())
+
+    if source is not None:
+        src = f'{source}-{resolution}'
+        logging.info(f'Source media determined as {src}')
+        return src
 
     src = 'Unknown'
     logging.info(f'Source media determined as {src}')
@@ -430,6 +526,96 @@ def _get_rss_movies(movies):
     return rss_movies
 
 
+def _match_torrents(movies, torrent_results):
+    ''' Matches torrent rss results to movies
+    movies (list): dicts of movies to look for
+    torrent_results (list): dicts of torrent rss results
+
+    Gives the same answer as calling _match_torrent_name for every movie and
+        torrent (trying english_title if title fails), without the
+        movies x results fuzzy comparisons.
+
+    Movie titles are indexed by year and by the first character of the
+        title as _match_torrent_name formats it. Liquidmetal can only score
+        above 0 if every character of the movie title appears, in order, in
+        the part of the torrent name before the year. So for each torrent
+        only movies whose year is in the name and whose first character is
+        in the name prefix are candidates, and candidates that are not a
+        subsequence of the prefix are dropped before scoring.
+
+    Returns list of lists of matching torrent results, one list per movie
+        in the same order as movies
+    '''
+    index = {}      # {year: {first char: [(movie index, formatted title)]}}
+    for m_idx, movie in enumerate(movies):
+        titles = [movie['title']]
+        if movie.get('english_title'):
+            titles.append(movie['english_title'])
+        for t in titles:
+            formatted = _format_movie_title(t)
+            if not formatted:
+                index.setdefault(movie['year'], {}).setdefault('', []).append((m_idx, formatted))
+                continue
+            index.setdefault(movie['year'], {}).setdefault(formatted[0], []).append((m_idx, formatted))
+
+    matches = [[] for i in movies]
+    scores = {}
+    for result in torrent_results:
+        torrent_title = result['title']
+        matched = set()
+        for year, by_char in index.items():
+            if year not in torrent_title:
+                continue
+            prefix = _format_torrent_title(torrent_title, year)
+            chars = set(prefix)
+            chars.add('')
+            for c in chars:
+                for m_idx, formatted in by_char.get(c, []):
+                    if m_idx in matched:
+                        continue
+                    if len(formatted) > len(prefix) or not _is_subsequence(formatted, prefix):
+                        continue
+                    key = (prefix, formatted)
+                    if key not in scores:
+                        scores[key] = lm.score(prefix, formatted) * 100 > 70
+                    if scores[key]:
+                        matched.add(m_idx)
+        for m_idx in sorted(matched):
+            matches[m_idx].append(result)
+
+    return matches
+
+
+def _format_movie_title(movie_title):
+    ''' Formats movie title for comparison in _match_torrent_name
+    movie_title (str): title of movie
+
+    Returns str
+    '''
+    return movie_title.replace(':', '.').replace(' ', '.').lower()
+
+
+def _format_torrent_title(torrent_title, movie_year):
+    ''' Formats torrent title for comparison in _match_torrent_name
+    torrent_title (str): title of torrent
+    movie_year (str): year of movie release
+
+    Returns str portion of torrent title before movie_year
+    '''
+    return torrent_title.replace(' ', '.').replace(':', '.').split(movie_year)[0].lower()
+
+
+def _is_subsequence(a, b):
+    ''' Checks if all characters of a appear in b in the same order
+    a (str): characters to find
+    b (str): string to look through
+
+    Returns bool
+    '''
+    b = iter(b)
+    return all(c in b for c in a)
+
+
 def _match_torrent_name(movie_title, movie_year, torrent_title):
     ''' Checks if movie_title and torrent_title are a good match
     movie_title (str): title of movie
@@ -453,8 +639,8 @@ def _match_torrent_name(movie_title, movie_year, torrent_title):
     if movie_year not in torrent_title:
         return False
     else:
-        movie = movie_title.replace(':', '.').replace(' ', '.').lower()
-        torrent = torrent_title.replace(' ', '.').replace(':', '.').split(movie_year)[0].lower()
+        movie = _format_movie_title(movie_title)
+        torrent = _format_torrent_title(torrent_title, movie_year)
         match = lm.score(torrent, movie) * 100
         if match > 70:
             return True
@@ -1,16 +1,23 @@
+import collections
 import logging
 import datetime
-import PTN
+import functools
 
 from base64 import b16encode
 import core
+from core import ptncache
 from core.helpers import Url
 import json
 import re
+import threading
 
 logging = logging.getLogger(__name__)
 
 
+_scorers = {}
+_scorers_lock = threading.Lock()
+
+
 def score(releases, imdbid=None, imported=False):
     ''' Scores and filters scene releases
     releases (list): dicts of release metadata to score
@@ -43,410 +50,309 @@ def score(releases, imdbid=None, imported=False):
         logging.warning('Imdbid required if result is not library import.')
         return releases
 
-    year = None
-    title = None
+    profile = core.config.default_profile()
 
     if imported:
         logging.debug('Releases are of origin "Import", using custom default quality profile.')
-        titles = []
-        check_size = False
         movie_details = {}
-        filters = {'requiredwords': '', 'preferredwords': '', 'ignoredwords': ''}
-   
-        quality = core.CONFIG['Quality']['Profiles'][core.config.default_profile()]
-        #quality = import_quality()
-   
-        category = {'requiredwords': '', 'preferredwords': '', 'ignoredwords': ''}
+        scorer = get_scorer(profile, None, None, imported=True)
     else:
         movie_details = core.sql.get_movie_details('imdbid', imdbid)
-        quality_profile = movie_details['quality']
-        category_name = movie_details['category']
-        logging.debug(f'Scoring based on quality profile {quality_profile}')
-        check_size = True
-        year = movie_details.get('year')
-        title = movie_details.get('title').lower()
-
-        quality = core.CONFIG['Quality']['Profiles'][core.config.default_profile()]
-
-        if category_name in core.CONFIG['Categories']:
-            category = core.CONFIG['Categories'][category_name]
-        else:
-            category = {'requiredwords': '', 'preferredwords': '', 'ignoredwords': ''}
-
-        filters = json.loads(movie_details['filters'])
-
-    sources = quality['Sources']
+        logging.debug('Scoring based on quality profile {}'.format(movie_details['quality']))
+        scorer = get_scorer(profile, movie_details['category'], movie_details['filters'])
 
-    required_groups = words_to_list(quality['requiredwords']) + words_to_list(filters['requiredwords']) + words_to_list(category['requiredwords'])
-    preferred_groups = words_to_list(quality['preferredwords']) + words_to_list(filters['preferredwords']) + words_to_list(category['preferredwords'])
-    ignored_groups = words_to_list(quality['ignoredwords']) + words_to_list(filters['ignoredwords']) + words_to_list(category['ignoredwords'])
-    if movie_details.get('download_language'):
-        lang_names = [lang.lower() for lang in core.config.lang_names(movie_details.get('download_language'))]
-        logging.debug('remove {} names from ignored groups: {}'.format(movie_details['download_language'], lang_names))
-        ignored_groups = [group for group in ignored_groups if not ' '.join(group).lower() in lang_names]
-    else:
-        lang_names = []
-
-    # Begin scoring and filtering
-    reset(releases)
-    if ignored_groups and ignored_groups != ['']:
-        if title:
-            ignored_groups = [word_group for word_group in ignored_groups if not all(word in title for word in word_group)]
-            logging.debug(f'ignored groups not in movie title: {ignored_groups}')
-        releases = remove_ignored(releases, ignored_groups)
-
-    if required_groups and required_groups != ['']:
-        releases = keep_required(releases, required_groups)
-
-    if core.CONFIG['Search']['retention'] > 0 and any(i['type'] == 'nzb' for i in releases):
-        releases = retention_check(releases)
-
-    if any(i['type'] in ('torrent', 'magnet') for i in releases):
-        if core.CONFIG['Search']['mintorrentseeds'] > 0:
-            releases = seed_check(releases)
-        if core.CONFIG['Search']['freeleechpoints'] > 0 or core.CONFIG['Search']['requirefreeleech']:
-            releases = freeleech(releases)
-        if core.CONFIG['Search']['seederspoints'] and core.CONFIG['Search']['seedersthreshold']:
-            releases = threshold_score(releases, 'seeders', core.CONFIG['Search']['seederspoints'], core.CONFIG['Search']['seedersthreshold'])
-        if core.CONFIG['Search']['leecherspoints'] and core.CONFIG['Search']['leechersthreshold']:
-            releases = threshold_score(releases, 'leechers', core.CONFIG['Search']['leecherspoints'], core.CONFIG['Search']['leechersthreshold'])
-
-    releases = score_sources(releases, sources, check_size=check_size)
-    if year:
-        releases = score_year(releases, int(year))
-
-    if quality['scoretitle']:
-        titles = [movie_details.get('title')]
-        if movie_details.get('alternative_titles'):
-            titles += movie_details['alternative_titles'].split(',')
-        releases = fuzzy_title(releases, titles, movie_details.get('english_title'), lang_names)
-
-    if preferred_groups and preferred_groups != ['']:
-        releases = score_preferred(releases, preferred_groups)
+    releases = scorer.score(releases, movie_details)
 
     logging.info('Finished scoring releases.')
 
     return releases
 
-def words_to_list(words):
-    return [i.split('&') for i in words.lower().replace(' ', '').split(',') if i != '']
-
-def reset(releases):
-    ''' Sets all result's scores to 0, and clear reject reason
-    releases (dict): scene release metadata to score
-
-    returns dict
-    '''
-    logging.debug('Resetting release scores to 0, and clear reject reasons.')
-    for i, d in enumerate(releases):
-        releases[i]['score'] = 0
-        releases[i]['reject_reason'] = None
-
-
-def remove_ignored(releases, group_list):
-    ''' Set reject_reason for releases with ignored groups of 'words'
-    releases (list[dict]): scene release metadata to score and filter
-    group_list (list[list[str]]): forbidden groups of words
-
-    group_list must be formatted as a list of lists ie:
-        [['word1'], ['word2', 'word3']]
-
-    Iterates through releases and removes every entry that contains any
-        group of words in group_list
-
-    Returns list[dict]
-    '''
-
-    reject = 0
-
-    logging.info('Filtering Ignored Words.')
-    for r in releases:
-        if r['reject_reason']:
-            reject += 1
-            continue
-        if r['type'] == 'import':
-            continue
-        for word_group in group_list:
-            if all(word in r['title'].lower() for word in word_group):
-                logging.debug('{} found in {}, removing from releases.'.format(word_group, r['title']))
-                r['reject_reason'] = 'ignored words found ({})'.format(' '.join(word_group))
-                reject += 1
-                break
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-
-    return releases
-
 
-def keep_required(releases, group_list):
-    ''' Set reject_reason for releases without required groups of 'words'
-    releases (list[dict]): scene release metadata to score and filter
-    group_list (list[list[str]]): required groups of words
+def get_scorer(profile, category, filters, imported=False):
+    ''' Gets compiled Scorer for profile, category, and filters
+    profile (str): name of quality profile
+    category (str): name of category
+    filters (str): json-encoded filters of movie
+    imported (bool): if Scorer is for library imports   <optional - default False>
 
-    group_list must be formatted as a list of lists ie:
-        [['word1'], ['word2', 'word3']]
+    Scorers are cached until config is loaded or saved, see clear_scorers().
 
-    Iterates through releases and rejects every entry that does not
-        contain any group of words in group_list
-
-    Returns list[dict]
-    '''
-
-    reject = 0
-
-    logging.info('Filtering Required Words.')
-    logging.debug(f'Required Words: {str(group_list)}')
-    for r in releases:
-        if r['reject_reason']:
-            reject += 1
-            continue
-        if r['type'] == 'import':
-            continue
-        required_group = False
-        for word_group in group_list:
-            if all(word in r['title'].lower() for word in word_group):
-                logging.debug('{} found in {}, keeping this search result.'.format(word_group, r['title']))
-                required_group = True
-                break
-
-        if not required_group:
-            r['reject_reason'] = 'required words missing'
-            reject += 1
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-
-    return releases
-
-
-def retention_check(releases):
-    ''' Set reject_reason for releases older than 'retention' days
-    releases (list[dict]): scene release metadata to score and filter
-    retention (int): days of retention limit
-
-    Iterates through releases and removes any nzb entry that was
-        published more than 'retention' days ago
-
-    returns list[dict]
+    Returns object Scorer
     '''
+    key = (profile, category, filters, imported)
 
-    today = datetime.datetime.today()
-
-    logging.info('Checking retention [threshold = {} days].'.format(core.CONFIG['Search']['retention']))
-    reject = 0
-    for result in releases:
-        if result['reject_reason']:
-            reject += 1
-            continue
-        if result['type'] == 'nzb':
-            pubdate = datetime.datetime.strptime(result['pubdate'], '%d %b %Y')
-            age = (today - pubdate).days
-            if age >= core.CONFIG['Search']['retention']:
-                logging.debug('{} published {} days ago, removing search result.'.format(result['title'], age))
-                result['reject_reason'] = 'older than retention ({})'.format(core.CONFIG['Search']['retention'])
-                reject += 1
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-    return releases
-
-
-def seed_check(releases):
-    ''' Set reject_reason for any torrents with fewer than 'seeds' seeders
-    releases (list[dict]): scene release metadata to score and filter
-
-    Gets required seeds from core.CONFIG
-
-    Returns list[dict]
-    '''
-
-    logging.info('Checking torrent seeds.')
-    reject = 0
-    for result in releases:
-        if result['reject_reason']:
-            reject += 1
-            continue
-        if result['type'] in ('torrent', 'magnet'):
-            if int(result['seeders']) < core.CONFIG['Search']['mintorrentseeds']:
-                logging.debug('{} has {} seeds, removing search result.'.format(result['title'], result['seeders']))
-                result['reject_reason'] = 'not enough seeds ({})'.format(core.CONFIG['Search']['mintorrentseeds'])
-                reject += 1
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-    return releases
-
-
-def freeleech(releases):
-    ''' Adds points to freeleech torrents
-    releases (list[dict]): scene release metadata to score and filter
+    scorer = _scorers.get(key)
+    if scorer is None:
+        quality = core.CONFIG['Quality']['Profiles'][profile]
+        if imported:
+            scorer = Scorer(quality, None, None, check_size=False)
+        else:
+            scorer = Scorer(quality, core.CONFIG['Categories'].get(category), json.loads(filters))
+        with _scorers_lock:
+            _scorers[key] = scorer
+    return scorer
 
-    Returns list[dict]
-    '''
-    logging.info('Checking torrent Freeleech info.')
-    points = core.CONFIG['Search']['freeleechpoints']
-    reject = 0
-    for release in releases[:]:
-        if release['reject_reason']:
-            reject += 1
-            continue
-        if not release['type'] in ('magnet', 'torrent'):
-            continue
-        if release['freeleech'] == 1:
-            if core.CONFIG['Search']['requirefreeleech']:
-                continue
-            logging.debug('Adding {} Freeleech points to {}.'.format(points, release['title']))
-            release['score'] += points
-        elif core.CONFIG['Search']['requirefreeleech']:
-            logging.debug('{} is not Freeleech, rejecting search result.'.format(release['title']))
-            release['reject_reason'] = 'freeleech required'
-            reject += 1
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-    return releases
 
+def clear_scorers():
+    ''' Removes all cached Scorers
 
-def threshold_score(releases, attr, points, threshold):
-    ''' Adds points to releases if attr is greater than threshold
-    releases (list[dict]): scene release metadata to score
-    attr (str): attr in release to check
-    points (int): points to add to score
-    threshold (int): value to compare attr against
+    Scorers are compiled from core.CONFIG, so this must be called whenever
+        config is loaded or saved.
 
-    Returns list[dict]
+    Does not return
     '''
-    logging.info(f'Comparing torrent {attr} with {threshold}.')
-    for release in releases[:]:
-        try:
-            if attr in release and release[attr] > threshold:
-                release['score'] += points
-        except TypeError:
-            logging.warn(f'{attr} is not int ({release})')
+    with _scorers_lock:
+        _scorers.clear()
 
-    return releases
 
+def words_to_list(words):
+    return [i.split('&') for i in words.lower().replace(' ', '').split(',') if i != '']
 
-def score_preferred(releases, group_list):
-    ''' Increase score for each group of 'words' match
-    releases (list[dict]): scene release metadata to score and filter
-    group_list (list): preferred groups of words
-
-    group_list must be formatted as a list of lists ie:
-        [['word1'], ['word2', 'word3']]
 
-    Iterates through releases and adds 10 points to every
-        entry for each word group it contains
+class Scorer:
+    ''' Scores releases against one quality profile, category, and filter set
 
-    Returns list[dict]
+    Word groups and search settings are read from config once when the Scorer
+        is created. Releases are then scored and filtered in a single pass in
+        the same order as the individual checks: ignored words, required words,
+        retention, seeds, freeleech, seeder/leecher points, source and size,
+        year, title, and preferred words.
     '''
 
-    logging.info('Scoring Preferred Words.')
-
-    if not group_list or group_list == ['']:
-        return
-
-    for r in releases:
-        for word_group in group_list:
-            if all(word in r['title'].lower() for word in word_group):
-                logging.debug('{} found in {}, adding 10 points.'.format(word_group, r['title']))
-                r['score'] += 10
+    empty_words = {'requiredwords': '', 'preferredwords': '', 'ignoredwords': ''}
+
+    def __init__(self, quality, category, filters, check_size=True):
+        ''' Compiles scoring rules
+        quality (dict): quality profile from config
+        category (dict): category from config, or None
+        filters (dict): per-movie filters, or None
+        check_size (bool): whether or not to set reject reason based on size   <optional - default True>
+        '''
+        category = category or self.empty_words
+        filters = filters or self.empty_words
+
+        self.required = words_to_list(quality['requiredwords']) + words_to_list(filters['requiredwords']) + words_to_list(category['requiredwords'])
+        self.preferred = words_to_list(quality['preferredwords']) + words_to_list(filters['preferredwords']) + words_to_list(category['preferredwords'])
+        self.ignored = words_to_list(quality['ignoredwords']) + words_to_list(filters['ignoredwords']) + words_to_list(category['ignoredwords'])
+
+        self.scoretitle = quality['scoretitle']
+
+        # {source: (enabled, points, min_size, max_size)}
+        score_range = len(core.SOURCES) + 1
+        sizes = core.CONFIG['Quality']['Sources']
+        self.sources = {}
+        for k, v in quality['Sources'].items():
+            if check_size:
+                min_size = sizes[k]['min']
+                max_size = sizes[k]['max']
             else:
-                continue
-    return releases
-
-def score_year(releases, year):
-    ''' Increase score for each group of 'words' match
-    releases (list[dict]): scene release metadata to score and filter
-    year (int): expected year
-
-    Iterates through releases and adds 20 points to every
-        entry with exact year match
-    Keeps releases without year or 1 year higher or lower.
-
-    Returns list[dict]
-    '''
-
-    logging.info('Checking year match.')
-
-    reject = 0
-
-    for r in releases:
-        if r['reject_reason']:
-            reject += 1
-            continue
-        if 'ptn' not in r:
-            r['ptn'] = PTN.parse(r['title'])
-        if 'year' in r['ptn']:
-            if r['ptn']['year'] == year:
-                r['score'] += 20
-            if abs(year - r['ptn']['year']) > 1:
-                reject += 1
-                r['reject_reason'] = 'Year mismatch'
+                min_size = 0
+                max_size = Ellipsis
+            self.sources[k] = (v[0], abs(v[1] - score_range) * 40, min_size, max_size)
+
+        search = core.CONFIG['Search']
+        self.retention = search['retention']
+        self.min_seeds = search['mintorrentseeds']
+        self.freeleech_points = search['freeleechpoints']
+        self.require_freeleech = search['requirefreeleech']
+        self.thresholds = []
+        if search['seederspoints'] and search['seedersthreshold']:
+            self.thresholds.append(('seeders', search['seederspoints'], search['seedersthreshold']))
+        if search['leecherspoints'] and search['leechersthreshold']:
+            self.thresholds.append(('leechers', search['leecherspoints'], search['leechersthreshold']))
+
+    def score(self, releases, movie):
+        ''' Scores and filters releases
+        releases (list[dict]): scene release metadata to score and filter
+        movie (dict): movie details from MOVIES, or empty dict for imports
+
+        Sets 'score' and 'reject_reason' of every release.
+
+        Returns list[dict]
+        '''
+        year = int(movie['year']) if movie.get('year') else None
+        title = movie['title'].lower() if movie else None
+
+        ignored = self.ignored
+        if movie.get('download_language'):
+            lang_names = [lang.lower() for lang in core.config.lang_names(movie['download_language'])]
+            logging.debug('remove {} names from ignored groups: {}'.format(movie['download_language'], lang_names))
+            ignored = [group for group in ignored if not ' '.join(group).lower() in lang_names]
         else:
-            logging.debug('No year mismatch found')
-            continue
-
-    return releases
-
-
-def fuzzy_title(releases, titles, english_title, lang_names):
-    ''' Score and remove releases based on title match
-    releases (list[dict]): scene release metadata to score and filter
-    titles (list): titles to match against
-
-    If titles is an empty list every result is treated as a perfect match
+            lang_names = []
+
+        if ignored and title:
+            ignored = [word_group for word_group in ignored if not all(word in title for word in word_group)]
+            logging.debug(f'ignored groups not in movie title: {ignored}')
+
+        if self.scoretitle:
+            titles = [movie.get('title')]
+            if movie.get('alternative_titles'):
+                titles += movie['alternative_titles'].split(',')
+            english_title = movie.get('english_title')
+            any_title = titles == [None]
+            titles = [t for t in titles if t != english_title]
+
+        check_retention = self.retention > 0 and any(i['type'] == 'nzb' for i in releases)
+        check_torrents = any(i['type'] in ('torrent', 'magnet') for i in releases)
+        today = datetime.datetime.today()
+
+        reject = 0
+        for r in releases:
+            r['score'] = 0
+            r['reject_reason'] = None
+
+            kind = r['type']
+            release_title = r['title'].lower()
+
+            if ignored and kind != 'import':
+                for word_group in ignored:
+                    if all(word in release_title for word in word_group):
+                        logging.debug('{} found in {}, removing from releases.'.format(word_group, r['title']))
+                        r['reject_reason'] = 'ignored words found ({})'.format(' '.join(word_group))
+                        break
+
+            if self.required and kind != 'import' and not r['reject_reason']:
+                if not any(all(word in release_title for word in word_group) for word_group in self.required):
+                    r['reject_reason'] = 'required words missing'
+
+            if check_retention and kind == 'nzb' and not r['reject_reason']:
+                pubdate = datetime.datetime.strptime(r['pubdate'], '%d %b %Y')
+                age = (today - pubdate).days
+                if age >= self.retention:
+                    logging.debug('{} published {} days ago, removing search result.'.format(r['title'], age))
+                    r['reject_reason'] = f'older than retention ({self.retention})'
+
+            if check_torrents:
+                self._score_torrent(r)
+
+            if not r['reject_reason']:
+                self._score_source(r)
+
+            if year is not None and not r['reject_reason']:
+                if 'ptn' not in r:
+                    r['ptn'] = ptncache.parse(r['title'])
+                if 'year' in r['ptn']:
+                    if r['ptn']['year'] == year:
+                        r['score'] += 20
+                    if abs(year - r['ptn']['year']) > 1:
+                        r['reject_reason'] = 'Year mismatch'
+
+            if self.scoretitle and not r['reject_reason']:
+                if any_title:
+                    r['score'] += 20
+                else:
+                    self._score_title(r, titles, english_title, lang_names)
 
-    Iterates through releases and removes any entry that does not
-        fuzzy match 'title' > 70.
-    Adds fuzzy_score / 20 points to ['score']
+            for word_group in self.preferred:
+                if all(word in release_title for word in word_group):
+                    logging.debug('{} found in {}, adding 10 points.'.format(word_group, r['title']))
+                    r['score'] += 10
 
-    Returns list[dict]
-    '''
+            if r['reject_reason']:
+                reject += 1
 
-    logging.info('Checking title match.')
+        logging.info(f'Keeping {len(releases) - reject} releases.')
+        return releases
 
-    reject = 0
-    if titles == [] or titles == [None]:
-        logging.debug('No titles available to compare, scoring all as perfect match.')
-        for result in releases:
-            if result['reject_reason']:
-                reject += 1
-                continue
-            result['score'] += 20
-    else:
-        titles = [title for title in titles if title != english_title]
-        for result in releases:
-            if result['reject_reason']:
-                reject += 1
-                continue
-            if result['type'] == 'import':
-                logging.debug('{} is an Import, sorting as a perfect match.'.format(result['title']))
-                result['score'] += 20
-                continue
-
-            rel_title_ss = result.get('ptn', PTN.parse(result['title']))['title']
-
-            if titles:
-                logging.debug(f'Comparing release substring {rel_title_ss} with titles {titles}.')
-                matches = [_fuzzy_title(rel_title_ss, title) for title in titles]
-                if any(match > 70 for match in matches):
-                    result['score'] += int(max(matches) / 5)
-                    continue
+    def _score_torrent(self, r):
+        ''' Checks seeds and freeleech, and adds seeder/leecher points
+        r (dict): scene release metadata to score and filter
+
+        Seeder and leecher points are added to every release that has them,
+            even if it has already been rejected.
+
+        Does not return
+        '''
+        if r['type'] in ('torrent', 'magnet'):
+            if self.min_seeds > 0 and not r['reject_reason']:
+                if int(r['seeders']) < self.min_seeds:
+                    logging.debug('{} has {} seeds, removing search result.'.format(r['title'], r['seeders']))
+                    r['reject_reason'] = f'not enough seeds ({self.min_seeds})'
+
+            if (self.freeleech_points > 0 or self.require_freeleech) and not r['reject_reason']:
+                if r['freeleech'] == 1:
+                    if not self.require_freeleech:
+                        logging.debug('Adding {} Freeleech points to {}.'.format(self.freeleech_points, r['title']))
+                        r['score'] += self.freeleech_points
+                elif self.require_freeleech:
+                    logging.debug('{} is not Freeleech, rejecting search result.'.format(r['title']))
+                    r['reject_reason'] = 'freeleech required'
+
+        for attr, points, threshold in self.thresholds:
+            try:
+                if attr in r and r[attr] > threshold:
+                    r['score'] += points
+            except TypeError:
+                logging.warn(f'{attr} is not int ({r})')
+
+    def _score_source(self, r):
+        ''' Score release based on quality/source preferences
+        r (dict): scene release metadata to score and filter
+
+        Rejects release if it does not fit into quality criteria (source-resolution, filesize)
+        Adds to ['score'] based on priority of match
+
+        Does not return
+        '''
+        result_res = r['resolution']
+        size = r['size'] / 1000000
+        if r['type'] == 'import' and result_res not in self.sources:
+            return
+
+        source = self.sources.get(result_res)
+        if source is None or (source[0] is False and r['type'] != 'import'):
+            r['reject_reason'] = f'source not accepted ({result_res})'
+            return
+
+        enabled, points, min_size, max_size = source
+        if r['type'] != 'import' and not (min_size < size < max_size):
+            logging.debug('Removing {}, size {} not in range {}-{}.'.format(r['title'], size, min_size, max_size))
+            r['reject_reason'] = f'size {size} not in range {min_size}-{max_size}'
+            return
+
+        r['score'] += points
+
+    def _score_title(self, r, titles, english_title, lang_names):
+        ''' Score release based on title match
+        r (dict): scene release metadata to score and filter
+        titles (list): titles to match against, without english_title
+        english_title (str): english title of movie
+        lang_names (list): names of movie's download language
+
+        Rejects release if it does not fuzzy match any title > 70.
+        Adds fuzzy_score / 5 points to ['score']
+
+        Does not return
+        '''
+        if r['type'] == 'import':
+            logging.debug('{} is an Import, sorting as a perfect match.'.format(r['title']))
+            r['score'] += 20
+            return
+
+        rel_title_ss = (r['ptn'] if 'ptn' in r else ptncache.parse(r['title']))['title']
+
+        if titles:
+            logging.debug(f'Comparing release substring {rel_title_ss} with titles {titles}.')
+            matches = [_fuzzy_title(rel_title_ss, title) for title in titles]
+            if any(match > 70 for match in matches):
+                r['score'] += int(max(matches) / 5)
+                return
+        else:
+            matches = [0]
+
+        if english_title and any(re.search(r'\b' + lang + r'\b', r['title'].lower()) for lang in lang_names):
+            logging.debug(f'Comparing release substring {rel_title_ss} with english title {english_title}.')
+            match = _fuzzy_title(rel_title_ss, english_title)
+            if match > 70:
+                r['score'] += int(match / 5)
+                return
             else:
-                matches = [0]
-
-            if english_title and any(re.search(r'\b' + lang + r'\b', result['title'].lower()) for lang in lang_names):
-                logging.debug(f'Comparing release substring {rel_title_ss} with english title {english_title}.')
-                match = _fuzzy_title(rel_title_ss, english_title)
-                if match > 70:
-                    result['score'] += int(match / 5)
-                    continue
-                else:
-                    matches.append(match)
+                matches.append(match)
 
-            logging.debug('{} best title match was {}%, removing search result.'.format(result['title'], max(matches)))
-            result['reject_reason'] = f'mismatch title (best match was {max(matches)}%)'
-            reject += 1
+        logging.debug('{} best title match was {}%, removing search result.'.format(r['title'], max(matches)))
+        r['reject_reason'] = f'mismatch title (best match was {max(matches)}%)'
 
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-    return releases
 
 def _fuzzy_title(a, b):
     ''' Determines how much of a is in b
@@ -464,87 +370,27 @@ def _fuzzy_title(a, b):
     Returns int
     '''
 
-    a = a.replace('&', 'and')
-    b = b.replace('&', 'and')
-    a = a.replace('\'', '')
-    b = b.replace('\'', '')
-    a = a.replace(':', '')
-    b = b.replace(':', '')
-
-    a_words = Url.normalize(a).split(' ')
-    b_words = Url.normalize(b).split(' ')
-
-    m = 0
-    a_len = len(a_words)
+    a_len, a_words = _title_words(a)
+    b_len, b_words = _title_words(b)
 
-    for i in a_words:
-        if i in b_words:
-            b_words.remove(i)
-            m += 1
+    m = sum(min(n, b_words[word]) for word, n in a_words.items())
 
     return int((m / a_len) * 100)
 
 
-def score_sources(releases, sources, check_size=True):
-    ''' Score releases based on quality/source preferences
-    releases (list[dict]): scene release metadata to score and filter
-    sources (dict): sources from user config
-    check_size (bool): whether or not to set reject reason based on size
+@functools.lru_cache(maxsize=4096)
+def _title_words(title):
+    ''' Splits title into words for _fuzzy_title
+    title (str): title to split
 
-    Iterates through releases and removes any entry that does not
-        fit into quality criteria (source-resoution, filesize)
-    Adds to ['score'] based on priority of match
+    Movie titles and release titles are compared many times per search,
+        so words are cached by title. Do not modify the returned Counter.
 
-    Returns list[dict]
+    Returns tuple (int number of words, Counter of words)
     '''
-
-    logging.info('Filtering resolution and size requirements.')
-    score_range = len(core.SOURCES) + 1
-
-    sizes = core.CONFIG['Quality']['Sources']
-
-    reject = 0
-    for result in releases:
-        if result['reject_reason']:
-            reject += 1
-            continue
-        result_res = result['resolution']
-        logging.debug('Scoring and filtering {} based on resolution {}.'.format(result['title'], result_res))
-        size = result['size'] / 1000000
-        if result['type'] == 'import' and result_res not in sources:
-            continue
-
-        accepted = False
-        for k, v in sources.items():
-            if v[0] is False and result['type'] != 'import':
-                continue
-            priority = v[1]
-            if check_size:
-                min_size = sizes[k]['min']
-                max_size = sizes[k]['max']
-            else:
-                min_size = 0
-                max_size = Ellipsis
-
-            if result_res == k:
-                logging.debug('{} matches source {}, checking size.'.format(result['title'], k))
-
-                if result['type'] != 'import' and not (min_size < size < max_size):
-                    logging.debug('Removing {}, size {} not in range {}-{}.'.format(result['title'], size, min_size, max_size))
-                    result['reject_reason'] = f'size {size} not in range {min_size}-{max_size}'
-                    reject += 1
-                    break
-
-                result['score'] += abs(priority - score_range) * 40
-                accepted = True
-                break
-
-        if not accepted and not result['reject_reason']:
-            result['reject_reason'] = f'source not accepted ({result_res})'
-            reject += 1
-
-    logging.info(f'Keeping {len(releases) - reject} releases.')
-    return releases
+    title = title.replace('&', 'and').replace('\'', '').replace(':', '')
+    words = Url.normalize(title).split(' ')
+    return len(words), collections.Counter(words)
 
 
 def import_quality():
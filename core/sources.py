@@ -0,0 +1,98 @@
+import logging
+import re
+import threading
+
+import core
+
+logging = logging.getLogger(__name__)
+
+# Source media classification using core.CONFIG['Quality']['Aliases']
+#
+# All alias groups are compiled into a single regex the first time they are
+# needed and kept until config is loaded or saved, see clear().
+
+_matcher = None
+_lock = threading.Lock()
+
+
+def get_matcher():
+    ''' Gets compiled SourceMatcher for current config
+
+    Returns object SourceMatcher
+    '''
+    global _matcher
+    matcher = _matcher
+    if matcher is None:
+        with _lock:
+            if _matcher is None:
+                _matcher = SourceMatcher(core.CONFIG['Quality']['Aliases'])
+            matcher = _matcher
+    return matcher
+
+
+def clear():
+    ''' Removes compiled SourceMatcher
+
+    SourceMatcher is compiled from core.CONFIG, so this must be called whenever
+        config is loaded or saved.
+
+    Does not return
+    '''
+    global _matcher
+    with _lock:
+        _matcher = None
+
+
+class SourceMatcher:
+    ''' Finds source media in release names
+
+    Sources are checked in config order, the first source with an alias
+        found in the text wins regardless of where in the text it is found.
+    '''
+
+    def __init__(self, aliases):
+        ''' Compiles alias groups
+        aliases (dict): {source: [alias, alias, ...]} from config
+        '''
+        self.sources = [source for source, words in aliases.items() if words]
+
+        # Each source gets its own named group, in config order. Matching
+        #   inside a lookahead lets every position in the text be checked,
+        #   so overlapping aliases are not skipped over.
+        groups = '|'.join(f'(?P<s{i}>{"|".join(aliases[source])})' for i, source in enumerate(self.sources))
+        self.regex = re.compile(rf'(?=\b(?:{groups})\b)') if groups else None
+
+        # {alias: source} for exact matches, first source wins
+        self.exact_aliases = {}
+        for source, words in aliases.items():
+            for word in words:
+                self.exact_aliases.setdefault(word.lower(), source)
+
+    def search(self, text):
+        ''' Finds source with an alias in text
+        text (str): lowercase text to search, ie release quality
+
+        Aliases must be found as whole words.
+
+        Returns str source name or None
+        '''
+        if self.regex is None:
+            return None
+        best = None
+        for match in self.regex.finditer(text):
+            idx = int(match.lastgroup[1:])
+            if best is None or idx < best:
+                best = idx
+                if best == 0:
+                    break
+        return None if best is None else self.sources[best]
+
+    def exact(self, text):
+        ''' Finds source with alias equal to text
+        text (str): text to match, ie quality parsed from file name
+
+        Comparison is case-insensitive.
+
+        Returns str source name or None
+        '''
+        return self.exact_aliases.get(text.lower())
@@ -1,26 +1,56 @@
 import core
 import datetime
 import logging
-import time
 import os
 import shutil
+import threading
+from contextlib import contextmanager
 from core import config
+from core import sqlquery
+from core.sqlquery import chunks, matches, nocase, values_in
 
 from core.helpers import Comparisons
 import sqlalchemy as sqla
 
 logging = logging.getLogger(__name__)
 
-current_version = 16
+current_version = 19
+
+
+def create_engine(DB_NAME):
+    ''' Creates sqla engine for database
+    DB_NAME (str): sqla url of database
+
+    Connections are pooled and shared between threads. Each new connection
+        is switched to WAL so reads don't block behind writes. If the database
+        is locked, sqlite's busy handler waits up to 30 seconds for it.
+
+    Returns object sqla Engine
+    '''
+    engine = sqla.create_engine(DB_NAME, echo=False, poolclass=sqla.pool.QueuePool, pool_size=10, max_overflow=20,
+                                connect_args={'timeout': 30, 'check_same_thread': False})
+
+    @sqla.event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA cache_size=-16000')
+        cursor.close()
+
+    return engine
 
 
 def proxy_to_dict(p):
     ''' Conversts sqla resultproxy to dict
     p (resultproxy): response from sqla call
 
+    Zipping with the row's fields is much faster than dict(row) on sqla's
+        legacy rows, which matters when loading the whole library.
+
     returns list of dicts
     '''
-    return [dict(i) for i in p]
+    return [dict(zip(i._fields, i)) for i in p]
 
 
 class SQL:
@@ -34,6 +64,17 @@ class SQL:
 
     '''
 
+    # (name, table, columns, unique)
+    # Identifiers are compared with COLLATE NOCASE throughout, so the indexes must be too.
+    indexes = [('ix_movies_imdbid', 'MOVIES', 'imdbid COLLATE NOCASE', True),
+               ('ix_searchresults_imdbid', 'SEARCHRESULTS', 'imdbid COLLATE NOCASE', False),
+               ('ix_searchresults_guid', 'SEARCHRESULTS', 'guid COLLATE NOCASE', False),
+               ('ix_searchresults_downloadid', 'SEARCHRESULTS', 'downloadid COLLATE NOCASE, status COLLATE NOCASE', False),
+               ('ix_markedresults_imdbid', 'MARKEDRESULTS', 'imdbid COLLATE NOCASE', False),
+               ('ix_markedresults_guid', 'MARKEDRESULTS', 'guid COLLATE NOCASE', True),
+               ('ix_fileindex_parent', 'FILEINDEX', 'parent', False)
+               ]
+
     convert_names = {'MOVIES':
                      [('url', 'tomatourl'),
                       ('score', 'tomatorating'),
@@ -44,6 +85,7 @@ class SQL:
 
     def __init__(self):
         self.metadata = sqla.MetaData()
+        self.local = threading.local()
         DB_NAME = f'sqlite:///{core.DB_FILE}'
 
         # These definitions only exist to CREATE tables.
@@ -119,9 +161,25 @@ class SQL:
         self.POSTPROCESSED_PATHS = sqla.Table('POSTPROCESSED_PATHS', self.metadata,
                                               sqla.Column('path', sqla.TEXT, primary_key=True)
                                               )
+        self.TMDBCACHE = sqla.Table('TMDBCACHE', self.metadata,
+                                    sqla.Column('request', sqla.TEXT, primary_key=True),
+                                    sqla.Column('endpoint', sqla.TEXT),
+                                    sqla.Column('data', sqla.BLOB),
+                                    sqla.Column('etag', sqla.TEXT),
+                                    sqla.Column('last_modified', sqla.TEXT),
+                                    sqla.Column('fetched', sqla.REAL)
+                                    )
+        self.FILEINDEX = sqla.Table('FILEINDEX', self.metadata,
+                                    sqla.Column('path', sqla.TEXT, primary_key=True),
+                                    sqla.Column('parent', sqla.TEXT),
+                                    sqla.Column('is_dir', sqla.SMALLINT),
+                                    sqla.Column('size', sqla.INTEGER),
+                                    sqla.Column('mtime', sqla.REAL),
+                                    sqla.Column('inode', sqla.INTEGER)
+                                    )
 
         try:
-            self.engine = sqla.create_engine(DB_NAME, echo=False, connect_args={'timeout': 30})
+            self.engine = create_engine(DB_NAME)
             if not os.path.isfile(core.DB_FILE):
                 print(f'Creating database file {core.DB_FILE}')
                 self.create_database(DB_NAME)
@@ -144,7 +202,9 @@ class SQL:
         logging.info('Creating Database tables.')
         print('Creating tables.')
         self.metadata.create_all(self.engine)
-        self.engine = sqla.create_engine(DB_NAME, echo=False, connect_args={'timeout': 30})
+        self.engine.dispose()
+        self.engine = create_engine(DB_NAME)
+        self.create_indexes()
         self.set_version(current_version)
         logging.info(f'Connected to database {DB_NAME}')
         print(f'Connected to database {DB_NAME}')
@@ -154,35 +214,90 @@ class SQL:
         ''' Executes SQL command
         command (list): SQL commands ie ['INSERT INTO table (columns) VALUES (?)', 'value']
 
-        We are going to loop this up to 5 times in case the database is locked.
-        After each attempt we wait 1 second to try again. This allows the query
-            that has the database locked to (hopefully) finish. It might
-            (i'm not sure) allow a query to jump in line between a series of
-            queries. So if we are writing searchresults to every movie at once,
-            the get_user_movies request may be able to jump in between them to
-            get the user's movies to the browser. Maybe.
+        If called inside of SQL.transaction() the command is executed on that
+            transaction's connection. Otherwise it is committed immediately on a
+            connection from the pool.
+
+        Rows are read before the connection is returned to the pool, so the
+            result can be used after the connection is gone.
 
         Returns object sqlalchemy ResultProxy of command, or None if unable to execute
         '''
 
         logging.debug(f'Executing SQL command: {command}')
 
-        tries = 0
-        while tries < 5:
-            try:
-                return self.engine.execute(*command)
-
-            except Exception as e:
-                logging.error(f'SQL Database Query: {command}.', exc_info=True)
-                if 'database is locked' in e.args[0]:
-                    logging.debug(f'SQL Query attempt # {tries}.')
-                    tries += 1
-                    time.sleep(1)
-                else:
-                    logging.error(f'SQL Databse Query: {command}.', exc_info=True)
-                    return None
-        # all tries exhausted
-        return None
+        connection = getattr(self.local, 'connection', None)
+
+        try:
+            if connection is not None:
+                return self._buffer(connection.execute(*command))
+            with self.engine.begin() as connection:
+                return self._buffer(connection.execute(*command))
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except Exception as e:
+            logging.error(f'SQL Database Query: {command}.', exc_info=True)
+            if connection is not None:
+                self.local.failed = True
+            return None
+
+    @staticmethod
+    def _buffer(result):
+        ''' Reads all rows from result
+        result (object): sqlalchemy ResultProxy
+
+        Returns object sqlalchemy ResultProxy
+        '''
+        if result.returns_rows:
+            return result.freeze()()
+        return result
+
+    @contextmanager
+    def transaction(self):
+        ''' Groups SQL commands into one transaction
+
+        Use as:
+            with core.sql.transaction():
+                core.sql.write_search_results(results)
+                core.sql.update_movie_statuses(statuses)
+
+        Every call to SQL.execute in this thread uses the same connection until
+            the block exits. If any command fails, or the block raises, all
+            commands are rolled back. Nested calls join the outer transaction.
+
+        Yields None
+        '''
+        if getattr(self.local, 'connection', None) is not None:
+            yield
+            return
+
+        connection = self.engine.connect()
+        trans = connection.begin()
+        self.local.connection = connection
+        self.local.failed = False
+        try:
+            yield
+        except BaseException:
+            trans.rollback()
+            raise
+        else:
+            if self.local.failed:
+                logging.warning('SQL command in transaction failed, rolling back.')
+                trans.rollback()
+            else:
+                trans.commit()
+        finally:
+            self.local.connection = None
+            connection.close()
+
+    def checkpoint(self):
+        ''' Writes WAL contents into the main database file
+
+        Call before copying the database file.
+
+        Does not return
+        '''
+        self.execute(['PRAGMA wal_checkpoint(TRUNCATE)'])
 
     def write(self, TABLE, DB_STRING):
         ''' Writes row to table
@@ -209,6 +324,31 @@ class SQL:
             logging.error('Unable to write to database.')
             return False
 
+    def write_movies(self, LIST):
+        ''' Writes movies to table
+        LIST (list): dicts to write into MOVIES
+
+        Returns bool
+        '''
+
+        if not LIST:
+            return True
+
+        columns = self.MOVIES.columns.keys()
+        for row in LIST:
+            for k in columns - row.keys():
+                row[k] = None
+
+        logging.debug(f'Writing {len(LIST)} movies into MOVIES.')
+
+        command = [self.MOVIES.insert(), LIST]
+
+        if self.execute(command):
+            return True
+        else:
+            logging.error('Unable to write movies.')
+            return False
+
     def write_search_results(self, LIST):
         ''' Writes search results to table
         LIST (list): dicts to write into SEARCHRESULTS
@@ -236,6 +376,88 @@ class SQL:
             logging.error('Unable to write search results.')
             return False
 
+    def sync_search_results(self, imdbid, results):
+        ''' Replaces all search results for a movie, writing only what changed
+        imdbid (str): imdb id #
+        results (list): dicts of every search result to keep for imdbid
+
+        Stored rows are matched to results by guid. Rows whose guid is no
+            longer in results are deleted, new guids are inserted, and rows
+            that differ from their result are updated in place. Unchanged rows
+            are not written at all.
+
+        Leaves SEARCHRESULTS the same as purge_search_results(imdbid) followed
+            by write_search_results(results).
+
+        Returns bool
+        '''
+
+        SEARCHRESULTS = self.SEARCHRESULTS
+        columns = SEARCHRESULTS.columns.keys()
+
+        def key(guid):
+            # guids are compared with NOCASE, group anything that may collide
+            return guid.lower() if guid is not None else None
+
+        select = sqlquery.cached(('search_results_all',), lambda: sqla.select(SEARCHRESULTS).where(matches(SEARCHRESULTS, ['imdbid'])))
+        stored = self.execute([select, {'imdbid': imdbid}])
+        if stored is None:
+            logging.error('Unable to read search results.')
+            return False
+
+        old = {}
+        for row in proxy_to_dict(stored.fetchall()):
+            old.setdefault(key(row['guid']), []).append(row)
+
+        new = {}
+        for result in results:
+            row = {k: result.get(k) for k in columns}
+            new.setdefault(key(row['guid']), []).append(row)
+
+        inserts = []
+        updates = []
+        deletes = []
+        for k, rows in new.items():
+            stored = old.pop(k, [])
+            if k is not None and len(rows) == 1 and len(stored) == 1:
+                if rows[0] != stored[0]:
+                    updates.append(dict(rows[0], imdbid_=imdbid, guid_=stored[0]['guid']))
+            else:
+                # duplicate guids can't be told apart, so replace them all
+                deletes += stored
+                inserts += rows
+        for stored in old.values():
+            deletes += stored
+
+        logging.debug(f'Syncing search results for {imdbid}: {len(inserts)} new, {len(updates)} changed, {len(deletes)} removed.')
+
+        delete_guids = list(dict.fromkeys(row['guid'] for row in deletes if row['guid'] is not None))
+        delete_null = any(row['guid'] is None for row in deletes)
+
+        def where():
+            return sqla.and_(nocase(SEARCHRESULTS.c.imdbid) == sqla.bindparam('imdbid_'), nocase(SEARCHRESULTS.c.guid) == sqla.bindparam('guid_'))
+
+        with self.transaction():
+            if delete_guids:
+                stmt = sqlquery.cached(('search_results_delete',), lambda: SEARCHRESULTS.delete().where(where()))
+                if self.execute([stmt, [{'imdbid_': imdbid, 'guid_': guid} for guid in delete_guids]]) is None:
+                    logging.error('Unable to remove search results.')
+                    return False
+            if delete_null:
+                stmt = sqlquery.cached(('search_results_delete_null',), lambda: SEARCHRESULTS.delete().where(sqla.and_(nocase(SEARCHRESULTS.c.imdbid) == sqla.bindparam('imdbid_'), SEARCHRESULTS.c.guid.is_(None))))
+                if self.execute([stmt, {'imdbid_': imdbid}]) is None:
+                    logging.error('Unable to remove search results.')
+                    return False
+            if updates:
+                stmt = sqlquery.cached(('search_results_update',), lambda: SEARCHRESULTS.update().where(where()).values({c: sqla.bindparam(c) for c in columns}))
+                if self.execute([stmt, updates]) is None:
+                    logging.error('Unable to update search results.')
+                    return False
+            if inserts and not self.write_search_results(inserts):
+                return False
+
+        return True
+
     def update(self, TABLE, COLUMN, VALUE, idcol, idval):
         ''' Updates single value in existing table row.
         TABLE (str): name of database table to write to
@@ -262,6 +484,28 @@ class SQL:
             logging.error('Unable to update database row.')
             return False
 
+    def update_movie_statuses(self, statuses):
+        ''' Updates status of several movies in one statement
+        statuses (dict): {imdbid: status}
+
+        Returns Bool
+        '''
+
+        logging.debug(f'Updating status for {len(statuses)} movies.')
+
+        if not statuses:
+            return True
+
+        vals = [(status, imdbid) for imdbid, status in statuses.items()]
+
+        command = ['UPDATE MOVIES SET status=? WHERE imdbid=? COLLATE NOCASE', vals]
+
+        if self.execute(command):
+            return True
+        else:
+            logging.error('Unable to update movie statuses.')
+            return False
+
     def update_all(self, TABLE, data):
         ''' Updates single value in all rows on table.
         TABLE (str): name of database table to write to
@@ -347,7 +591,7 @@ class SQL:
 
         TABLE = getattr(core.sql, TABLE)
 
-        core.sql.engine.execute(TABLE.update().where(getattr(TABLE.c, id_col) == sqla.bindparam(id_col_)).values(write), values)
+        self.execute([TABLE.update().where(getattr(TABLE.c, id_col) == sqla.bindparam(id_col_)).values(write), values])
 
         return
 
@@ -367,32 +611,50 @@ class SQL:
 
         logging.debug('Retrieving list of user\'s movies.')
 
-        filters = []
-        if status:
-            filters.append('status IN ("{}")'.format('", "'.join(status)))
-        if category:
-            filters.append(f'category = "{category}"')
-        if filters:
-            filters = "WHERE {}".format(' AND '.join(filters))
+        if sort_key != 'status' and sort_key not in self.MOVIES.c:
+            logging.warning(f'Unable to sort movies by {sort_key}, sorting by title.')
+            sort_key = 'title'
+
+        limit = int(limit)
+
+        def build():
+            MOVIES = self.MOVIES
+            stmt = sqla.select(MOVIES)
+            if status:
+                stmt = stmt.where(MOVIES.c.status.in_(sqla.bindparam('status', expanding=True)))
+            if category:
+                stmt = stmt.where(MOVIES.c.category == sqla.bindparam('category'))
+
+            if sort_key == 'status':
+                order = sqla.case({'Waiting': 1,
+                                   'Wanted': 2,
+                                   'Found': 3,
+                                   'Snatched': 4,
+                                   'Finished': 5,
+                                   'Disabled': 5
+                                   }, value=MOVIES.c.status)
+            else:
+                order = MOVIES.c[sort_key]
+            stmt = stmt.order_by(order.asc() if sort_direction == 'ASC' else order.desc())
 
-        if sort_key == 'status':
-            sort_key = '''CASE WHEN status = "Waiting" THEN 1
-                               WHEN status = "Wanted" THEN 2
-                               WHEN status = "Found" THEN 3
-                               WHEN status = "Snatched" THEN 4
-                               WHEN status = "Finished" THEN 5
-                               WHEN status = "Disabled" THEN 5
-                          END
-                       '''
+            if sort_key != 'sort_title':
+                stmt = stmt.order_by(MOVIES.c.sort_title.asc())
 
-        command = f'SELECT * FROM MOVIES {filters} ORDER BY {sort_key} {sort_direction}'
+            if limit > 0:
+                stmt = stmt.limit(sqla.bindparam('limit')).offset(sqla.bindparam('offset'))
+            return stmt
 
-        command += ', sort_title ASC' if sort_key != 'sort_title' else ''
+        stmt = sqlquery.cached(('user_movies', sort_key, sort_direction, bool(status), bool(category), limit > 0), build)
 
-        if int(limit) > 0:
-            command += f' LIMIT {limit} OFFSET {offset}'
+        params = {}
+        if status:
+            params['status'] = list(status)
+        if category:
+            params['category'] = category
+        if limit > 0:
+            params.update({'limit': limit, 'offset': int(offset)})
 
-        result = self.execute([command])
+        result = self.execute([stmt, params])
 
         if result:
             return proxy_to_dict(result)
@@ -409,16 +671,22 @@ class SQL:
 
         logging.debug('Getting count of library.')
 
-        filters = ''
-        if col and val:
-            filters = f'WHERE {col} = "{val}"'
+        if not val:
+            col = None
 
-        if group_col:
-            query = f'SELECT {group_col}, COUNT(1) FROM MOVIES {filters} GROUP BY {group_col}'
-        else:
-            query = f'SELECT COUNT(1) FROM MOVIES {filters}'
+        def build():
+            MOVIES = self.MOVIES
+            if group_col:
+                stmt = sqla.select(MOVIES.c[group_col], sqla.func.count()).group_by(MOVIES.c[group_col])
+            else:
+                stmt = sqla.select(sqla.func.count()).select_from(MOVIES)
+            if col:
+                stmt = stmt.where(MOVIES.c[col] == sqla.bindparam('val'))
+            return stmt
+
+        stmt = sqlquery.cached(('library_count', group_col, col), build)
 
-        result = self.execute([query])
+        result = self.execute([stmt, {'val': val} if col else {}])
         if result:
             if group_col:
                 return dict(result.fetchall())
@@ -440,9 +708,9 @@ class SQL:
 
         logging.debug(f'Retrieving details for movie {idval}.')
 
-        command = [f'SELECT * FROM MOVIES WHERE {idcol}="{idval}"']
+        stmt = sqlquery.cached(('movie_details', idcol), lambda: sqla.select(self.MOVIES).where(matches(self.MOVIES, [idcol])))
 
-        result = self.execute(command)
+        result = self.execute([stmt, {idcol: str(idval)}])
 
         if result:
             data = result.fetchone()
@@ -465,15 +733,18 @@ class SQL:
 
         logging.debug(f'Retrieving status for movies {idvals}.')
 
-        command = ['SELECT {}, status FROM MOVIES WHERE {} IN ({})'.format(idcol, idcol, ', '.join(map(str, idvals)))]
+        MOVIES = self.MOVIES
+        stmt = sqlquery.cached(('movies_status', idcol), lambda: sqla.select(MOVIES.c[idcol], MOVIES.c.status).where(values_in(MOVIES.c[idcol])))
 
-        result = self.execute(command)
+        movies = []
+        for chunk in chunks(idvals):
+            result = self.execute([stmt, {'values': [str(i) for i in chunk]}])
+            if not result:
+                logging.error('Unable to get status of requested movies.')
+                return []
+            movies += proxy_to_dict(result)
 
-        if result:
-            return proxy_to_dict(result)
-        else:
-            logging.error('Unable to get status of requested movies.')
-            return []
+        return movies
 
     def get_search_results(self, imdbid, quality=None, rejected=False):
         ''' Gets all search results for a given movie
@@ -495,29 +766,105 @@ class SQL:
         else:
             sort = 'DESC'
 
-        if core.CONFIG['Search']['preferredsource'] == '':
-            sk = ''
-        else:
-            sk = ''', CASE type WHEN "nzb" THEN 0
-                                WHEN "torrent" THEN 1
-                                WHEN "magnet" THEN 1
-                    END {}
-                '''.format('ASC' if core.CONFIG['Search']['preferredsource'] == 'usenet' else 'DESC')
-
-        if not rejected:
-            rejected_cond = 'AND reject_reason IS NULL'
-        else:
-            rejected_cond = ''
+        source = core.CONFIG['Search']['preferredsource']
+
+        def build():
+            SEARCHRESULTS = self.SEARCHRESULTS
+            stmt = sqla.select(SEARCHRESULTS).where(matches(SEARCHRESULTS, ['imdbid']))
+            if not rejected:
+                stmt = stmt.where(SEARCHRESULTS.c.reject_reason.is_(None))
+
+            stmt = stmt.order_by(SEARCHRESULTS.c.score.desc())
+            if source != '':
+                kind = sqla.case({'nzb': 0, 'torrent': 1, 'magnet': 1}, value=SEARCHRESULTS.c.type)
+                stmt = stmt.order_by(kind.asc() if source == 'usenet' else kind.desc())
+            size = SEARCHRESULTS.c.size
+            return stmt.order_by(size.asc() if sort == 'ASC' else size.desc(), SEARCHRESULTS.c.freeleech.desc())
 
-        command = [f'SELECT * FROM SEARCHRESULTS WHERE imdbid="{imdbid}" {rejected_cond} ORDER BY score DESC {sk}, size {sort}, freeleech DESC']
+        stmt = sqlquery.cached(('search_results', rejected, sort, source == 'usenet' if source else None), build)
 
-        results = self.execute(command)
+        results = self.execute([stmt, {'imdbid': imdbid}])
 
         if results:
             return proxy_to_dict(results.fetchall())
         else:
             return []
 
+    def get_search_result_guids(self, imdbids):
+        ''' Gets guids of all stored search results for several movies
+        imdbids (list): imdb id #s
+
+        Includes rejected results.
+
+        Returns dict {imdbid: set(guids)}
+        '''
+
+        logging.debug(f'Retrieving Search Result guids for {len(imdbids)} movies.')
+
+        SEARCHRESULTS = self.SEARCHRESULTS
+        stmt = sqlquery.cached(('search_result_guids',), lambda: sqla.select(SEARCHRESULTS.c.imdbid, SEARCHRESULTS.c.guid).where(values_in(SEARCHRESULTS.c.imdbid)))
+
+        guids = {}
+        for chunk in chunks(imdbids):
+            result = self.execute([stmt, {'values': chunk}])
+            if not result:
+                continue
+            for imdbid, guid in result.fetchall():
+                guids.setdefault(imdbid, set()).add(guid)
+
+        return guids
+
+    def get_search_result_statuses(self, imdbids, types):
+        ''' Gets distinct statuses of search results for several movies
+        imdbids (list): imdb id #s
+        types (list): result types to include, ie ['nzb', 'torrent']
+
+        Ignores rejected results that are still Available.
+
+        Returns dict {imdbid: set(statuses)}, or None if unable to read database
+        '''
+
+        logging.debug(f'Retrieving Search Result statuses for {len(imdbids)} movies.')
+
+        def build():
+            SEARCHRESULTS = self.SEARCHRESULTS
+            return sqla.select(SEARCHRESULTS.c.imdbid, SEARCHRESULTS.c.status).distinct().where(
+                values_in(SEARCHRESULTS.c.imdbid),
+                sqla.or_(SEARCHRESULTS.c.reject_reason.is_(None), SEARCHRESULTS.c.status != 'Available'),
+                SEARCHRESULTS.c.type.in_(sqla.bindparam('types', expanding=True))
+            )
+
+        stmt = sqlquery.cached(('search_result_statuses',), build)
+
+        statuses = {}
+        for chunk in chunks(imdbids):
+            result = self.execute([stmt, {'values': chunk, 'types': list(types)}])
+            if result is None:
+                return None
+            for imdbid, status in result.fetchall():
+                statuses.setdefault(imdbid, set()).add(status)
+
+        return statuses
+
+    def get_movies(self, imdbids):
+        ''' Gets details for several movies from MOVIES
+        imdbids (list): imdb id #s
+
+        Returns list of dicts
+        '''
+
+        logging.debug(f'Retrieving details for {len(imdbids)} movies.')
+
+        stmt = sqlquery.cached(('movies',), lambda: sqla.select(self.MOVIES).where(values_in(self.MOVIES.c.imdbid)))
+
+        movies = []
+        for chunk in chunks(imdbids):
+            result = self.execute([stmt, {'values': chunk}])
+            if result:
+                movies += proxy_to_dict(result)
+
+        return movies
+
     def get_marked_results(self, imdbid):
         ''' Gets all entries in MARKEDRESULTS for given movie
         imdbid (str): imdb id #
@@ -527,13 +874,13 @@ class SQL:
 
         logging.debug(f'Retrieving Marked Results for {imdbid}.')
 
-        TABLE = 'MARKEDRESULTS'
+        MARKEDRESULTS = self.MARKEDRESULTS
 
         results = {}
 
-        command = [f'SELECT * FROM {TABLE} WHERE imdbid="{imdbid}"']
+        stmt = sqlquery.cached(('marked_results',), lambda: sqla.select(MARKEDRESULTS).where(matches(MARKEDRESULTS, ['imdbid'])))
 
-        data = self.execute(command)
+        data = self.execute([stmt, {'imdbid': imdbid}])
 
         if data:
             for i in data.fetchall():
@@ -599,7 +946,7 @@ class SQL:
 
         if imdbid:
             logging.debug(f'Purging search results for {imdbid}')
-            command = [f'DELETE FROM SEARCHRESULTS WHERE imdbid="{imdbid}"']
+            command = [f'DELETE FROM SEARCHRESULTS WHERE imdbid="{imdbid}" COLLATE NOCASE']
         else:
             logging.debug('Purging search results for all movies.')
             command = ['DELETE FROM SEARCHRESULTS']
@@ -625,9 +972,10 @@ class SQL:
 
         logging.debug('Getting distinct values for {} in {}'.format(idval.split('&')[0], TABLE))
 
-        command = [f'SELECT DISTINCT {column} FROM {TABLE} WHERE {idcol}="{idval}"']
+        table = getattr(self, TABLE)
+        stmt = sqlquery.cached(('distinct', TABLE, column, idcol), lambda: sqla.select(table.c[column]).distinct().where(matches(table, [idcol])))
 
-        data = self.execute(command)
+        data = self.execute([stmt, {idcol: idval}])
 
         if data:
             data = data.fetchall()
@@ -652,13 +1000,14 @@ class SQL:
         Returns Bool
         '''
 
-        matches = [f'{k}="{v}"' for k, v in cols.items()]
+        names = tuple(sorted(cols))
 
-        logging.debug('Checking if {} exists in database table {}'.format(','.join(matches), TABLE))
+        logging.debug('Checking if {} exists in database table {}'.format(','.join(f'{k}="{cols[k]}"' for k in names), TABLE))
 
-        command = ['SELECT 1 FROM {} WHERE {} COLLATE NOCASE'.format(TABLE, ' AND '.join(matches))]
+        table = getattr(self, TABLE)
+        stmt = sqlquery.cached(('row_exists', TABLE, names), lambda: sqla.select(sqla.literal_column('1')).select_from(table).where(matches(table, names)).limit(1))
 
-        row = self.execute(command)
+        row = self.execute([stmt, {k: str(v) for k, v in cols.items()}])
 
         if not row or row.fetchone() is None:
             return False
@@ -670,8 +1019,8 @@ class SQL:
             self.write('POSTPROCESSED_PATHS', {'path': path})
 
     def get_postprocessed_paths(self):
-        sql = 'SELECT path FROM {}'.format('POSTPROCESSED_PATHS')
-        result = self.execute([sql])
+        stmt = sqlquery.cached(('postprocessed_paths',), lambda: sqla.select(self.POSTPROCESSED_PATHS.c.path))
+        result = self.execute([stmt])
         if result:
             return [row[0] for row in result.fetchall()]
         else:
@@ -688,8 +1037,16 @@ class SQL:
     def get_download_progress(self, client):
         results = {}
 
-        sql = 'SELECT DISTINCT downloadid, download_progress, download_time FROM SEARCHRESULTS WHERE status = ? AND downloadid IS NOT NULL AND download_client = ?'
-        data = self.execute([sql, 'Snatched', client])
+        def build():
+            SEARCHRESULTS = self.SEARCHRESULTS
+            return sqla.select(SEARCHRESULTS.c.downloadid, SEARCHRESULTS.c.download_progress, SEARCHRESULTS.c.download_time).distinct().where(
+                SEARCHRESULTS.c.status == sqla.bindparam('status'),
+                SEARCHRESULTS.c.downloadid.isnot(None),
+                SEARCHRESULTS.c.download_client == sqla.bindparam('client')
+            )
+
+        stmt = sqlquery.cached(('download_progress',), build)
+        data = self.execute([stmt, {'status': 'Snatched', 'client': client}])
         if data:
             for i in data.fetchall():
                 results[i['downloadid']] = {'progress': i['download_progress'], 'time': i['download_time']}
@@ -708,10 +1065,15 @@ class SQL:
 
         logging.debug('Retrieving search result details for {}.'.format(idval.split('&')[0]))
 
-        operator = 'LIKE' if like else '='
-        command = [f'SELECT * FROM SEARCHRESULTS WHERE {idcol} {operator} "{idval}" COLLATE NOCASE ORDER BY score DESC, size DESC']
+        def build():
+            SEARCHRESULTS = self.SEARCHRESULTS
+            column = nocase(SEARCHRESULTS.c[idcol])
+            condition = column.like(sqla.bindparam('idval')) if like else column == sqla.bindparam('idval')
+            return sqla.select(SEARCHRESULTS).where(condition).order_by(SEARCHRESULTS.c.score.desc(), SEARCHRESULTS.c.size.desc())
 
-        result = self.execute(command)
+        stmt = sqlquery.cached(('single_search_result', idcol, like), build)
+
+        result = self.execute([stmt, {'idval': idval}])
 
         if result:
             if all_indexers:
@@ -845,8 +1207,30 @@ class SQL:
             logging.debug(f'Finished updating table {table}.')
             print(f'Finished updating table {table}')
 
+            # Indexes are dropped along with TABLE_TMP
+            self.create_indexes(tables=[table])
+
             return True
 
+    def create_indexes(self, tables=None):
+        ''' Creates indexes listed in SQL.indexes
+        tables (list): names of tables to create indexes for       <optional - default all tables>
+
+        Indexes that already exist are left alone. Unique indexes will fail to
+            create if the table holds duplicates, see DatabaseUpdate.update_17.
+
+        Database updates must pass the tables they created or changed, tables
+            added by later updates don't exist yet.
+
+        Does not return
+        '''
+        for name, table, columns, unique in SQL.indexes:
+            if tables is not None and table not in tables:
+                continue
+            logging.debug(f'Creating index {name} on {table}.')
+            u = 'UNIQUE ' if unique else ''
+            self.execute([f'CREATE {u}INDEX IF NOT EXISTS {name} ON {table} ({columns})'])
+
     def torznab_caps(self, url):
         ''' Gets caps list for torznab providers
         url (str): url of torznab indexer
@@ -856,10 +1240,11 @@ class SQL:
 
         logging.debug(f'Retreiving caps for {url}')
 
-        command = [f'SELECT "caps" FROM CAPS WHERE url="{url}"']
+        CAPS = self.CAPS
+        stmt = sqlquery.cached(('torznab_caps',), lambda: sqla.select(CAPS.c.caps).where(CAPS.c.url == sqla.bindparam('url')))
 
-        row = self.execute(command)
-        caps = row.fetchone()
+        row = self.execute([stmt, {'url': url}])
+        caps = row.fetchone() if row else None
         if caps is None:
             return []
         else:
@@ -898,6 +1283,8 @@ class SQL:
                 os.mkdir(backup_dir)
             backup_name = f'{core.DB_FILE}.backup-{datetime.date.today()}'
 
+            self.checkpoint()
+
             shutil.copyfile(core.DB_FILE, os.path.join(backup_dir, backup_name))
         except Exception as e:
             print('Error backing up database.')
@@ -930,15 +1317,154 @@ class SQL:
         Returns str
         '''
 
-        cmd = f'SELECT data FROM SYSTEM WHERE name="{name}"'
+        SYSTEM = self.SYSTEM
+        stmt = sqlquery.cached(('system',), lambda: sqla.select(SYSTEM.c.data).where(SYSTEM.c.name == sqla.bindparam('name')))
 
-        result = self.execute([cmd])
+        result = self.execute([stmt, {'name': name}])
 
-        if result:
-            return result.fetchone()[0]
+        row = result.fetchone() if result else None
+        if row:
+            return row[0]
+        else:
+            return None
+
+    def get_tmdb_cache(self, request):
+        ''' Gets cached TMDB response
+        request (str): normalized request, see core.tmdbcache.request_key()
+
+        Returns dict of TMDBCACHE row, or None if not cached
+        '''
+
+        TMDBCACHE = self.TMDBCACHE
+        stmt = sqlquery.cached(('tmdb_cache',), lambda: sqla.select(TMDBCACHE).where(TMDBCACHE.c.request == sqla.bindparam('request')))
+
+        result = self.execute([stmt, {'request': request}])
+
+        row = result.fetchone() if result else None
+        if row:
+            return dict(zip(row._fields, row))
         else:
             return None
 
+    def write_tmdb_cache(self, row):
+        ''' Writes TMDB response to cache, replacing any existing row
+        row (dict): TMDBCACHE row
+
+        Returns bool
+        '''
+
+        stmt = sqlquery.cached(('tmdb_cache_write',), lambda: self.TMDBCACHE.insert().prefix_with('OR REPLACE'))
+
+        if self.execute([stmt, row]):
+            return True
+        else:
+            logging.error('Unable to write TMDB cache.')
+            return False
+
+    def touch_tmdb_cache(self, request, fetched):
+        ''' Marks cached TMDB response as fresh
+        request (str): normalized request
+        fetched (float): epoch time response was last confirmed by TMDB
+
+        Returns bool
+        '''
+
+        TMDBCACHE = self.TMDBCACHE
+        stmt = sqlquery.cached(('tmdb_cache_touch',), lambda: TMDBCACHE.update().where(TMDBCACHE.c.request == sqla.bindparam('request_')).values(fetched=sqla.bindparam('fetched')))
+
+        if self.execute([stmt, {'request_': request, 'fetched': fetched}]):
+            return True
+        else:
+            logging.error('Unable to update TMDB cache.')
+            return False
+
+    def trim_tmdb_cache(self, max_rows):
+        ''' Removes oldest cached TMDB responses
+        max_rows (int): number of rows to keep
+
+        Returns bool
+        '''
+
+        logging.debug(f'Trimming TMDB cache to {max_rows} responses.')
+
+        command = ['DELETE FROM TMDBCACHE WHERE rowid IN (SELECT rowid FROM TMDBCACHE ORDER BY fetched DESC LIMIT -1 OFFSET ?)', (max_rows,)]
+
+        if self.execute(command):
+            return True
+        else:
+            logging.error('Unable to trim TMDB cache.')
+            return False
+
+    def tmdb_cache_size(self):
+        ''' Gets number of cached TMDB responses and their size
+
+        Returns tuple (int rows, int bytes)
+        '''
+
+        result = self.execute(['SELECT COUNT(*), TOTAL(LENGTH(data)) FROM TMDBCACHE'])
+
+        row = result.fetchone() if result else None
+        if row:
+            return row[0], int(row[1])
+        else:
+            return 0, 0
+
+    def get_file_index(self, directory):
+        ''' Gets indexed files and directories
+        directory (str): absolute path to directory
+
+        Returns list of dicts of FILEINDEX rows of directory and everything under it
+        '''
+
+        prefix = os.path.join(directory, '')
+
+        result = self.execute(['SELECT * FROM FILEINDEX WHERE path = ? OR substr(path, 1, ?) = ?', (directory, len(prefix), prefix)])
+
+        return proxy_to_dict(result) if result else []
+
+    def update_file_index(self, directory, entries):
+        ''' Replaces indexed contents of directory
+        directory (dict): FILEINDEX row of listed directory
+        entries (list): dicts of FILEINDEX rows of everything in directory
+
+        Rows of subdirectories are only added if they aren't indexed yet, they
+            are updated when the subdirectory itself is listed. Anything that is
+            no longer in directory is removed, with everything under it.
+
+        Returns bool
+        '''
+
+        logging.debug('Updating file index of {}.'.format(directory['path']))
+
+        FILEINDEX = self.FILEINDEX
+        replace = sqlquery.cached(('file_index_replace',), lambda: FILEINDEX.insert().prefix_with('OR REPLACE'))
+        ignore = sqlquery.cached(('file_index_ignore',), lambda: FILEINDEX.insert().prefix_with('OR IGNORE'))
+
+        current = {i['path']: i['is_dir'] for i in entries}
+
+        commands = [[replace, [directory] + [i for i in entries if not i['is_dir']]]]
+        dirs = [i for i in entries if i['is_dir']]
+        if dirs:
+            commands.append([ignore, dirs])
+
+        with self.transaction():
+            result = self.execute(['SELECT path, is_dir FROM FILEINDEX WHERE parent = ?', (directory['path'],)])
+            for path, is_dir in (result.fetchall() if result else []):
+                if current.get(path) == is_dir:
+                    continue
+                commands.insert(0, ['DELETE FROM FILEINDEX WHERE path = ?', (path,)])
+                if is_dir:
+                    prefix = os.path.join(path, '')
+                    commands.insert(0, ['DELETE FROM FILEINDEX WHERE substr(path, 1, ?) = ?', (len(prefix), prefix)])
+
+            success = result is not None and all([self.execute(i) is not None for i in commands])
+
+        if success:
+            return True
+        else:
+            logging.error('Unable to update file index.')
+            return False
+
     def quick_titles(self):
         ''' Gets titles and ids from library
 
@@ -949,9 +1475,10 @@ class SQL:
 
         logging.debug('Retrieving random movie id')
 
-        command = ['SELECT title, tmdbid, imdbid FROM MOVIES ORDER BY sort_title']
+        MOVIES = self.MOVIES
+        stmt = sqlquery.cached(('quick_titles',), lambda: sqla.select(MOVIES.c.title, MOVIES.c.tmdbid, MOVIES.c.imdbid).order_by(MOVIES.c.sort_title))
 
-        result = self.execute(command)
+        result = self.execute([stmt])
 
         return [tuple(i) for i in result.fetchall()] if result else []
 
@@ -1148,4 +1675,29 @@ class DatabaseUpdate:
         ''' Add reject_reason column to SEARCHRESULTS '''
         core.sql.update_tables()
 
+    @staticmethod
+    def update_17():
+        ''' Add indexes to MOVIES, SEARCHRESULTS, and MARKEDRESULTS
+
+        Removes duplicate MOVIES and MARKEDRESULTS rows first so the unique
+            indexes can be created. The first row written is kept.
+        '''
+        for table, column in (('MOVIES', 'imdbid'), ('MARKEDRESULTS', 'guid')):
+            print(f'Removing duplicate rows from {table}')
+            core.sql.execute([f'DELETE FROM {table} WHERE {column} IS NOT NULL AND rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY {column} COLLATE NOCASE)'])
+
+        print('Creating indexes')
+        core.sql.create_indexes(tables=['MOVIES', 'SEARCHRESULTS', 'MARKEDRESULTS'])
+
+    @staticmethod
+    def update_18():
+        ''' Add table TMDBCACHE '''
+        core.sql.update_tables()
+
+    @staticmethod
+    def update_19():
+        ''' Add table FILEINDEX '''
+        core.sql.update_tables()
+        core.sql.create_indexes(tables=['FILEINDEX'])
+
     # Adding a new method? Remember to update the current_version #
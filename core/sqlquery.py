@@ -0,0 +1,100 @@
+import logging
+import threading
+
+import sqlalchemy as sqla
+
+logging = logging.getLogger(__name__)
+
+# Statement builders for core.sqldb
+#
+# Statements are built once from sqlalchemy Core constructs with bound parameters
+# and kept in _statements. Since the same statement object is reused, both
+# sqlalchemy's compiled cache and sqlite's prepared statement cache hit on every
+# call after the first. Values are always passed as parameters, never formatted
+# into the statement.
+
+# Keep below SQLITE_MAX_VARIABLE_NUMBER (999 on older sqlite builds)
+max_in = 500
+
+_statements = {}
+_lock = threading.Lock()
+
+
+def cached(key, build):
+    ''' Gets statement from cache, building it if necessary
+    key (tuple): hashable key describing the statement's shape
+    build (func): callable that returns a new sqla statement
+
+    key must include everything that changes the SQL text (column names,
+        sort direction, etc), but none of the values passed as parameters.
+
+    Returns object sqla statement
+    '''
+    stmt = _statements.get(key)
+    if stmt is None:
+        with _lock:
+            stmt = _statements.get(key)
+            if stmt is None:
+                logging.debug(f'Building SQL statement {key}.')
+                stmt = build()
+                _statements[key] = stmt
+    return stmt
+
+
+def clear():
+    ''' Empties statement cache
+
+    Does not return
+    '''
+    with _lock:
+        _statements.clear()
+
+
+def nocase(column):
+    ''' Applies NOCASE collation to column
+    column (object): sqla Column
+
+    Identifiers are indexed with COLLATE NOCASE, so comparisons must use it
+        as well for sqlite to use the index.
+
+    Returns object sqla ColumnElement
+    '''
+    return sqla.collate(column, 'NOCASE')
+
+
+def matches(table, columns):
+    ''' Builds case-insensitive equality conditions for columns
+    table (object): sqla Table
+    columns (iterable): names of columns to match
+
+    Each column is compared to a bound parameter of the same name.
+
+    Returns object sqla BooleanClauseList
+    '''
+    return sqla.and_(*[nocase(table.c[c]) == sqla.bindparam(c) for c in columns])
+
+
+def values_in(column, name='values'):
+    ''' Builds case-insensitive IN condition for column
+    column (object): sqla Column
+    name (str): name of expanding bound parameter     <optional - default 'values'>
+
+    Pass values in chunks no longer than max_in, see chunks().
+
+    Returns object sqla BinaryExpression
+    '''
+    return nocase(column).in_(sqla.bindparam(name, expanding=True))
+
+
+def chunks(values, size=max_in):
+    ''' Splits values into chunks
+    values (list): values to split
+    size (int): max length of each chunk     <optional - default max_in>
+
+    Used to keep IN (...) lists below SQLite's bound parameter limit.
+
+    Yields list
+    '''
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
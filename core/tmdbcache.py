@@ -0,0 +1,141 @@
+import collections
+import logging
+import threading
+import time
+import zlib
+
+import core
+from core.helpers import Url
+
+logging = logging.getLogger(__name__)
+
+# Cache of TheMovieDatabase api responses, stored in TMDBCACHE
+#
+# Responses are kept compressed and keyed by their url without the api key.
+# Fresh responses are returned without contacting TMDB. Stale responses are
+# revalidated with ETag / Last-Modified, so unchanged data is not downloaded
+# again, and are used as a fallback if TMDB can't be reached.
+
+# Seconds responses are considered fresh, by endpoint
+ttls = {'search': 60 * 60 * 24,
+        'find': 60 * 60 * 24 * 7,
+        'movie': 60 * 60 * 24 * 3,
+        'similar': 60 * 60 * 24 * 7,
+        'category': 60 * 60 * 6
+        }
+
+max_rows = 5000
+_trim_every = 50
+
+Response = collections.namedtuple('Response', ['status_code', 'text'])
+
+_stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stale': 0}
+_writes = 0
+_lock = threading.Lock()
+
+
+def request_key(url):
+    ''' Normalizes TMDB url to use as cache key
+    url (str): TMDB api url
+
+    Removes api key and sorts query parameters.
+
+    Returns str
+    '''
+    path, _, query = url.partition('?')
+    params = sorted(i for i in query.split('&') if i and not i.startswith('api_key='))
+    return '{}?{}'.format(path, '&'.join(params))
+
+
+def get(url, endpoint):
+    ''' Gets TMDB api response, from cache if possible
+    url (str): TMDB api url, including api key
+    endpoint (str): type of request, key of ttls
+
+    Only successful responses are cached. If TMDB can't be reached or returns
+        a server error, a stale cached response is returned if there is one.
+
+    Returns object Response
+    '''
+    request = request_key(url)
+    now = time.time()
+
+    cached = core.sql.get_tmdb_cache(request)
+    if cached and now - (cached['fetched'] or 0) < ttls[endpoint]:
+        logging.debug(f'Using cached TMDB response for {request}')
+        _count('hits')
+        return Response(200, _decompress(cached['data']))
+
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        response = Url.open(url, headers=headers)
+    except (SystemExit, KeyboardInterrupt):
+        raise
+    except Exception:
+        if not cached:
+            raise
+        logging.warning(f'Unable to reach TMDB, using stale response for {request}', exc_info=True)
+        _count('stale')
+        return Response(200, _decompress(cached['data']))
+
+    if response.status_code == 304 and cached:
+        logging.debug(f'Cached TMDB response for {request} is unchanged.')
+        _count('revalidated')
+        core.sql.touch_tmdb_cache(request, now)
+        return Response(200, _decompress(cached['data']))
+
+    if response.status_code != 200:
+        if cached and (response.status_code >= 500 or response.status_code == 429):
+            logging.warning(f'TMDB returned {response.status_code}, using stale response for {request}')
+            _count('stale')
+            return Response(200, _decompress(cached['data']))
+        return Response(response.status_code, response.text)
+
+    _count('misses')
+    core.sql.write_tmdb_cache({'request': request,
+                               'endpoint': endpoint,
+                               'data': zlib.compress(response.content),
+                               'etag': response.headers.get('ETag'),
+                               'last_modified': response.headers.get('Last-Modified'),
+                               'fetched': now
+                               })
+    _trim()
+    return Response(200, response.text)
+
+
+def stats():
+    ''' Gets cache statistics
+
+    Counts are since start, rows and size are of the whole table.
+
+    Returns dict {'hits': int, 'revalidated': int, 'misses': int, 'stale': int, 'rows': int, 'size': int}
+    '''
+    with _lock:
+        s = dict(_stats)
+    s['rows'], s['size'] = core.sql.tmdb_cache_size()
+    return s
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _trim():
+    ''' Trims cache to max_rows every _trim_every writes '''
+    global _writes
+    with _lock:
+        _writes += 1
+        if _writes % _trim_every:
+            return
+    core.sql.trim_tmdb_cache(max_rows)
+
+
+def _decompress(data):
+    return zlib.decompress(data).decode('utf-8')
@@ -13,3 +13,7 @@ ptn = PTN()
 
 def parse(name):
     return ptn.parse(name)
+
+
+def parse_many(names):
+    return ptn.parse_many(names)
@@ -1,22 +1,67 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import copy
 import re
 from .patterns import patterns, types
 
 
-class PTN(object):
-    def _escape_regex(self, string):
-        return re.sub('[\-\[\]{}()*+?.,\\\^$|#\s]', '\\$&', string)
-
-    def __init__(self):
-        self.torrent = None
-        self.excess_raw = None
-        self.group_raw = None
-        self.start = None
+def _compile(key, pattern):
+    if key not in ('season', 'episode', 'website'):
+        pattern = r'\b%s\b' % pattern
+    return re.compile(pattern, re.I)
+
+
+# Patterns are compiled once on import, parse state lives in _Parser so
+# a single PTN instance can be shared between threads.
+_compiled = [(key, _compile(key, pattern)) for key, pattern in patterns]
+_booleans = frozenset(k for k, v in types.items() if v == 'boolean')
+_integers = frozenset(k for k, v in types.items() if v == 'integer')
+
+# Lowercase text that must be in the name for the pattern to match at all.
+# Only used on ascii names, where lower() agrees with re.I.
+_literals = {
+    'codec': ('xvid', '26', 'hevc'),
+    'audio': ('mp3', 'dd5', 'dual', 'line', 'dts', 'aac', 'ac3'),
+    'extended': ('extended',),
+    'hardcoded': ('hc',),
+    'proper': ('proper',),
+    'repack': ('repack',),
+    'container': ('mkv', 'avi', 'mp4'),
+    'widescreen': ('ws',),
+    'language': ('fr', 'en', 'vost', 'multi'),
+    'sbs': ('sbs',),
+    'unrated': ('unrated',),
+    'size': ('gb', 'mb'),
+    '3d': ('3d',),
+    'edition': ('anniversary', 'edition', 'cut', 'version', 'remastered', 'uncensored', 'unrated')
+}
+
+_codec = re.compile(dict(patterns)['codec'], re.I)
+_quality = re.compile(dict(patterns)['quality'])
+_escape = re.compile(r'[\-\[\]{}()*+?.,\\^$|#\s]')
+_episode_name = re.compile('[^ ]+ [^ ]+ .+')
+_dot = re.compile(r'\.')
+_dot_underscore = re.compile(r'[\._]')
+_trailing_underscore = re.compile('_+$')
+_title_start = re.compile('^ -')
+_title_end = re.compile(r'([\[\(_]|- )$')
+_excess_ends = re.compile(r'(^[-\. ()]+)|([-\. ]+$)')
+_excess_brackets = re.compile(r'[\(\)\/]')
+_excess_split = re.compile(r'\.\.+| +')
+
+
+class _Parser(object):
+    ''' State for parsing a single name '''
+
+    def __init__(self, name):
+        self.parts = {}
+        self.torrent = {'name': name}
+        self.excess_raw = name
+        self.group_raw = ''
+        self.start = 0
         self.end = None
         self.title_raw = None
-        self.parts = None
 
     def _part(self, name, match, raw, clean):
         # The main core instructuions
@@ -41,25 +86,19 @@ class PTN(object):
         if name == 'group':
             self._part(name, [], None, clean)
         elif name == 'episodeName':
-            clean = re.sub('[\._]', ' ', clean)
-            clean = re.sub('_+$', '', clean)
+            clean = _dot_underscore.sub(' ', clean)
+            clean = _trailing_underscore.sub('', clean)
             self._part(name, [], None, clean.strip())
 
-    def parse(self, name):
-        self.parts = {}
-        self.torrent = {'name': name}
-        self.excess_raw = name
-        self.group_raw = ''
-        self.start = 0
-        self.end = None
-        self.title_raw = None
-
-        for key, pattern in patterns:
-            if key not in ('season', 'episode', 'website'):
-                pattern = r'\b%s\b' % pattern
+    def parse(self):
+        clean_name = self.torrent['name'].replace('_', ' ')
+        lower_name = clean_name.lower() if clean_name.isascii() else None
 
-            clean_name = re.sub('_', ' ', self.torrent['name'])
-            match = re.findall(pattern, clean_name, re.I)
+        for key, pattern in _compiled:
+            if lower_name is not None and key in _literals and \
+                    not any(i in lower_name for i in _literals[key]):
+                continue
+            match = pattern.findall(clean_name)
             if len(match) == 0:
                 continue
 
@@ -73,23 +112,22 @@ class PTN(object):
                 index['raw'] = 0
                 index['clean'] = 0
 
-            if key in types.keys() and types[key] == 'boolean':
+            if key in _booleans:
                 clean = True
             else:
                 clean = match[index['clean']]
-                if key in types.keys() and types[key] == 'integer':
+                if key in _integers:
                     clean = int(clean)
 
             if key == 'edition':
-                clean = [re.sub('\.', ' ', i)for i in match]
+                clean = [_dot.sub(' ', i) for i in match]
             if key == 'group':
-                if re.search(patterns[5][1], clean, re.I) \
-                        or re.search(patterns[4][1], clean):
+                if _codec.search(clean) or _quality.search(clean):
                     continue  # Codec and quality.
-                if re.match('[^ ]+ [^ ]+ .+', clean):
+                if _episode_name.match(clean):
                     key = 'episodeName'
             if key == 'episode':
-                sub_pattern = self._escape_regex(match[index['raw']])
+                sub_pattern = _escape.sub('\\$&', match[index['raw']])
                 self.torrent['map'] = re.sub(
                     sub_pattern, '{episode}', self.torrent['name']
                 )
@@ -100,18 +138,18 @@ class PTN(object):
         if self.end is not None:
             raw = raw[self.start:self.end].split('(')[0]
 
-        clean = re.sub('^ -', '', raw)
+        clean = _title_start.sub('', raw)
         if clean.find(' ') == -1 and clean.find('.') != -1:
-            clean = re.sub('\.', ' ', clean)
-        clean = re.sub('_', ' ', clean)
-        clean = re.sub('([\[\(_]|- )$', '', clean).strip()
+            clean = _dot.sub(' ', clean)
+        clean = clean.replace('_', ' ')
+        clean = _title_end.sub('', clean).strip()
 
         self._part('title', [], raw, clean)
 
         # Start process for end
-        clean = re.sub('(^[-\. ()]+)|([-\. ]+$)', '', self.excess_raw)
-        clean = re.sub('[\(\)\/]', ' ', clean)
-        match = re.split('\.\.+| +', clean)
+        clean = _excess_ends.sub('', self.excess_raw)
+        clean = _excess_brackets.sub(' ', clean)
+        match = _excess_split.split(clean)
         if len(match) > 0 and isinstance(match[0], tuple):
             match = list(match[0])
 
@@ -128,7 +166,7 @@ class PTN(object):
             if 'map' in self.torrent.keys() and len(clean) != 0:
                 episode_name_pattern = (
                     '{episode}'
-                    '' + re.sub('_+$', '', clean[0])
+                    '' + _trailing_underscore.sub('', clean[0])
                 )
                 if self.torrent['map'].find(episode_name_pattern) != -1:
                     self._late('episodeName', clean.pop(0))
@@ -138,3 +176,33 @@ class PTN(object):
                 clean = clean[0]
             self._part('excess', [], self.excess_raw, clean)
         return self.parts
+
+
+class PTN(object):
+    ''' Parses torrent names
+
+    Instances hold no parse state and are safe to share between threads.
+    '''
+
+    def _escape_regex(self, string):
+        return _escape.sub('\\$&', string)
+
+    def parse(self, name):
+        return _Parser(name).parse()
+
+    def parse_many(self, names):
+        ''' Parses a batch of names
+
+        Each distinct name is parsed once, duplicates get their own copy.
+
+        Returns list of dicts in the same order as names
+        '''
+        parsed = {}
+        results = []
+        for name in names:
+            if name in parsed:
+                results.append(copy.deepcopy(parsed[name]))
+            else:
+                parsed[name] = self.parse(name)
+                results.append(parsed[name])
+        return results
@@ -370,6 +370,7 @@ function _render_library(movies){
         if(!movie["poster"]){
             movie["poster"] = "missing_poster.jpg";
         }
+        movie["poster_version"] = movie["poster_version"] || 0;
 
         movie["status_translated"] = _(movie["status"]);
         $item = format_template(template, movie);
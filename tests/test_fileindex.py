@@ -0,0 +1,143 @@
+import unittest
+from unittest import mock
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+from core import fileindex, sqldb
+
+
+def on_disk(directory):
+    ''' Lists files under directory with os.walk '''
+    return sorted(os.path.join(root, name) for root, dirs, names in os.walk(directory) for name in names)
+
+
+class TestFileIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dbdir = tempfile.mkdtemp()
+        core.DB_FILE = os.path.join(cls.dbdir, 'watcher.sqlite')
+        core.sql = sqldb.SQL()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dbdir)
+
+    def setUp(self):
+        core.sql.execute(['DELETE FROM FILEINDEX'])
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ['a.mkv', 'Movie (2010)/movie.mkv', 'Movie (2010)/Extras/trailer.mkv',
+                     'Other (2015)/other.mp4', 'Other (2015)/other.nfo', 'Empty/']:
+            self.write(name)
+
+    def write(self, name, size=10, age=3600):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not name.endswith('/'):
+            with open(path, 'wb') as f:
+                f.write(bytes(size))
+            os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def scan(self, **kwargs):
+        return sorted((i.path, i.size) for i in fileindex.scan(self.root, **kwargs))
+
+    def walked(self):
+        return sorted((i, os.path.getsize(i)) for i in on_disk(self.root))
+
+    def test_walk(self):
+        entries = list(fileindex.walk(self.root))
+        self.assertEqual(sorted(i.path for i in entries if not i.is_dir), on_disk(self.root))
+        # directories come before their contents
+        seen = set()
+        for i in entries:
+            self.assertIn(os.path.dirname(i.path), seen | {self.root})
+            seen.add(i.path)
+
+        top = {i.path for i in fileindex.walk(self.root, recursive=False)}
+        self.assertEqual(top, {os.path.join(self.root, i) for i in os.listdir(self.root)})
+
+    def test_walk_links(self):
+        os.symlink(self.root, os.path.join(self.root, 'Movie (2010)', 'loop'))
+        os.symlink(os.path.join(self.root, 'missing'), os.path.join(self.root, 'broken.mkv'))
+        paths = [i.path for i in fileindex.walk(self.root)]
+        self.assertEqual(len(paths), len(set(paths)))
+        self.assertNotIn(os.path.join(self.root, 'broken.mkv'), paths)
+
+    def test_scan(self):
+        self.assertEqual(self.scan(), self.walked())
+        self.assertEqual(self.scan(recursive=False), [(os.path.join(self.root, 'a.mkv'), 10)])
+
+        # unchanged directories are read from the index
+        with mock.patch.object(fileindex, '_list', side_effect=AssertionError):
+            self.assertEqual(self.scan(), self.walked())
+
+        self.write('Movie (2010)/Extras/featurette.mkv', 20)
+        self.write('New (2020)/new.mkv', 30)
+        os.remove(os.path.join(self.root, 'Other (2015)', 'other.nfo'))
+
+        listed = []
+        real = fileindex._list
+
+        def spy(directory):
+            listed.append(os.path.relpath(directory, self.root))
+            return real(directory)
+
+        with mock.patch.object(fileindex, '_list', side_effect=spy):
+            self.assertEqual(self.scan(), self.walked())
+        self.assertEqual(sorted(listed), ['.', 'Movie (2010)/Extras', 'New (2020)', 'Other (2015)'])
+
+    def test_scan_unsettled(self):
+        self.scan()
+        path = self.write('Copying (2021)/copying.mkv', 10, age=0)
+        self.assertEqual(self.scan(), self.walked())
+
+        # file grows in place without changing its directory's mtime
+        with open(path, 'ab') as f:
+            f.write(bytes(90))
+        self.assertIn((path, 100), self.scan())
+
+        os.utime(path, (time.time() - 3600, time.time() - 3600))
+        self.assertEqual(self.scan(), self.walked())
+        with mock.patch.object(fileindex, '_list', side_effect=AssertionError):
+            self.assertEqual(self.scan(), self.walked())
+
+    def test_scan_removed(self):
+        self.scan()
+        shutil.rmtree(os.path.join(self.root, 'Movie (2010)'))
+        os.rename(os.path.join(self.root, 'a.mkv'), os.path.join(self.root, 'Movie (2010)'))
+
+        self.assertEqual(self.scan(), self.walked())
+        rows = {i['path'] for i in core.sql.get_file_index(self.root)}
+        self.assertFalse([i for i in rows if i.startswith(os.path.join(self.root, 'Movie (2010)', ''))])
+
+        with mock.patch.object(fileindex, '_list', side_effect=AssertionError):
+            self.assertEqual(self.scan(), self.walked())
+
+    def test_scan_subdirectory(self):
+        movie = os.path.join(self.root, 'Movie (2010)')
+        self.assertEqual(sorted(i.path for i in fileindex.scan(movie)), on_disk(movie))
+        self.assertEqual(self.scan(), self.walked())
+        with mock.patch.object(fileindex, '_list', side_effect=AssertionError):
+            self.assertEqual(self.scan(), self.walked())
+
+    def test_existing(self):
+        paths = [os.path.join(self.root, i) for i in ('Other (2015)/other.mp4', 'Other (2015)/other.nfo', 'Other (2015)/gone.mkv', 'a.mkv', 'gone/b.mkv')]
+        self.assertEqual(fileindex.existing(paths), set(paths[0:2] + paths[3:4]))
+
+
+if __name__ == '__main__':
+    unittest.main()
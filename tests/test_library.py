@@ -0,0 +1,228 @@
+import unittest
+from unittest import mock
+
+import copy
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+core.POSTER_DIR = os.path.join(tempfile.gettempdir(), 'watcher_test_posters')
+from core import config, sqldb
+from core.library import Manage, Metadata
+from core.movieinfo import Poster, TheMovieDatabase
+
+names = ['The.Movie.2010.1080p.BluRay.x264-GRP/the.movie.mkv',
+         'Le Grand Film (2015)/Le.Grand.Film.2015.720p.WEB-DL.mp4',
+         'Extended.Cut.1999.DVDRip.XviD/cd1.avi',
+         'Movies/Some.Thing.2001.2160p.UHD.BluRay.x265.HDR-GRP.mkv',
+         'Movies/Unknown.mkv',
+         'Another.Movie.3D.2012.1080p.BluRay.Half-SBS.x264/movie.mkv']
+
+
+def search(title, single=False):
+    time.sleep(0.2)
+    if title.lower().startswith('unknown'):
+        return []
+    return [{'id': sum(map(ord, title))}]
+
+
+def search_tmdbid(tmdbid):
+    time.sleep(0.2)
+    return [{'id': tmdbid, 'imdbid': f'tt{tmdbid:07d}', 'release_date': '2010-05-01', 'title': f'Movie {tmdbid}'}]
+
+
+class TestMetadataFromFiles(unittest.TestCase):
+
+    def setUp(self):
+        with open(config.base_file) as f:
+            config.load(config=json.load(f))
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = []
+        for name in names:
+            path = os.path.join(self.tmpdir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'\x1aE\xdf\xa3' + bytes(4096))
+            self.paths.append(path)
+
+        patches = [mock.patch.object(TheMovieDatabase, 'search', staticmethod(search)),
+                   mock.patch.object(TheMovieDatabase, '_search_tmdbid', staticmethod(search_tmdbid)),
+                   mock.patch.object(Metadata, 'media_workers', 2),
+                   mock.patch.object(Metadata, 'media_min_files', 1)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_from_file(self):
+        results = list(Metadata.from_files(self.paths))
+
+        self.assertEqual(sorted(path for path, metadata in results), sorted(self.paths))
+        self.assertEqual(dict(results), {path: Metadata.from_file(path) for path in self.paths})
+        self.assertEqual(dict(results)[self.paths[0]]['imdbid'], search_tmdbid(search('The Movie 2010')[0]['id'])[0]['imdbid'])
+
+    def test_without_processes(self):
+        with mock.patch.object(Metadata, 'media_min_files', 50):
+            self.assertIsNone(Metadata._media_pool(len(self.paths)))
+
+            start = time.monotonic()
+            results = dict(Metadata.from_files(self.paths))
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(results, {path: Metadata.from_file(path) for path in self.paths})
+        # each file takes 0.2s or 0.4s on TMDB
+        self.assertLess(elapsed, 1.2)
+
+    def test_errors(self):
+        def broken(title, single=False):
+            if title.startswith('The Movie'):
+                raise ConnectionError('TMDB is down')
+            return search(title, single)
+
+        with mock.patch.object(TheMovieDatabase, 'search', staticmethod(broken)):
+            results = dict(Metadata.from_files(self.paths + [os.path.join(self.tmpdir, 'missing.mkv')]))
+
+        self.assertEqual(len(results), len(self.paths) + 1)
+        self.assertIsInstance(results[self.paths[0]], ConnectionError)
+        self.assertEqual(results[self.paths[4]]['title'], 'Unknown')
+        self.assertEqual(results[self.paths[1]], Metadata.from_file(self.paths[1]))
+
+    def test_close(self):
+        results = Metadata.from_files(self.paths * 10)
+        next(results)
+        start = time.monotonic()
+        results.close()
+        self.assertLess(time.monotonic() - start, 1)
+
+
+def load_config():
+    with open(config.base_file) as f:
+        conf = json.load(f)
+    conf['Quality']['Profiles'] = {'Default': dict(copy.deepcopy(config.base_profile), default=True)}
+    config.load(config=conf)
+
+
+def import_movies(count, start=0):
+    ''' Builds directory import style movies '''
+    return [{'id': i, 'tmdbid': i, 'imdbid': f'tt{i:07d}', 'title': f'The Movie {i}', 'year': '2010',
+             'release_date': '2010-05-01', 'overview': 'Plot.', 'vote_average': 7, 'poster_path': f'/{i}.jpg',
+             'resolution': 'BluRay-1080P', 'size': 4 * 1024**3, 'finished_file': f'/movies/The Movie {i}/movie.mkv',
+             'status': 'Disabled', 'predb': 'found', 'origin': 'Directory Import', 'finished_date': '2020-01-01'}
+            for i in range(start, start + count)]
+
+
+class TestAddMoviesBulk(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        core.DB_FILE = os.path.join(cls.tmpdir, 'watcher.sqlite')
+        core.sql = sqldb.SQL()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        load_config()
+        for table in ('MOVIES', 'SEARCHRESULTS'):
+            core.sql.execute([f'DELETE FROM {table}'])
+        self.posters = []
+        patch = mock.patch.object(Poster, 'queue', side_effect=lambda *args: self.posters.append(args))
+        patch.start()
+        self.addCleanup(patch.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def tables(self):
+        movies = sorted(core.sql.dump('MOVIES'), key=lambda i: i['imdbid'])
+        results = sorted(core.sql.dump('SEARCHRESULTS'), key=lambda i: i['guid'])
+        return movies, results
+
+    def test_import(self):
+        added = list(Manage.add_movies_bulk(import_movies(30), full_metadata=True, imported=True))
+        movies, results = self.tables()
+
+        self.assertEqual([m['imdbid'] for m, r in added], [f'tt{i:07d}' for i in range(30)])
+        self.assertEqual([r for m, r in added], [{'response': True, 'message': f'The Movie {i} 2010 added to library.'} for i in range(30)])
+
+        self.assertEqual(len(movies), 30)
+        self.assertEqual({(i['status'], i['origin'], i['quality']) for i in movies}, {('Disabled', 'Directory Import', 'Default')})
+        self.assertTrue(all(i['poster'] == f"{i['imdbid']}.jpg" for i in movies))
+
+        # each movie gets one fake result for its file, scored like its finished_score
+        self.assertEqual(sorted(i['imdbid'] for i in results), [i['imdbid'] for i in movies])
+        self.assertEqual({(i['type'], i['status']) for i in results}, {('import', 'Finished')})
+        scores = {i['imdbid']: i['score'] for i in results}
+        self.assertTrue(all(i['finished_score'] and i['finished_score'] == scores[i['imdbid']] for i in movies))
+
+        self.assertEqual(sorted(self.posters), sorted((f'tt{i:07d}', f'http://image.tmdb.org/t/p/w300//{i}.jpg') for i in range(30)))
+
+    def test_existing(self):
+        list(Manage.add_movies_bulk(import_movies(5), full_metadata=True))
+        movies = import_movies(10) + import_movies(2, start=8)
+
+        with mock.patch.object(Manage, 'bulk_size', 4):
+            added = [r['response'] for m, r in Manage.add_movies_bulk(movies, full_metadata=True)]
+
+        self.assertEqual(added, [False] * 5 + [True] * 5 + [False] * 2)
+        self.assertEqual(len(core.sql.dump('MOVIES')), 10)
+        self.assertEqual(core.sql.dump('SEARCHRESULTS'), [])
+
+    def test_tmdb(self):
+        def search_tmdbid(tmdbid):
+            if tmdbid == 3:
+                return []
+            return [dict(import_movies(1, start=tmdbid)[0], status='Released', title=f'TMDB {tmdbid}')]
+
+        movies = [{'id': i} for i in range(5)]
+        with mock.patch.object(TheMovieDatabase, '_search_tmdbid', staticmethod(search_tmdbid)):
+            added = list(Manage.add_movies_bulk(movies))
+
+        self.assertEqual([r['response'] for m, r in added], [True, True, True, False, True])
+        self.assertEqual(added[0][0]['title'], 'TMDB 0')
+        self.assertEqual({i['status'] for i in core.sql.dump('MOVIES')}, {'Waiting'})
+
+    def test_tmdb_without_imdbid(self):
+        def search_tmdbid(tmdbid):
+            return [dict(import_movies(1, start=tmdbid)[0], status='Released', imdbid=None)]
+
+        movies = [{'id': 0}, {'id': 1, 'imdbid': 'tt0000001'}, {'id': 2}]
+        with mock.patch.object(TheMovieDatabase, '_search_tmdbid', staticmethod(search_tmdbid)):
+            added = list(Manage.add_movies_bulk(movies))
+
+        self.assertEqual([r['response'] for m, r in added], [False, True, False])
+        self.assertIn('error', added[0][1])
+        self.assertEqual([i['imdbid'] for i in core.sql.dump('MOVIES')], ['tt0000001'])
+
+    def test_write_failed(self):
+        def broken(results):
+            return bool(core.sql.execute(['INSERT INTO SEARCHRESULTS (missing) VALUES (1)']))
+
+        with mock.patch.object(core.sql, 'write_search_results', side_effect=broken):
+            added = list(Manage.add_movies_bulk(import_movies(3), full_metadata=True, imported=True))
+
+        self.assertEqual([r['response'] for m, r in added], [False] * 3)
+        self.assertEqual(core.sql.dump('MOVIES'), [])
+        self.assertEqual(self.posters, [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
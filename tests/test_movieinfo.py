@@ -0,0 +1,281 @@
+import unittest
+from unittest import mock
+
+import http.server
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+core.POSTER_DIR = os.path.join(tempfile.gettempdir(), 'watcher_test_posters')
+core.MAKO_CACHE = os.path.join(tempfile.gettempdir(), 'watcher_test_mako')
+import cherrypy
+from cherrypy._cprequest import Request, Response
+from cherrypy.lib import httputil
+from core import config
+from core.app import App
+from core.helpers import Url
+from core.movieinfo import Poster, TheMovieDatabase
+
+image = bytes(range(256)) * 1024
+
+
+class ImageHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status = int(self.path.strip('/').split('.')[0]) if self.path[1].isdigit() else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.end_headers()
+        if status == 200:
+            for i in range(0, len(image), 4096):
+                self.wfile.write(image[i:i + 4096])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPoster(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+        cls.server.requests = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        with open(config.base_file) as f:
+            config.load(config=json.load(f))
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.server.requests.clear()
+        for name, value in (('folder', self.folder), ('backoff', 0), ('_stats', dict.fromkeys(Poster._stats, 0)), ('_unavailable', set())):
+            patch = mock.patch.object(Poster, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def wait(self):
+        deadline = time.monotonic() + 10
+        while Poster.stats()['queued'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def path(self, imdbid):
+        return os.path.join(self.folder, f'{imdbid}.jpg')
+
+    def tmdb(self):
+        ''' Sends requests for image.tmdb.org to the test server '''
+        real = Url.open
+
+        def local(url, **kwargs):
+            return real(url.replace('http://image.tmdb.org', self.url), **kwargs)
+        return mock.patch('core.movieinfo.Url.open', side_effect=local)
+
+    def test_save(self):
+        self.assertTrue(Poster.save('tt0000001', f'{self.url}/poster.jpg'))
+        with open(self.path('tt0000001'), 'rb') as f:
+            self.assertEqual(f.read(), image)
+        self.assertEqual(os.listdir(self.folder), ['tt0000001.jpg'])
+
+        # existing posters are kept unless replaced
+        with open(self.path('tt0000001'), 'wb') as f:
+            f.write(b'old')
+        self.assertTrue(Poster.save('tt0000001', f'{self.url}/poster.jpg'))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(Poster.save('tt0000001', f'{self.url}/poster.jpg', replace=True))
+        self.assertEqual(os.path.getsize(self.path('tt0000001')), len(image))
+
+    def test_retry(self):
+        self.assertFalse(Poster.save('tt0000001', f'{self.url}/404.jpg'))
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.assertFalse(Poster.save('tt0000002', f'{self.url}/503.jpg'))
+        self.assertEqual(len(self.server.requests), 1 + Poster.attempts)
+        self.assertEqual(Poster.stats()['retried'], Poster.attempts - 1)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_interrupted(self):
+        def chunks(chunk_size):
+            yield b'partial'
+            raise ConnectionError('Connection reset')
+
+        def broken(url, stream=False):
+            response = mock.MagicMock(status_code=200)
+            response.__enter__.return_value = response
+            response.iter_content.side_effect = chunks
+            return response
+
+        with open(self.path('tt0000001'), 'wb') as f:
+            f.write(b'old')
+        with mock.patch('core.movieinfo.Url.open', side_effect=broken):
+            self.assertFalse(Poster.save('tt0000001', 'http://image.tmdb.org/poster.jpg', replace=True))
+
+        with open(self.path('tt0000001'), 'rb') as f:
+            self.assertEqual(f.read(), b'old')
+        self.assertEqual(os.listdir(self.folder), ['tt0000001.jpg'])
+
+    def test_queue(self):
+        release = threading.Event()
+        saved = []
+
+        def save(imdbid, poster, replace=False):
+            release.wait(10)
+            saved.append((imdbid, poster, replace))
+            return imdbid != 'tt0000013'
+
+        with mock.patch.object(Poster, 'save', side_effect=save):
+            for i in range(20):
+                Poster.queue(f'tt{i:07d}', f'{self.url}/{i}.jpg')
+            Poster.queue('tt0000019', f'{self.url}/new.jpg', replace=True)
+            Poster.queue('tt0000019', f'{self.url}/newer.jpg')
+
+            self.assertEqual(Poster.stats()['queued'], 20)
+            self.assertEqual(len([i for i in threading.enumerate() if i.name.startswith('poster-')]), Poster.workers)
+
+            release.set()
+            self.wait()
+
+        stats = Poster.stats()
+        self.assertEqual((stats['queued'], stats['saved'], stats['failed'], stats['duplicates']), (0, 19, 1, 2))
+        self.assertEqual(len(saved), 20)
+        self.assertIn(('tt0000019', f'{self.url}/newer.jpg', True), saved)
+
+    def test_queue_while_saving(self):
+        started = threading.Event()
+        release = threading.Event()
+        saved = []
+
+        def save(imdbid, poster, replace=False):
+            started.set()
+            release.wait(10)
+            saved.append((poster, replace))
+            return True
+
+        with mock.patch.object(Poster, 'save', side_effect=save):
+            Poster.queue('tt0000001', 'old')
+            started.wait(10)
+            Poster.queue('tt0000001', 'new', replace=True)
+            release.set()
+            self.wait()
+
+        self.assertEqual(saved, [('old', False), ('new', True)])
+        self.assertEqual(Poster.stats()['saved'], 2)
+
+    def test_save_thumbnails(self):
+        with self.tmdb():
+            self.assertTrue(Poster.save('tt0000001', 'http://image.tmdb.org/t/p/w300//poster.jpg'))
+        self.assertEqual(sorted(self.server.requests), ['/t/p/w185//poster.jpg', '/t/p/w300//poster.jpg', '/t/p/w92//poster.jpg'])
+        for size in Poster.sizes:
+            self.assertEqual(os.path.getsize(Poster.path('tt0000001', size)), len(image))
+
+        # replaced posters don't keep old thumbnails
+        with self.tmdb():
+            self.assertTrue(Poster.save('tt0000001', 'http://image.tmdb.org/t/p/w300//new.jpg', replace=True))
+            self.assertTrue(Poster.save('tt0000002', f'{self.url}/poster.jpg'))
+        self.assertIn('/t/p/w185//new.jpg', self.server.requests)
+        self.assertFalse(os.path.exists(Poster.path('tt0000002', 'grid')))
+
+        Poster.remove('tt0000001')
+        self.assertEqual(os.listdir(os.path.join(self.folder, 'grid')), [])
+
+    def test_thumbnail(self):
+        details = {'tt0000001': {'tmdbid': '1'}, 'tt0000002': {'tmdbid': '2'}}
+        searched = []
+
+        def search_tmdbid(tmdbid):
+            searched.append(tmdbid)
+            return [{'poster_path': '/poster.jpg'}] if tmdbid == '1' else []
+
+        sql = mock.Mock(get_movie_details=lambda col, imdbid: details.get(imdbid))
+        with mock.patch.object(core, 'sql', sql, create=True), self.tmdb(), \
+                mock.patch.object(TheMovieDatabase, '_search_tmdbid', staticmethod(search_tmdbid)):
+            # no poster to make a thumbnail of
+            self.assertIsNone(Poster.thumbnail('tt0000001', 'grid'))
+            self.assertEqual(Poster.stats()['queued'], 0)
+
+            for imdbid in details:
+                with open(self.path(imdbid), 'wb') as f:
+                    f.write(b'poster')
+                self.assertIsNone(Poster.thumbnail(imdbid, 'grid'))
+            self.wait()
+
+            self.assertEqual(Poster.thumbnail('tt0000001', 'grid'), Poster.path('tt0000001', 'grid'))
+            self.assertEqual(self.server.requests, ['/t/p/w185//poster.jpg'])
+
+            # thumbnails TMDB doesn't have are not looked up again
+            self.assertIsNone(Poster.thumbnail('tt0000002', 'grid'))
+            self.wait()
+            self.assertEqual(sorted(searched), ['1', '2'])
+            self.assertEqual(Poster.stats()['failed'], 1)
+
+    def request(self, size, filename, headers=None, **params):
+        ''' Calls App.poster as cherrypy would '''
+        request = Request(httputil.Host('127.0.0.1', 80), httputil.Host('127.0.0.1', 1234))
+        request.method = 'GET'
+        request.headers = httputil.HeaderMap(headers or {})
+        response = Response()
+        cherrypy.serving.load(request, response)
+        try:
+            body = App.poster(None, size, filename, **params)
+            response.status = response.status or 200
+        except cherrypy.HTTPRedirect as e:
+            response.status, body = e.status, None
+        return response, body
+
+    def test_serve(self):
+        with open(self.path('tt0000001'), 'wb') as f:
+            f.write(b'poster')
+
+        with mock.patch.object(Poster, 'thumbnail', return_value=None) as thumbnail:
+            response, body = self.request('grid', 'tt0000001.jpg', v='1')
+        thumbnail.assert_called_once_with('tt0000001', 'grid')
+        self.assertEqual(b''.join(body), b'poster')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        os.makedirs(os.path.join(self.folder, 'grid'))
+        with open(Poster.path('tt0000001', 'grid'), 'wb') as f:
+            f.write(b'thumb')
+
+        response, body = self.request('grid', 'tt0000001.jpg', v='1')
+        self.assertEqual(b''.join(body), b'thumb')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response.headers['Content-Type'], 'image/jpeg')
+        etag = response.headers['ETag']
+
+        response, body = self.request('grid', 'tt0000001.jpg', headers={'If-None-Match': etag}, v='1')
+        self.assertEqual((response.status, body), (304, None))
+
+        response, body = self.request('grid', 'tt0000001.jpg')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=86400')
+
+        response, body = self.request('grid', 'missing_poster.jpg')
+        with open(os.path.join(rootdir, 'static', 'images', 'missing_poster.jpg'), 'rb') as f:
+            self.assertEqual(b''.join(body), f.read())
+
+        for size, filename in (('huge', 'tt0000001.jpg'), ('grid', '..'), ('grid', 'tt0000001.png')):
+            with self.assertRaises(cherrypy.NotFound):
+                self.request(size, filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,431 @@
+import unittest
+from unittest import mock
+
+import asyncio
+import http.server
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+core.POSTER_DIR = os.path.join(tempfile.gettempdir(), 'watcher_test_posters')
+from core import config, searcher, sqldb
+from core.providers import base, rsscursor
+from core.providers.newznab import NewzNab
+from core.providers.torrent import Torrent
+from core.providers.torrent_modules import yts
+
+fixtures = os.path.join(rootdir, 'tests', 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(fixtures, name), 'rb') as f:
+        return f.read()
+
+
+class StubIndexer(http.server.BaseHTTPRequestHandler):
+    ''' Serves recorded indexer responses
+
+    First path segment picks the indexer, see StubServer.routes. A numeric
+        suffix is ignored so many indexers can share a fixture, ie /nzb12/api
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        name = path.split('/')[1].rstrip('0123456789')
+        self.server.requests.append(self.path)
+
+        route = self.server.routes.get(name, (b'', 'text/plain'))
+        body, content_type = route(self.path) if callable(route) else route
+        time.sleep(self.server.delays.get(name, 0))
+
+        self.send_response(200 if body else 404)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubIndexer)
+        self.requests = []
+        self.delays = {}
+        self.routes = {'nzb': (fixture('newznab_movie.xml'), 'application/rss+xml'),
+                       'torznab': (fixture('torznab_search.xml'), 'application/rss+xml'),
+                       'yts': (fixture('yts_movie.json'), 'application/json'),
+                       'slow': (fixture('newznab_movie.xml'), 'application/rss+xml'),
+                       'paged': self.paged
+                       }
+        self.head = 100
+        self.broken = set()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+    def paged(self, path):
+        ''' Serves feed where release self.head is newest, 3 releases per page
+
+        Releases in self.broken are sent without attrs, so can't be parsed
+        '''
+        offset = int(urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)['offset'][0])
+        items = ''.join(f'''<item><title>Some.Movie.2020.1080p.BluRay.x264-{n}</title>
+                            <link>https://indexer.example/getnzb/{n}.nzb</link>
+                            <pubDate>Sat, 03 Oct 2020 14:12:45 +0000</pubDate><size>1000</size>
+                            {'' if n in self.broken else f'<newznab:attr name="imdb" value="{n:07d}" /><newznab:attr name="size" value="1000" />'}</item>'''
+                        for n in range(self.head - offset, self.head - offset - 3, -1) if n > 0)
+        return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" xmlns:newznab="http://www.newznab.com/DTD/2010/feeds/attributes/">'
+                f'<channel><title>paged</title>{items}</channel></rss>').encode('utf-8'), 'application/rss+xml'
+
+
+feed_fields = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:torznab="http://torznab.com/schemas/2015/feed">
+<channel>
+<item>
+<title>Some.Movie.2010.1080p.BluRay.x264-GRP</title>
+<link>http://127.0.0.1:9117/dl/tracker/?jackett_apikey=KEY&amp;path=1&amp;file=Some Movie 2010</link>
+<comments>https://indexer.example/details/1#comments</comments>
+<pubDate>Sat, 03 Oct 2020 14:12:45 +0000</pubDate>
+<size>1000</size>
+<torznab:attr name="imdb" value="0063350" />
+<torznab:attr name="seeders" value="42" />
+<torznab:attr name="peers" value="50" />
+<torznab:attr name="downloadvolumefactor" value="0" />
+</item>
+<item>
+<description>Other.Movie.2011.720p.WEB-DL.x264-GRP</description>
+<link>magnet:?xt=urn:btih:5A1E1D6AF2C21B4E5BE4E4A0A1C73B2D9F0A6C11&amp;dn=Other</link>
+<enclosure url="magnet:?xt=urn:btih:5A1E1D6AF2C21B4E5BE4E4A0A1C73B2D9F0A6C11" length="2000" type="application/x-bittorrent" />
+<torznab:attr name="imdb" value="0000002" />
+</item>
+<item>
+<title>No.Link.2012.DVDRip</title>
+<torznab:attr name="imdb" value="0000003" />
+</item>
+<title>Late Indexer</title>
+</channel>
+</rss>'''
+
+
+def base_config():
+    with open(config.base_file) as f:
+        return json.load(f)
+
+
+class TestProviders(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.tmpdir = tempfile.mkdtemp()
+        core.DB_FILE = os.path.join(cls.tmpdir, 'watcher.sqlite')
+        core.sql = sqldb.SQL()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        conf = base_config()
+        conf['Search']['indexerinterval'] = 0
+        config.load(config=conf)
+        self.server.requests.clear()
+        self.server.delays.clear()
+        self.server.head = 100
+        self.server.broken.clear()
+        rsscursor.save({})
+
+    def newznab_indexers(self, count, name='nzb'):
+        core.CONFIG['Indexers']['NewzNab'] = {str(i): [f'{self.server.url}{name}{i}', 'APIKEY', True] for i in range(count)}
+
+    def test_search_newznab(self):
+        results = NewzNab().search_newznab(f'{self.server.url}nzb/', 'APIKEY', 'movie', imdbid='tt0063350')
+
+        self.assertEqual(self.server.requests, ['/nzb/api?apikey=APIKEY&cat=2000&extended=1&t=movie&imdbid=0063350'])
+        self.assertEqual([i['guid'] for i in results], ['https://indexer.example/getnzb/6b1d0c2a.nzb&i=1&r=APIKEY',
+                                                        'https://indexer.example/getnzb/9f00a4e1.nzb&i=1&r=APIKEY',
+                                                        'https://indexer.example/getnzb/03c7b2f9.nzb&i=1&r=APIKEY'])
+        self.assertEqual(results[0]['indexer'], 'indexer.example')
+        self.assertEqual(results[0]['size'], 8589934592)
+        self.assertEqual(results[0]['pubdate'], '03 Oct 2020')
+        self.assertEqual(results[0]['info_link'], 'https://indexer.example/details/6b1d0c2a')
+        self.assertTrue(all(i['imdbid'] == 'tt0063350' and i['type'] == 'nzb' for i in results))
+
+    def test_parse_off_loop(self):
+        threads = []
+        nn = NewzNab()
+        parse = nn.parse_newznab_xml
+
+        def spy(feed, imdbid=None):
+            threads.append(threading.current_thread().name)
+            return parse(feed, imdbid=imdbid)
+
+        with mock.patch.object(nn, 'parse_newznab_xml', side_effect=spy):
+            self.assertEqual(len(nn.search_newznab(f'{self.server.url}nzb/', 'APIKEY', 'movie', imdbid='tt0063350')), 3)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('indexer_'))
+
+    def test_search_torznab(self):
+        results = Torrent().search_newznab(f'{self.server.url}torznab/', 'APIKEY', 'search', q='night of the living dead 1968', imdbid='tt0063350')
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['type'], 'torrent')
+        self.assertTrue(results[0]['freeleech'])
+        self.assertEqual((results[0]['seeders'], results[0]['leechers']), (42, 50))
+        self.assertTrue(results[0]['guid'].endswith('&file=Night%20of%20the%20Living%20Dead'))
+        self.assertEqual(results[1]['type'], 'magnet')
+        self.assertEqual(results[1]['guid'], '5A1E1D6AF2C21B4E5BE4E4A0A1C73B2D9F0A6C11')
+
+    def test_search_all(self):
+        self.newznab_indexers(6)
+        core.CONFIG['Indexers']['NewzNab']['2'][2] = False
+        self.server.delays['nzb'] = 0.5
+
+        start = time.monotonic()
+        results = NewzNab().search_all('tt0063350')
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(results), 15)
+        self.assertEqual(sorted(i.split('?')[0] for i in self.server.requests), ['/nzb0/api', '/nzb1/api', '/nzb3/api', '/nzb4/api', '/nzb5/api'])
+        self.assertLess(elapsed, 1.5)
+
+    def test_timeout(self):
+        core.CONFIG['Search']['indexertimeout'] = 1
+        core.CONFIG['Indexers']['NewzNab'] = {'0': [f'{self.server.url}slow', 'APIKEY', True],
+                                              '1': [f'{self.server.url}nzb', 'APIKEY', True]}
+        self.server.delays['slow'] = 3
+
+        start = time.monotonic()
+        results = NewzNab().search_all('tt0063350')
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(results), 3)
+        self.assertLess(elapsed, 2.5)
+
+    def test_timeout_from_job_start(self):
+        core.CONFIG['Search']['indexertimeout'] = 1
+        core.CONFIG['Search']['indexerworkers'] = 1
+
+        def slow():
+            time.sleep(0.7)
+            return [{'guid': 'slow'}]
+
+        timings = []
+        results = base.fan_out([('a', slow, ()), ('b', slow, ())], timings=timings)
+
+        # b waited for a in the pool, its timeout starts when it runs
+        self.assertEqual(results, [[{'guid': 'slow'}]] * 2)
+        self.assertGreater(timings[1], 1)
+
+    def test_blank_workers(self):
+        core.CONFIG['Search']['indexerworkers'] = ''
+        self.assertEqual(base._executor()._max_workers, base.default_workers)
+
+    def test_mixed_jobs(self):
+        core.CONFIG['Indexers']['Torrent']['yts']['url'] = f'{self.server.url}yts'
+        nn = NewzNab()
+        jobs = [('yts', yts.search, ('tt0063350', 'night of the living dead 1968')),
+                ('nzb', nn.search_newznab_async, (f'{self.server.url}nzb/', 'APIKEY', 'movie', None, 'tt0063350')),
+                ('broken', nn.search_newznab_async, (f'{self.server.url}missing/', 'APIKEY', 'movie', None, 'tt0063350'))]
+
+        results = base.fan_out(jobs)
+
+        self.assertEqual([len(i) for i in results], [2, 3, 0])
+        self.assertEqual(results[0][0]['guid'], '0F3D6B2B7A64F7B10C3B6D7C2D50D1E5E30C2A4B')
+        self.assertEqual(results[0][0]['type'], 'magnet')
+
+    def test_many_indexers(self):
+        self.newznab_indexers(300)
+        self.server.delays['nzb'] = 0.2
+
+        start = time.monotonic()
+        results = NewzNab().search_all('tt0063350')
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(results), 900)
+        self.assertEqual(len(self.server.requests), 300)
+        self.assertLess(elapsed, 5)
+
+    def test_rss(self):
+        self.newznab_indexers(4)
+        core.CONFIG['Indexers']['NewzNab']['3'][2] = False
+        self.server.delays['nzb'] = 0.5
+
+        start = time.monotonic()
+        results = NewzNab().get_rss()
+        elapsed = time.monotonic() - start
+
+        # every indexer serves the same releases
+        self.assertEqual([i['guid'] for i in results], [i['guid'] for i in NewzNab().parse_newznab_xml(fixture('newznab_movie.xml'))])
+        self.assertEqual(sorted(i.split('?')[0] for i in self.server.requests), ['/nzb0/api', '/nzb1/api', '/nzb2/api'])
+        self.assertLess(elapsed, 1.2)
+
+    def test_rss_merge(self):
+        core.CONFIG['Search']['indexertimeout'] = 1
+        core.CONFIG['Indexers']['TorzNab'] = {'0': [f'{self.server.url}slow', 'APIKEY', True],
+                                              '1': [f'{self.server.url}torznab', 'APIKEY', True]}
+        self.server.delays['slow'] = 3
+        torrent = Torrent()
+        fake = torrent.parse_newznab_xml(fixture('torznab_search.xml'))[1:]
+        fake[0]['guid'] = fake[0]['guid'].lower()
+        fake.append(dict(fake[0], guid='0F3D6B2B7A64F7B10C3B6D7C2D50D1E5E30C2A4B'))
+        jobs = torrent._rss_jobs({}) + [('fake', lambda: fake, ())]
+
+        timings = []
+        with self.assertLogs(level='INFO') as logs:
+            results = base.merge_rss(jobs, base.fan_out(jobs, timings=timings), timings)
+
+        self.assertEqual([i['guid'] for i in results], [torrent.parse_newznab_xml(fixture('torznab_search.xml'))[0]['guid'],
+                                                        '5A1E1D6AF2C21B4E5BE4E4A0A1C73B2D9F0A6C11',
+                                                        '0F3D6B2B7A64F7B10C3B6D7C2D50D1E5E30C2A4B'])
+        self.assertIsNone(timings[0])
+        self.assertLess(timings[1], 1)
+        self.assertRegex(logs.output[-1], r'RSS sync found 3 items: \S+slow/ timed out, \S+torznab/ 2 items \(2 new\) in [\d.]+s, fake 2 items \(1 new\)')
+
+    def test_rss_cursor(self):
+        self.newznab_indexers(2)
+
+        record = rsscursor.load()
+        self.assertEqual(len(NewzNab().get_rss(record)), 3)
+        # cursors are only moved in record until it is saved
+        self.assertEqual(len(NewzNab().get_rss()), 3)
+        rsscursor.save(record)
+        self.assertEqual(NewzNab().get_rss(), [])
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(len(rsscursor.load()[f'{self.server.url}nzb0/']['guids']), 3)
+
+    def test_rss_sync_cursor(self):
+        self.newznab_indexers(1)
+        core.CONFIG['Downloader']['Sources']['usenetenabled'] = True
+        core.CONFIG['Downloader']['Sources']['torrentenabled'] = False
+        movies = [{'imdbid': 'tt0063350', 'title': 'Night of the Living Dead', 'year': 1968}]
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+        # a failed sync doesn't move the cursor
+        with mock.patch.object(searcher.searchresults, 'score', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                searcher.rss_sync(movies)
+        self.assertEqual(rsscursor.load(), {})
+
+        with mock.patch.object(searcher.searchresults, 'score', return_value=[]):
+            self.assertTrue(searcher.rss_sync(movies))
+        self.assertEqual(NewzNab().get_rss(), [])
+
+    def test_rss_paging(self):
+        core.CONFIG['Indexers']['NewzNab'] = {'0': [f'{self.server.url}paged', 'APIKEY', True]}
+
+        def sync():
+            self.server.requests.clear()
+            record = rsscursor.load()
+            results = NewzNab().get_rss(record)
+            rsscursor.save(record)
+            offsets = [int(urllib.parse.parse_qs(urllib.parse.urlsplit(i).query)['offset'][0]) for i in self.server.requests]
+            return [int(i['imdbid'][2:]) for i in results], offsets
+
+        self.assertEqual(sync(), ([100, 99, 98], [0]))
+        self.server.head = 107
+        self.assertEqual(sync(), ([107, 106, 105, 104, 103, 102, 101], [0, 3, 6]))
+        self.assertEqual(sync(), ([], [0]))
+        self.server.head = 200
+        with self.assertLogs(level='WARNING'):
+            results, offsets = sync()
+        self.assertEqual((results[0], len(results)), (200, 15))
+        self.assertEqual(offsets, [0, 3, 6, 9, 12])
+
+    def test_rss_paging_unparsed(self):
+        core.CONFIG['Indexers']['NewzNab'] = {'0': [f'{self.server.url}paged', 'APIKEY', True]}
+
+        record = rsscursor.load()
+        NewzNab().get_rss(record)
+        rsscursor.save(record)
+
+        # skipped items still count towards the next page's offset
+        self.server.head = 107
+        self.server.broken.add(106)
+        self.server.requests.clear()
+        results = NewzNab().get_rss(rsscursor.load())
+        offsets = [int(urllib.parse.parse_qs(urllib.parse.urlsplit(i).query)['offset'][0]) for i in self.server.requests]
+        self.assertEqual([int(i['imdbid'][2:]) for i in results], [107, 105, 104, 103, 102, 101])
+        self.assertEqual(offsets, [0, 3, 6])
+
+    def test_run_sync_in_loop(self):
+        async def nested():
+            base.run_sync(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            base.run_sync(nested())
+
+
+class TestNewznabParser(unittest.TestCase):
+
+    def test_fixtures(self):
+        for provider, name in ((NewzNab(), 'newznab_movie.xml'), (Torrent(), 'torznab_search.xml')):
+            feed = fixture(name).decode('utf-8')
+            self.assertTrue(provider.parse_newznab_xml(feed))
+            self.assertEqual({i['imdbid'] for i in provider.parse_newznab_xml(feed, imdbid='tt0000001')}, {'tt0000001'})
+
+    def test_fields(self):
+        # items without a link can't be downloaded as torrents
+        torrent, magnet = Torrent().parse_newznab_xml(feed_fields)
+
+        self.assertEqual(torrent['guid'], 'http://127.0.0.1:9117/dl/tracker/?jackett_apikey=KEY&path=1&file=Some%20Movie%202010')
+        self.assertEqual(torrent['torrentfile'], torrent['guid'])
+        self.assertEqual((torrent['indexer'], torrent['title'], torrent['pubdate'], torrent['size']),
+                         ('Late Indexer', 'Some.Movie.2010.1080p.BluRay.x264-GRP', '03 Oct 2020', 1000))
+        self.assertEqual(torrent['info_link'], 'https://indexer.example/details/1')
+        self.assertEqual((torrent['seeders'], torrent['leechers'], torrent['freeleech']), (42, 50, True))
+
+        self.assertEqual((magnet['type'], magnet['guid']), ('magnet', '5A1E1D6AF2C21B4E5BE4E4A0A1C73B2D9F0A6C11'))
+        self.assertTrue(magnet['torrentfile'].startswith('magnet:?xt='))
+        self.assertEqual((magnet['title'], magnet['size'], magnet['pubdate'], magnet['freeleech']),
+                         ('Other.Movie.2011.720p.WEB-DL.x264-GRP', 2000, '', False))
+
+        nzbs = NewzNab().parse_newznab_xml(feed_fields)
+        self.assertEqual([i['type'] for i in nzbs], ['nzb'] * 3)
+        self.assertEqual([i['imdbid'] for i in nzbs], ['tt0063350', 'tt0000002', 'tt0000003'])
+        self.assertEqual(nzbs[0]['guid'], 'http://127.0.0.1:9117/dl/tracker/?jackett_apikey=KEY&path=1&file=Some Movie 2010')
+        self.assertIsNone(nzbs[2]['guid'])
+
+    def test_bytes(self):
+        feed = fixture('newznab_movie.xml')
+        self.assertEqual(NewzNab().parse_newznab_xml(feed), NewzNab().parse_newznab_xml(feed.decode('utf-8')))
+
+    def test_single_attr(self):
+        feed = re.sub(r'<newznab:attr name="(category|size)" value="\d+" />', '', fixture('newznab_movie.xml').decode('utf-8'))
+        self.assertEqual([i['imdbid'] for i in NewzNab().parse_newznab_xml(feed)], ['tt0063350'] * 3)
+
+    def test_malformed(self):
+        feed = fixture('newznab_movie.xml').decode('utf-8')
+        truncated = feed[:feed.rindex('<item>') + 20]
+        self.assertEqual(NewzNab().parse_newznab_xml(truncated), NewzNab().parse_newznab_xml(feed)[:2])
+        self.assertEqual(NewzNab().parse_newznab_xml('<html>Service Unavailable</html>'), [])
+        self.assertEqual(NewzNab().parse_newznab_xml(''), [])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+
+import copy
+import datetime
+import json
+import os
+import random
+import sys
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+from core import config, searchresults
+
+golden_file = os.path.join(rootdir, 'tests', 'searchresults_golden.json')
+
+words = ['proper', 'repack', 'hdr', 'x265', 'x264', 'hevc', '3d', 'french', 'german', 'truefrench',
+         'subbed', 'hardcoded', 'extended', 'remux', 'atmos', 'yify', 'dual', 'multi']
+
+movies = [{'imdbid': 'tt0000001', 'title': 'The Movie', 'year': '2010', 'alternative_titles': 'Le Film,Das Movie',
+           'english_title': None, 'download_language': None},
+          {'imdbid': 'tt0000002', 'title': 'Le Grand Film', 'year': '2015', 'alternative_titles': '',
+           'english_title': 'The Big Movie', 'download_language': 'fr'},
+          {'imdbid': 'tt0000003', 'title': 'Hardcoded: Part 2 & More', 'year': '1999', 'alternative_titles': None,
+           'english_title': None, 'download_language': None},
+          {'imdbid': 'tt0000004', 'title': 'Extended', 'year': None, 'alternative_titles': 'Extended Cut',
+           'english_title': 'Extended', 'download_language': 'de'}
+          ]
+
+
+def make_config(rand):
+    ''' Builds random config with a single default quality profile '''
+    with open(config.base_file) as f:
+        conf = json.load(f)
+    profile = copy.deepcopy(config.base_profile)
+    profile['default'] = True
+    for i, source in enumerate(sorted(core.SOURCES, key=lambda x: rand.random())):
+        profile['Sources'][source] = [rand.random() < 0.7, i]
+    profile['requiredwords'] = rand.choice(['', '', 'x264, x265', 'hevc&hdr,remux'])
+    profile['preferredwords'] = rand.choice(['', 'proper', 'x265, hdr&atmos, proper, proper'])
+    profile['ignoredwords'] = rand.choice(['', '3d', 'subbed, hardcoded, french', 'german,dual&multi'])
+    profile['scoretitle'] = rand.random() < 0.75
+    conf['Quality']['Profiles'] = {'Default': profile}
+    conf['Categories'] = {'Kids': {'requiredwords': '', 'preferredwords': 'yify', 'ignoredwords': 'remux'}}
+    conf['Languages'] = {'fr': 'French, truefrench', 'de': 'German'}
+    conf['Search']['retention'] = rand.choice([0, 100])
+    conf['Search']['mintorrentseeds'] = rand.choice([0, 5])
+    conf['Search']['freeleechpoints'] = rand.choice([0, 10])
+    conf['Search']['requirefreeleech'] = rand.random() < 0.2
+    conf['Search']['seederspoints'] = rand.choice(['', 5])
+    conf['Search']['seedersthreshold'] = rand.choice([0, 20])
+    conf['Search']['leecherspoints'] = rand.choice(['', 3])
+    conf['Search']['leechersthreshold'] = rand.choice([0, 10])
+    return conf
+
+
+def make_release(rand, movie, imported=False):
+    ''' Builds random search result resembling movie '''
+    title = rand.choice([movie['title'], movie['title'], (movie['alternative_titles'] or 'Other').split(',')[-1],
+                         movie['english_title'] or movie['title'], 'Something Else Entirely'])
+    year = int(movie['year'] or 2000) + rand.choice([0, 0, 0, 1, -1, 3])
+    parts = [title.replace(' ', '.')]
+    if rand.random() < 0.9:
+        parts.append(str(year))
+    parts += rand.sample(words, rand.randint(0, 4))
+    parts.append(rand.choice(['1080p', '720p', '2160p', '']))
+    kind = 'import' if imported else rand.choice(['nzb', 'torrent', 'magnet'])
+    release = {'title': '.'.join(i for i in parts if i) + '-GRP',
+               'type': kind,
+               'resolution': rand.choice(core.SOURCES),
+               'size': rand.randint(300, 9000) * 1000000,
+               'pubdate': (datetime.datetime.today() - datetime.timedelta(days=rand.randint(0, 200))).strftime('%d %b %Y'),
+               'freeleech': rand.choice([0, 1]),
+               'guid': str(rand.random())
+               }
+    if kind in ('torrent', 'magnet'):
+        release['seeders'] = rand.randint(0, 50)
+        release['leechers'] = rand.randint(0, 30)
+    return release
+
+
+def scenarios():
+    ''' Yields (name, config, movie, releases, imported) '''
+    rand = random.Random(1138)
+    for n in range(40):
+        movie = dict(rand.choice(movies))
+        movie['category'] = rand.choice(['Default', 'Kids'])
+        movie['quality'] = 'Default'
+        movie['filters'] = json.dumps({'requiredwords': '', 'preferredwords': rand.choice(['', 'extended']),
+                                       'ignoredwords': rand.choice(['', 'yify', 'french'])})
+        imported = n % 8 == 7
+        releases = [make_release(rand, movie, imported) for i in range(rand.randint(0, 60))]
+        yield (f'scenario {n}', make_config(rand), movie, releases, imported)
+
+
+class FakeSQL:
+
+    def __init__(self, movie):
+        self.movie = movie
+
+    def get_movie_details(self, idcol, idval):
+        return dict(self.movie)
+
+
+def run_scenarios():
+    ''' Scores every scenario
+
+    Returns dict {name: [[score, reject_reason], ...]}
+    '''
+    results = {}
+    for name, conf, movie, releases, imported in scenarios():
+        config.load(config=conf)
+        core.sql = FakeSQL(movie)
+        if imported:
+            scored = searchresults.score(releases, imported=True)
+        else:
+            scored = searchresults.score(releases, imdbid=movie['imdbid'])
+        results[name] = [[i['score'], i['reject_reason']] for i in scored]
+    return results
+
+
+class TestScore(unittest.TestCase):
+
+    def test_golden(self):
+        with open(golden_file) as f:
+            golden = json.load(f)
+
+        results = run_scenarios()
+        self.assertEqual(set(results), set(golden))
+        for name in golden:
+            self.assertEqual(results[name], golden[name], name)
+
+    def test_config_change(self):
+        name, conf, movie, releases, imported = next(scenarios())
+        config.load(config=conf)
+        core.sql = FakeSQL(movie)
+        conf['Quality']['Profiles']['Default']['Sources'] = {k: [True, 1] for k in core.SOURCES}
+        conf['Quality']['Profiles']['Default']['requiredwords'] = ''
+        first = [i['score'] for i in searchresults.score(copy.deepcopy(releases), imdbid=movie['imdbid'])]
+
+        conf['Quality']['Profiles']['Default']['Sources'] = {k: [True, 2] for k in core.SOURCES}
+        config.load(config=conf)
+        second = [i['score'] for i in searchresults.score(copy.deepcopy(releases), imdbid=movie['imdbid'])]
+
+        self.assertNotEqual(first, second)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--generate']:
+        with open(golden_file, 'w') as f:
+            json.dump(run_scenarios(), f, indent=1)
+    else:
+        unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import json
+import os
+import sys
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+from core import config, sources
+
+
+def base_config():
+    with open(config.base_file) as f:
+        return json.load(f)
+
+
+class TestSourceMatcher(unittest.TestCase):
+
+    def setUp(self):
+        config.load(config=base_config())
+
+    def test_aliases(self):
+        matcher = sources.get_matcher()
+        for text, source in (('bluray', 'BluRay'), ('x264 blu-ray', 'BluRay'), ('brrip dts', 'BluRay'),
+                             ('webrip', 'WebRip'), ('web-dl', 'WebDL'), ('hdrip', 'WebDL'), ('dvd-rip', 'DVD'),
+                             ('camrip', 'CAM'), ('proper ts', 'Telesync'), ('dvdscr', 'Screener'),
+                             # config order wins over position in the text
+                             ('scr bluray', 'BluRay'),
+                             # aliases match whole words only
+                             ('scam', None), ('tsar hdtv', None), ('', None)):
+            self.assertEqual(matcher.search(text), source, text)
+
+        for quality, source in (('Blu-Ray', 'BluRay'), ('WEBRip', 'WebRip'), ('DVDScr', 'Screener'), ('HDTV', None), ('Blu', None)):
+            self.assertEqual(matcher.exact(quality), source, quality)
+
+    def test_priority(self):
+        matcher = sources.SourceMatcher({'A': ['blu'], 'B': ['ray', 'blu-ray'], 'C': ['blu-ray']})
+        self.assertEqual(matcher.search('blu-ray'), 'A')
+        self.assertEqual(matcher.search('cam blu-ray'), 'A')
+        matcher = sources.SourceMatcher({'A': ['-ray x'], 'B': ['blu-ray']})
+        self.assertEqual(matcher.search('blu-ray x'), 'A')
+        self.assertEqual(matcher.search('blu-ray'), 'B')
+        self.assertEqual(matcher.search('bluray'), None)
+        self.assertEqual(matcher.exact('Blu-Ray'), 'B')
+
+    def test_config_change(self):
+        self.assertEqual(sources.get_matcher().search('hdrip'), 'WebDL')
+        conf = base_config()
+        conf['Quality']['Aliases']['WebDL'] = ['web-dl']
+        config.load(config=conf)
+        self.assertEqual(sources.get_matcher().search('hdrip'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
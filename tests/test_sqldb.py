@@ -0,0 +1,134 @@
+import unittest
+from unittest import mock
+
+import datetime
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+rootdir = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootdir, 'lib'))
+sys.path.insert(0, rootdir)
+
+os.chdir(rootdir)
+
+import core
+core.PROG_PATH = rootdir
+core.POSTER_DIR = os.path.join(tempfile.gettempdir(), 'watcher_test_posters')
+from core import searcher, sqldb
+
+
+def result(imdbid, guid, **kwargs):
+    return dict({'imdbid': imdbid, 'guid': guid, 'title': f'Release {guid}', 'score': 100, 'size': 1000,
+                 'status': 'Available', 'type': 'nzb', 'indexer': 'indexer.example', 'date_found': '2020-01-01'}, **kwargs)
+
+
+class TestSyncSearchResults(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        core.DB_FILE = os.path.join(cls.tmpdir, 'watcher.sqlite')
+        core.sql = sqldb.SQL()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        core.sql.execute(['DELETE FROM SEARCHRESULTS'])
+        core.sql.write_search_results([result('tt0000001', 'a'), result('tt0000001', 'b'), result('tt0000001', 'c'),
+                                       result('tt0000002', 'a')])
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def rows(self, imdbid=None):
+        rows = [i for i in core.sql.dump('SEARCHRESULTS') if imdbid is None or i['imdbid'] == imdbid]
+        return sorted(rows, key=lambda i: (i['imdbid'], str(i['guid']), i['title']))
+
+    def expected(self, imdbid, results):
+        ''' Contents of SEARCHRESULTS after replacing imdbid's rows the old way '''
+        before = self.rows()
+        core.sql.purge_search_results(imdbid)
+        core.sql.write_search_results(results)
+        rows = self.rows()
+        core.sql.execute(['DELETE FROM SEARCHRESULTS'])
+        core.sql.write_search_results(before)
+        return rows
+
+    def test_sync(self):
+        results = [result('tt0000001', 'a', score=200, status='Bad'),
+                   result('tt0000001', 'b'),
+                   result('tt0000001', 'd', date_found='2020-02-01')]
+        expected = self.expected('tt0000001', results)
+
+        self.assertTrue(core.sql.sync_search_results('tt0000001', results))
+
+        self.assertEqual(self.rows(), expected)
+        rows = {i['guid']: i for i in self.rows('tt0000001')}
+        self.assertEqual(sorted(rows), ['a', 'b', 'd'])
+        self.assertEqual((rows['a']['score'], rows['a']['status']), (200, 'Bad'))
+        # other movies' results with the same guid are left alone
+        self.assertEqual([(i['guid'], i['score']) for i in self.rows('tt0000002')], [('a', 100)])
+
+    def test_unchanged(self):
+        results = self.rows('tt0000001')
+        with mock.patch.object(core.sql, 'execute', wraps=core.sql.execute) as execute:
+            self.assertTrue(core.sql.sync_search_results('tt0000001', results))
+        # only the select
+        self.assertEqual(execute.call_count, 1)
+
+    def test_guid_case(self):
+        results = [result('tt0000001', 'A', score=50), result('tt0000001', 'b'), result('tt0000001', 'c')]
+        expected = self.expected('tt0000001', results)
+
+        self.assertTrue(core.sql.sync_search_results('tt0000001', results))
+
+        self.assertEqual(self.rows(), expected)
+        self.assertEqual(len(self.rows('tt0000001')), 3)
+
+    def test_duplicate_and_null_guids(self):
+        core.sql.write_search_results([result('tt0000001', 'b', title='Other b'), result('tt0000001', None)])
+        results = [result('tt0000001', 'a'), result('tt0000001', 'b', score=1), result('tt0000001', 'b', title='Third b'),
+                   result('tt0000001', None, title='New null')]
+        expected = self.expected('tt0000001', results)
+
+        self.assertTrue(core.sql.sync_search_results('tt0000001', results))
+
+        self.assertEqual(self.rows(), expected)
+        self.assertEqual(sorted(i['title'] for i in self.rows('tt0000001') if i['guid'] in ('b', None)),
+                         ['New null', 'Release b', 'Third b'])
+
+    def test_empty(self):
+        self.assertTrue(core.sql.sync_search_results('tt0000001', []))
+        self.assertEqual(self.rows('tt0000001'), [])
+        self.assertEqual(len(self.rows('tt0000002')), 1)
+
+    def test_write_failed(self):
+        before = self.rows()
+
+        def broken(results):
+            return bool(core.sql.execute(['INSERT INTO SEARCHRESULTS (missing) VALUES (1)']))
+
+        with mock.patch.object(core.sql, 'write_search_results', side_effect=broken):
+            self.assertFalse(core.sql.sync_search_results('tt0000001', [result('tt0000001', 'a', score=1), result('tt0000001', 'd')]))
+
+        self.assertEqual(self.rows(), before)
+
+    def test_date_found(self):
+        # backlog searches re-score stored results, which carry their date_found
+        stored = {i['guid']: i for i in self.rows('tt0000001')}
+        results = [dict(stored['a'], score=300), result('tt0000001', 'e')]
+        del results[1]['date_found']
+
+        self.assertTrue(searcher.store_results(results, 'tt0000001', backlog=True))
+
+        rows = {i['guid']: i for i in self.rows('tt0000001')}
+        self.assertEqual((rows['a']['score'], rows['a']['date_found']), (300, '2020-01-01'))
+        self.assertEqual(rows['e']['date_found'], str(datetime.date.today()))
+
+
+if __name__ == '__main__':
+    unittest.main()